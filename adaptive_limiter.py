@@ -0,0 +1,130 @@
+import asyncio
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Deque, Optional
+
+
+CONGESTION_STATUSES = {429, 500, 502, 503, 504}
+
+
+def is_congestion_error(error: BaseException) -> bool:
+    """True for failures that mean the host is overloaded: timeouts, 429 and 5xx."""
+    if isinstance(error, (asyncio.TimeoutError, TimeoutError)):
+        return True
+    status = getattr(error, "status", None)
+    return isinstance(status, int) and (status in CONGESTION_STATUSES or status >= 500)
+
+
+class AdaptiveLimiter:
+    """Concurrency limit tuned with AIMD (additive increase, multiplicative decrease).
+
+    Every healthy completion grows the limit by ``increase / limit`` (about +1
+    per full window); a timeout, 429 or 5xx multiplies it by ``decrease``, at
+    most once per ``cooldown`` seconds so one burst of failures counts once.
+    """
+
+    def __init__(
+        self,
+        initial: int = 10,
+        minimum: int = 1,
+        maximum: int = 64,
+        increase: float = 1.0,
+        decrease: float = 0.5,
+        latency_tolerance: float = 2.0,
+        max_error_rate: float = 0.2,
+        window: int = 20,
+        cooldown: float = 1.0,
+    ):
+        self.minimum = max(1, minimum)
+        self.maximum = max(self.minimum, maximum)
+        self.limit = float(min(max(initial, self.minimum), self.maximum))
+        self.increase = increase
+        self.decrease = decrease
+        self.latency_tolerance = latency_tolerance
+        self.max_error_rate = max_error_rate
+        self.cooldown = cooldown
+        self.in_flight = 0
+        self.baseline_latency: Optional[float] = None
+        self.smoothed_latency: Optional[float] = None
+        self.outcomes: Deque[bool] = deque(maxlen=window)
+        self.last_decrease = 0.0
+        self.peak = int(self.limit)
+        self.decreases = 0
+        self.condition: Optional[asyncio.Condition] = None
+
+    @property
+    def current(self) -> int:
+        return int(self.limit)
+
+    def get_condition(self) -> asyncio.Condition:
+        # Created lazily so the limiter can be built outside a running loop.
+        if self.condition is None:
+            self.condition = asyncio.Condition()
+        return self.condition
+
+    async def acquire(self) -> None:
+        condition = self.get_condition()
+        async with condition:
+            await condition.wait_for(lambda: self.in_flight < self.current)
+            self.in_flight += 1
+
+    async def release(self) -> None:
+        condition = self.get_condition()
+        async with condition:
+            self.in_flight -= 1
+            condition.notify_all()
+
+    def error_rate(self) -> float:
+        if not self.outcomes:
+            return 0.0
+        return self.outcomes.count(False) / len(self.outcomes)
+
+    def on_success(self, latency: float) -> None:
+        self.outcomes.append(True)
+        self.smoothed_latency = (
+            latency if self.smoothed_latency is None else 0.8 * self.smoothed_latency + 0.2 * latency
+        )
+        if self.baseline_latency is None or self.smoothed_latency < self.baseline_latency:
+            self.baseline_latency = self.smoothed_latency
+        else:
+            # Slow upward drift so one unusually fast sample does not pin the baseline forever.
+            self.baseline_latency *= 1.01
+
+        latency_ok = self.smoothed_latency <= self.baseline_latency * self.latency_tolerance
+        if latency_ok and self.error_rate() <= self.max_error_rate:
+            self.limit = min(self.maximum, self.limit + self.increase / self.limit)
+            self.peak = max(self.peak, self.current)
+
+    def on_failure(self, error: BaseException) -> None:
+        self.outcomes.append(False)
+        if not is_congestion_error(error):
+            return
+        now = time.monotonic()
+        if now - self.last_decrease < self.cooldown:
+            return
+        self.last_decrease = now
+        self.limit = max(self.minimum, self.limit * self.decrease)
+        self.decreases += 1
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[None]:
+        """Hold one transfer slot; the outcome of the block feeds the controller."""
+        await self.acquire()
+        started = time.monotonic()
+        try:
+            yield
+        except BaseException as error:
+            if not isinstance(error, asyncio.CancelledError):
+                self.on_failure(error)
+            raise
+        else:
+            self.on_success(time.monotonic() - started)
+        finally:
+            await self.release()
+
+    def summary(self) -> str:
+        return (
+            f"adaptive concurrency settled at {self.current} "
+            f"(peak {self.peak}, {self.decreases} decreases, range {self.minimum}-{self.maximum})"
+        )
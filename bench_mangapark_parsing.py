@@ -0,0 +1,114 @@
+import argparse
+import asyncio
+import random
+import statistics
+import time
+from pathlib import Path
+from typing import Callable, List
+
+from bs4 import BeautifulSoup
+
+import mangapark_parser as mangapark
+
+
+def synthetic_chapter_html(images: int = 120, filler_blocks: int = 1500) -> str:
+    # Наближення до реальної сторінки глави: великий блок стану в script + розлоге DOM-дерево.
+    rng = random.Random(42)
+    image_urls = [
+        f"https://s{rng.randint(1, 9)}.mpcdn.org/media/mpup/{rng.getrandbits(64):x}/{index}.webp"
+        for index in range(images)
+    ]
+    state = ",".join(f'"{url}"' for url in image_urls)
+    filler = "".join(
+        f'<div class="flex items-center"><a href="/title/{index}">Link {index}</a>'
+        f'<span class="text-sm opacity-70">{index} views</span></div>'
+        for index in range(filler_blocks)
+    )
+    return (
+        "<html><head><title>Chapter</title>"
+        f"<script type=\"qwik/json\">{{\"objs\":[{state}]}}</script></head><body>"
+        f"<header><h6 class=\"text-lg\"><span>Chapter 12: The Return</span></h6></header>"
+        f"<main>{filler}</main></body></html>"
+    )
+
+
+def load_pages(paths: List[str]) -> List[str]:
+    if not paths:
+        return [synthetic_chapter_html()]
+    return [Path(path).read_text(encoding="utf-8") for path in paths]
+
+
+def time_per_call(func: Callable[[str], str], html: str, repeat: int) -> float:
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func(html)
+        samples.append(time.perf_counter() - started)
+    return statistics.median(samples) * 1000
+
+
+def soup_chapter_title(html: str) -> str:
+    # Старий шлях scrape_chapter: повне дерево в потоці циклу подій.
+    soup = BeautifulSoup(html, "html.parser")
+    return mangapark.extract_text(soup.select_one("h6 span"))
+
+
+async def measure_loop_lag(pages: List[str], rounds: int, off_loop: bool) -> float:
+    # Максимальна затримка тікера з кроком 1 мс, поки розбираються сторінки.
+    worst = 0.0
+    done = asyncio.Event()
+
+    async def ticker() -> None:
+        nonlocal worst
+        last = time.perf_counter()
+        while not done.is_set():
+            await asyncio.sleep(0.001)
+            now = time.perf_counter()
+            worst = max(worst, now - last - 0.001)
+            last = now
+
+    ticker_task = asyncio.create_task(ticker())
+    await asyncio.sleep(0.01)
+    for _ in range(rounds):
+        for html in pages:
+            if off_loop:
+                title = mangapark.extract_chapter_title(html)
+                if not title and "<h6" in html.lower():
+                    await mangapark.parse_off_loop(mangapark.parse_chapter_title, html)
+            else:
+                soup_chapter_title(html)
+            await asyncio.sleep(0)
+    done.set()
+    await ticker_task
+    return worst * 1000
+
+
+async def run(pages: List[str], repeat: int) -> None:
+    for index, html in enumerate(pages, start=1):
+        old_title = soup_chapter_title(html)
+        new_title = mangapark.extract_chapter_title(html)
+        status = "OK" if old_title == new_title else f"MISMATCH ({old_title!r} != {new_title!r})"
+        old_ms = time_per_call(soup_chapter_title, html, repeat)
+        new_ms = time_per_call(mangapark.extract_chapter_title, html, repeat)
+        print(
+            f"Сторінка {index}: {len(html) / 1024:.0f} KiB | BeautifulSoup {old_ms:.2f} ms | "
+            f"цільовий екстрактор {new_ms:.3f} ms | x{old_ms / max(new_ms, 1e-6):.0f} | {status}"
+        )
+
+    try:
+        old_lag = await measure_loop_lag(pages, repeat, off_loop=False)
+        new_lag = await measure_loop_lag(pages, repeat, off_loop=True)
+    finally:
+        mangapark.shutdown_parser_pool()
+    print(f"Макс. блокування циклу подій: до {old_lag:.2f} ms, після {new_lag:.2f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Мікробенчмарк розбору сторінок глав mangapark (BeautifulSoup проти цільового екстрактора)"
+    )
+    parser.add_argument("--html", nargs="*", default=[], help="Збережені HTML сторінок глав")
+    parser.add_argument("--repeat", type=int, default=20, help="Кількість повторів на сторінку")
+    args = parser.parse_args()
+
+    asyncio.run(run(load_pages(args.html), max(1, args.repeat)))
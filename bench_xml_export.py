@@ -0,0 +1,104 @@
+import argparse
+import gc
+import hashlib
+import logging
+import random
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Tuple
+
+from xml_export import legacy_xml, write_xml
+
+
+def synthetic_comics(episodes: int, per_comic: int, images: int) -> Iterator[Dict[str, object]]:
+    # Записи тієї ж форми, що й у скраперів, генеруються по одному, як рядки з <site>.jsonl.
+    rng = random.Random(7)
+    comic_count = (episodes + per_comic - 1) // per_comic
+    for comic_index in range(comic_count):
+        title = f"Comic {comic_index:05d} & Friends"
+        count = min(per_comic, episodes - comic_index * per_comic)
+        yield {
+            "title": title,
+            "originalTitle": title.upper(),
+            "description": "A story about <love>, \"fate\" and rain.\nSecond line " * rng.randint(1, 4),
+            "thumbnail": "thumbnail.jpg",
+            "thumbnailBackground": "",
+            "genres": ["Drama", "Romance"],
+            "tags": [],
+            "episodes": [
+                {
+                    "parentTitle": title,
+                    "title": f"episode {number:03d}",
+                    "slag": f"episode-{number:03d}",
+                    "date": "",
+                    "thumbnail": "thumbnail.jpg",
+                    "images": [f"episode_{number:03d}_{image:03d}.jpg" for image in range(1, images + 1)],
+                }
+                for number in range(1, count + 1)
+            ],
+            "source": f"https://example.com/title/{comic_index}",
+        }
+
+
+def legacy_export(episodes: int, per_comic: int, images: int, path: Path) -> None:
+    # Старий шлях: увесь каталог у пам'яті, потім рядок dicttoxml, потім DOM minidom.
+    comics = list(synthetic_comics(episodes, per_comic, images))
+    with open(path, "w", encoding="utf-8") as xml_file:
+        xml_file.write(legacy_xml(comics))
+
+
+def streaming_export(episodes: int, per_comic: int, images: int, path: Path) -> None:
+    write_xml(synthetic_comics(episodes, per_comic, images), path)
+
+
+def measure(export: Callable[[int, int, int, Path], None], args: Tuple[int, int, int], path: Path) -> Tuple[float, float]:
+    gc.collect()
+    started = time.perf_counter()
+    export(*args, path)
+    elapsed = time.perf_counter() - started
+
+    gc.collect()
+    tracemalloc.start()
+    export(*args, path)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak / (1024 * 1024)
+
+
+def digest(path: Path) -> str:
+    return hashlib.sha256(path.read_bytes()).hexdigest()
+
+
+def run(episodes: int, per_comic: int, images: int) -> None:
+    args = (episodes, per_comic, images)
+    with tempfile.TemporaryDirectory() as workdir:
+        legacy_path = Path(workdir) / "legacy.xml"
+        streaming_path = Path(workdir) / "streaming.xml"
+        rows: List[Tuple[str, float, float]] = [
+            ("dicttoxml + minidom", *measure(legacy_export, args, legacy_path)),
+            ("XmlItemWriter", *measure(streaming_export, args, streaming_path)),
+        ]
+        identical = digest(legacy_path) == digest(streaming_path)
+        size = streaming_path.stat().st_size / (1024 * 1024)
+
+    print(f"Каталог: {episodes} епізодів, {per_comic} на комікс, {images} зображень в епізоді, XML {size:.1f} МБ")
+    for name, elapsed, peak in rows:
+        print(f"{name:<22} {elapsed:8.2f} s   пік пам'яті {peak:9.1f} МБ")
+    print(f"Прискорення x{rows[0][1] / max(rows[1][1], 1e-9):.1f}, пам'ять x{rows[0][2] / max(rows[1][2], 1e-9):.0f} менше")
+    print("Вихід побайтово однаковий" if identical else "УВАГА: вихідні файли відрізняються")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Бенчмарк експорту XML: dicttoxml + minidom проти потокового XmlItemWriter"
+    )
+    parser.add_argument("--episodes", type=int, default=50000, help="Загальна кількість епізодів у каталозі")
+    parser.add_argument("--per-comic", type=int, default=100, help="Епізодів на один комікс")
+    parser.add_argument("--images", type=int, default=10, help="Зображень в одному епізоді")
+    args = parser.parse_args()
+
+    # dicttoxml пише рядок у лог на кожен вузол; вимикаємо, щоб міряти саму серіалізацію.
+    logging.disable(logging.INFO)
+    run(max(1, args.episodes), max(1, args.per_comic), max(0, args.images))
@@ -0,0 +1,230 @@
+import asyncio
+import hashlib
+import os
+import shutil
+import threading
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Set, Tuple, Union
+from urllib.parse import urlparse
+
+from playwright.async_api import BrowserContext, Page, Request, Response, Route
+
+from image_store import HASH_ALGORITHM, ContentStore
+
+
+BLOCKED_RESOURCE_TYPES = frozenset({"image", "font", "media"})
+ANALYTICS_HOSTS = (
+    "google-analytics.com",
+    "googletagmanager.com",
+    "googlesyndication.com",
+    "doubleclick.net",
+    "facebook.net",
+    "connect.facebook.com",
+    "hotjar.com",
+    "clarity.ms",
+    "mixpanel.com",
+    "amplitude.com",
+    "segment.io",
+    "branch.io",
+    "appsflyer.com",
+    "criteo.com",
+    "taboola.com",
+    "outbrain.com",
+)
+DEFAULT_SPOOL_DIR = Path(".capture_spool")
+
+
+def is_analytics(url: str, hosts: Iterable[str] = ANALYTICS_HOSTS) -> bool:
+    host = (urlparse(url).hostname or "").lower()
+    return any(host == pattern or host.endswith(f".{pattern}") for pattern in hosts)
+
+
+class ResourceBlocker:
+    """Context-wide route that aborts images, fonts, media and analytics.
+
+    Only the transfers are cancelled; the DOM still carries every
+    ``src``/``data-original``/``data-src`` the scrapers read, and the strips
+    are fetched once by aiohttp instead of twice. Aborted sizes are unknown,
+    so bytes avoided are credited when aiohttp later downloads a URL the
+    browser was denied.
+    """
+
+    def __init__(
+        self,
+        resource_types: Iterable[str] = BLOCKED_RESOURCE_TYPES,
+        analytics_hosts: Iterable[str] = ANALYTICS_HOSTS,
+    ):
+        self.resource_types = frozenset(resource_types)
+        self.analytics_hosts = tuple(analytics_hosts)
+        self.lock = threading.Lock()
+        self.blocked: Dict[str, int] = {}
+        self.pending_urls: Set[str] = set()
+        self.bytes_avoided = 0
+
+    async def install(self, context: BrowserContext) -> None:
+        await context.route("**/*", self.handle)
+
+    def category(self, request: Request) -> Optional[str]:
+        if is_analytics(request.url, self.analytics_hosts):
+            return "analytics"
+        if request.resource_type in self.resource_types:
+            return request.resource_type
+        return None
+
+    async def handle(self, route: Route) -> None:
+        request = route.request
+        category = self.category(request)
+        if category is None:
+            await route.continue_()
+            return
+        with self.lock:
+            self.blocked[category] = self.blocked.get(category, 0) + 1
+            if category in ("image", "media"):
+                self.pending_urls.add(request.url)
+        await route.abort("blockedbyclient")
+
+    def credit(self, url: str, size: int) -> None:
+        """Count a download of a URL the browser was kept from loading."""
+        with self.lock:
+            if url in self.pending_urls:
+                self.pending_urls.discard(url)
+                self.bytes_avoided += size
+
+    @property
+    def total_blocked(self) -> int:
+        return sum(self.blocked.values())
+
+    def report(self) -> str:
+        kinds = ", ".join(f"{count} {kind}" for kind, count in sorted(self.blocked.items())) or "nothing"
+        return (
+            f"browser blocked {self.total_blocked} requests ({kinds}), "
+            f"{self.bytes_avoided / (1024 * 1024):.1f} MiB of images not loaded twice"
+        )
+
+
+class ResponseCapture:
+    """Saves image bodies from a page's network responses instead of downloading them again.
+
+    While an episode loads, every 200 image response is spooled to disk
+    under a hash of its URL. save() then moves the body for a DOM URL to its
+    episode file, or tells the caller to fall back to aiohttp when the
+    browser never received it (lazy images below the fold, blocked or
+    evicted responses).
+    """
+
+    def __init__(
+        self,
+        spool_dir: Union[str, Path] = DEFAULT_SPOOL_DIR,
+        store: Optional[ContentStore] = None,
+        settle_timeout: float = 10.0,
+    ):
+        self.spool_dir = Path(spool_dir)
+        self.spool_dir.mkdir(parents=True, exist_ok=True)
+        self.store = store
+        self.settle_timeout = settle_timeout
+        self.bodies: Dict[str, Tuple[Path, str]] = {}
+        self.pending: Set[asyncio.Future] = set()
+        self.pages: List["ResponseCapture"] = []
+        self.captured = 0
+        self.missed = 0
+        self.bytes_captured = 0
+
+    def attach(self, page: Page) -> None:
+        page.on("response", self.on_response)
+
+    def for_page(self, page: Page) -> "ResponseCapture":
+        """Separate capture for one page of a pool, counted in this capture's report.
+
+        Pages load different episodes at the same time, so each needs its own
+        bodies and spool directory; start() on one must not drop another's.
+        """
+        capture = ResponseCapture(self.spool_dir / f"page-{len(self.pages)}", self.store, self.settle_timeout)
+        capture.attach(page)
+        self.pages.append(capture)
+        return capture
+
+    def start(self) -> None:
+        """Forget the previous episode's responses; call before navigating to the next one."""
+        for task in self.pending:
+            task.cancel()
+        self.pending.clear()
+        self.bodies.clear()
+        for leftover in self.spool_dir.iterdir():
+            if leftover.is_file():
+                leftover.unlink()
+
+    def on_response(self, response: Response) -> None:
+        if response.request.resource_type != "image" or response.status != 200:
+            return
+        task = asyncio.ensure_future(self.spool(response))
+        self.pending.add(task)
+        task.add_done_callback(self.pending.discard)
+
+    async def spool(self, response: Response) -> None:
+        try:
+            body = await response.body()
+        except Exception:
+            # Navigated away or the body was evicted; save() falls back to aiohttp.
+            return
+        if not body:
+            return
+        digest = hashlib.new(HASH_ALGORITHM, body).hexdigest()
+        spool_path = self.spool_dir / hashlib.sha1(response.url.encode("utf-8")).hexdigest()
+        spool_path.write_bytes(body)
+        # A redirected image is looked up by the URL the DOM holds, not the final one.
+        request = response.request
+        while request is not None:
+            self.bodies.setdefault(request.url, (spool_path, digest))
+            request = request.redirected_from
+
+    async def settle(self) -> None:
+        """Wait for bodies still being read from the browser."""
+        if self.pending:
+            await asyncio.wait(set(self.pending), timeout=self.settle_timeout)
+
+    async def scroll_through(self, page: Page, step: int = 1500, pause_ms: int = 60) -> None:
+        """Scroll to the bottom so lazy images are requested by the browser."""
+        await page.evaluate(
+            """
+            async ([step, pause]) => {
+                for (let y = 0; y < document.body.scrollHeight; y += step) {
+                    window.scrollTo(0, y);
+                    await new Promise(resolve => setTimeout(resolve, pause));
+                }
+                window.scrollTo(0, document.body.scrollHeight);
+            }
+            """,
+            [step, pause_ms],
+        )
+
+    async def save(self, url: str, destination: Union[str, Path]) -> bool:
+        """Write the captured body of url to destination; False if it has to be downloaded."""
+        await self.settle()
+        entry = self.bodies.get(url)
+        if entry is None or not entry[0].exists():
+            self.missed += 1
+            return False
+        source, digest = entry
+        destination = Path(destination)
+        size = source.stat().st_size
+        if source.parent == self.spool_dir:
+            if self.store is not None:
+                self.store.commit(source, digest, destination)
+            else:
+                os.replace(source, destination)
+            # The same strip listed twice is copied from its first episode file.
+            self.bodies[url] = (destination, digest)
+        else:
+            shutil.copyfile(source, destination)
+        self.captured += 1
+        self.bytes_captured += size
+        return True
+
+    def report(self) -> str:
+        captured = self.captured + sum(page.captured for page in self.pages)
+        missed = self.missed + sum(page.missed for page in self.pages)
+        captured_bytes = self.bytes_captured + sum(page.bytes_captured for page in self.pages)
+        return (
+            f"captured {captured}/{captured + missed} images from browser responses "
+            f"({captured_bytes / (1024 * 1024):.1f} MiB), {missed} fetched again with aiohttp"
+        )
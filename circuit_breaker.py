@@ -0,0 +1,219 @@
+import asyncio
+import threading
+import time
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Tuple
+from urllib.parse import urlparse
+
+from retry_policy import is_retryable
+
+
+DEFAULT_FAILURE_THRESHOLD = 5
+DEFAULT_RESET_TIMEOUT = 30.0
+DEFAULT_MAX_RESET_TIMEOUT = 300.0
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half-open"
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of sending a request to a host whose circuit is open."""
+
+    def __init__(self, host: str, retry_in: float):
+        super().__init__(f"circuit open for {host}, next probe in {retry_in:.0f}s")
+        self.host = host
+        self.retry_in = retry_in
+
+
+class Circuit:
+    def __init__(self, reset_timeout: float):
+        self.state = CLOSED
+        self.failures = 0
+        self.reset_timeout = reset_timeout
+        self.opened_at = 0.0
+        self.probe_started = 0.0
+
+
+def host_of(url: str) -> str:
+    return (urlparse(url).hostname or url).lower()
+
+
+class HostCircuitBreaker:
+    """Per-host circuit breaker shared by the downloaders of a run.
+
+    ``failure_threshold`` consecutive failures open a host's circuit: requests
+    to it fail at once with CircuitOpenError instead of walking the retry
+    ladder. After ``reset_timeout`` seconds one request is let through as a
+    probe (half-open); success closes the circuit, failure opens it again
+    for twice as long, up to ``max_reset_timeout``. Only failures that point
+    at the host (network errors, timeouts, 429, 5xx) count; a 404 proves the
+    host answers. Safe to share between threads; ``clock`` is the time
+    source, swapped out in tests.
+    """
+
+    def __init__(
+        self,
+        failure_threshold: int = DEFAULT_FAILURE_THRESHOLD,
+        reset_timeout: float = DEFAULT_RESET_TIMEOUT,
+        max_reset_timeout: float = DEFAULT_MAX_RESET_TIMEOUT,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.clock = clock
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_timeout = reset_timeout
+        self.max_reset_timeout = max(reset_timeout, max_reset_timeout)
+        self.circuits: Dict[str, Circuit] = {}
+        self.opened = 0
+        self.rejected = 0
+        self.lock = threading.Lock()
+
+    def circuit(self, host: str) -> Circuit:
+        circuit = self.circuits.get(host)
+        if circuit is None:
+            circuit = self.circuits[host] = Circuit(self.reset_timeout)
+        return circuit
+
+    def before(self, url: str) -> None:
+        """Let a request to url's host through, or raise CircuitOpenError."""
+        host = host_of(url)
+        with self.lock:
+            circuit = self.circuit(host)
+            if circuit.state == CLOSED:
+                return
+            now = self.clock()
+            # A probe that never reported back (cancelled) does not block the host forever.
+            probe_free = circuit.state == OPEN or now - circuit.probe_started >= circuit.reset_timeout
+            if now - circuit.opened_at >= circuit.reset_timeout and probe_free:
+                circuit.state = HALF_OPEN
+                circuit.probe_started = now
+                return
+            self.rejected += 1
+            retry_in = max(0.0, circuit.opened_at + circuit.reset_timeout - now)
+        raise CircuitOpenError(host, retry_in)
+
+    def success(self, url: str) -> None:
+        with self.lock:
+            circuit = self.circuit(host_of(url))
+            circuit.state = CLOSED
+            circuit.failures = 0
+            circuit.reset_timeout = self.reset_timeout
+
+    def failure(self, url: str, error: BaseException) -> None:
+        if not is_retryable(error):
+            self.success(url)
+            return
+        with self.lock:
+            circuit = self.circuit(host_of(url))
+            circuit.failures += 1
+            if circuit.state == HALF_OPEN:
+                circuit.reset_timeout = min(self.max_reset_timeout, circuit.reset_timeout * 2)
+            elif circuit.state == OPEN or circuit.failures < self.failure_threshold:
+                return
+            circuit.state = OPEN
+            circuit.opened_at = self.clock()
+            self.opened += 1
+
+    def retry_in(self, url: str) -> float:
+        """Seconds until a request to url's host would be let through; 0 when it is now."""
+        with self.lock:
+            circuit = self.circuits.get(host_of(url))
+            if circuit is None or circuit.state == CLOSED:
+                return 0.0
+            return max(0.0, circuit.opened_at + circuit.reset_timeout - self.clock())
+
+    def open_hosts(self) -> List[str]:
+        with self.lock:
+            return sorted(host for host, circuit in self.circuits.items() if circuit.state != CLOSED)
+
+    def report(self) -> str:
+        still_open = self.open_hosts()
+        return (
+            f"{self.opened} circuits opened, {self.rejected} requests failed fast"
+            + (f", still open: {', '.join(still_open)}" if still_open else "")
+        )
+
+
+class DeferredDownloads:
+    """Downloads put off because their host's circuit was open, retried at the end of the run.
+
+    Each item is a coroutine function that performs the download again; it
+    raises CircuitOpenError while the host is still down and returns a
+    falsy value (or raises) when it gives up on the download. drain() waits for
+    each host's next probe, sends one item as the probe and, once the
+    circuit closes, the rest of that host's items together. ``groups`` tag
+    items (an episode, a comic) so callers can tell with pending() which
+    records to finalize after the drain, in the callbacks given to
+    after_drain(). drain() waits for each probe with ``sleep``. defer(),
+    pending() and after_drain() may be called from worker threads; drain()
+    runs once, on an event loop, after they are done.
+    """
+
+    def __init__(
+        self,
+        breaker: HostCircuitBreaker,
+        rounds: int = 5,
+        sleep: Callable[[float], Awaitable[Any]] = asyncio.sleep,
+    ):
+        self.breaker = breaker
+        self.rounds = rounds
+        self.sleep = sleep
+        self.items: List[Tuple[str, Callable[[], Awaitable[Any]]]] = []
+        self.groups: Dict[Hashable, int] = {}
+        self.finalizers: List[Callable[[], None]] = []
+        self.recovered = 0
+        self.lost = 0
+        self.lock = threading.Lock()
+
+    def defer(self, url: str, retry: Callable[[], Awaitable[Any]], *groups: Hashable) -> None:
+        with self.lock:
+            self.items.append((url, retry))
+            for group in groups:
+                self.groups[group] = self.groups.get(group, 0) + 1
+
+    def pending(self, group: Hashable) -> bool:
+        with self.lock:
+            return group in self.groups
+
+    def after_drain(self, finalize: Callable[[], None]) -> None:
+        with self.lock:
+            self.finalizers.append(finalize)
+
+    async def attempt(self, retry: Callable[[], Awaitable[Any]]) -> bool:
+        """Run one deferred item; False if its host is still open and it stays deferred."""
+        try:
+            result = await retry()
+        except CircuitOpenError:
+            return False
+        except Exception:
+            self.lost += 1
+            return True
+        if result:
+            self.recovered += 1
+        else:
+            self.lost += 1
+        return True
+
+    async def drain_host(self, items: List[Tuple[str, Callable[[], Awaitable[Any]]]]) -> None:
+        for _ in range(self.rounds):
+            await self.sleep(self.breaker.retry_in(items[0][0]))
+            if not await self.attempt(items[0][1]):
+                continue
+            items = items[1:]
+            outcomes = await asyncio.gather(*(self.attempt(retry) for _, retry in items))
+            items = [item for item, done in zip(items, outcomes) if not done]
+            if not items:
+                return
+        self.lost += len(items)
+
+    async def drain(self) -> None:
+        by_host: Dict[str, List[Tuple[str, Callable[[], Awaitable[Any]]]]] = {}
+        for url, retry in self.items:
+            by_host.setdefault(host_of(url), []).append((url, retry))
+        self.items = []
+        await asyncio.gather(*(self.drain_host(items) for items in by_host.values()))
+        for finalize in self.finalizers:
+            finalize()
+        self.finalizers = []
+
+    def report(self) -> str:
+        return f"{self.recovered} deferred downloads recovered, {self.lost} lost"
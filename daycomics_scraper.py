@@ -3,53 +3,110 @@ import time
 import json
 import asyncio
 import aiohttp
-import aiofiles
 from dotenv import load_dotenv
 from pathlib import Path
-from typing import List, Dict, Any, Optional, Callable
+from typing import List, Dict, Any, Optional, Callable, Tuple
 import xml.etree.ElementTree as ET
-from xml.dom import minidom
 import re
+from contextlib import nullcontext
+from functools import partial
 
 import colorama
 from colorama import Fore, Style
-from dicttoxml import dicttoxml
 from playwright.async_api import async_playwright, Browser, Page
 
+from adaptive_limiter import AdaptiveLimiter
+from browser_resources import ResourceBlocker, ResponseCapture
+from circuit_breaker import CircuitOpenError, DeferredDownloads, HostCircuitBreaker
+from download_scheduler import DownloadScheduler, EpisodeDownloads
+from episode_pipeline import PipelineStats, run_pipeline
+from image_store import ContentStore
+from jsonl_export import JsonLinesWriter, compact, iter_json_lines
+from page_state import JsonResponses, comic_metadata, embedded_states, matches_dom, wait_for_image_list
+from page_waits import PageWaits
+from rate_limiter import HostRateLimiter
+from retry_policy import RetryPolicy
+from run_journal import RunJournal
+from session_cache import SessionCache
+from streaming_download import HttpStatusError, stream_to_file
+from xml_export import write_xml
+
 # Initialize colorama
 colorama.init(autoreset=True)
 
 load_dotenv()
 
+RATE_LIMITER = HostRateLimiter(rate=10.0, burst=20)
+RETRY_POLICY = RetryPolicy()
+CIRCUIT_BREAKER = HostCircuitBreaker()
+IMAGE_STORE: Optional[ContentStore] = None  # --image-store
+RESOURCE_BLOCKER: Optional[ResourceBlocker] = None  # --block-resources
+IMAGE_CAPTURE: Optional[ResponseCapture] = None  # --capture-images
+SESSION_CACHE = SessionCache('daycomics')
+# The login button is drawn client-side, so the probe has to render the page
+SESSION_PROBE_URL = 'https://daycomics.com'
+LOGGED_OUT_SELECTOR = 'a[href=""] img[alt="login"]'
+PAGE_WAITS = PageWaits({'login': 15, 'login_modals': 5, 'content_page': 10, 'details_modal': 3,
+                        'first_episode': 5, 'episode_modal': 2, 'episode_images': 3, 'episode_data': 2})
+JOURNAL_PATH = 'daycomics_journal.jsonl'
+# daycomics.json and daycomics.xml are written from this once the run ends
+RESULTS_PATH = 'daycomics.jsonl'
+
 
 async def delay(ms: int):
     """Delay execution for the given number of milliseconds."""
     await asyncio.sleep(ms / 1000)
 
 
-async def download_image(url: str, filepath: str, session: aiohttp.ClientSession, retries: int = 3) -> str:
-    """Download an image from the given URL and save it to the specified filepath."""
-    for attempt in range(1, retries + 1):
+async def download_image(url: str, filepath: str, session: aiohttp.ClientSession,
+                         limiter: Optional[AdaptiveLimiter] = None) -> str:
+    """Download an image from the given URL and save it to the specified filepath.
+
+    Failed attempts are retried as RETRY_POLICY decides; the last error is raised.
+    """
+    attempt = 0
+    while True:
+        attempt += 1
+        # Fails fast with CircuitOpenError while the host is down
+        CIRCUIT_BREAKER.before(url)
+        RETRY_POLICY.started(attempt)
         try:
-            async with session.get(
-                    url,
-                    headers={"referer": "https://daycomics.com"},
-                    timeout=aiohttp.ClientTimeout(total=30)
-            ) as response:
-                if response.status != 200:
-                    raise Exception(f"HTTP error {response.status}")
-
-                async with aiofiles.open(filepath, 'wb') as f:
-                    await f.write(await response.read())
-
-                return filepath
+            await RATE_LIMITER.wait_async(url)
+            async with limiter.slot() if limiter else nullcontext():
+                async with session.get(
+                        url,
+                        headers={"referer": "https://daycomics.com"},
+                        timeout=aiohttp.ClientTimeout(total=30)
+                ) as response:
+                    if response.status != 200:
+                        raise HttpStatusError(response.status, response.headers)
+
+                    written = await stream_to_file(response, filepath, store=IMAGE_STORE)
+
+            if RESOURCE_BLOCKER:
+                RESOURCE_BLOCKER.credit(url, written)
+
+            CIRCUIT_BREAKER.success(url)
+            RETRY_POLICY.success()
+            return filepath
         except Exception as e:
-            if attempt == retries:
-                raise Exception(f"Failed to download after {retries} attempts: {str(e)}")
-            print(f"{Fore.YELLOW}{Style.BRIGHT}Retrying download ({attempt}/{retries})...")
-            await asyncio.sleep(1)  # 001 second delay between retries
-            return None
-    return None
+            CIRCUIT_BREAKER.failure(url, e)
+            wait = RETRY_POLICY.retry_delay(attempt, e)
+            if wait is None:
+                print(f"{Fore.RED}{Style.BRIGHT}Failed to download after {attempt} attempts: {url}")
+                raise
+            print(f"{Fore.YELLOW}{Style.BRIGHT}Retrying download ({attempt}/{RETRY_POLICY.attempts}) in {wait:.1f}s...")
+            await asyncio.sleep(wait)
+
+
+async def download_thumbnail(url: str, filepath: str, session: aiohttp.ClientSession) -> bool:
+    """download_image() for covers and thumbnails: a failure is logged and the comic goes on without the file."""
+    try:
+        await download_image(url, filepath, session)
+        return True
+    except Exception as e:
+        print(f"{Fore.YELLOW}{Style.BRIGHT}Failed to download thumbnail {url}: {str(e)}")
+        return False
 
 
 async def login_to_daycomics(page: Page) -> None:
@@ -58,34 +115,29 @@ async def login_to_daycomics(page: Page) -> None:
         print(f"{Fore.YELLOW}{Style.BRIGHT}Navigating to daycomics.com")
         await page.goto('https://daycomics.com', wait_until='load')
 
-        # Чекаємо повне завантаження сторінки
-        await asyncio.sleep(3)
+        # Чекаємо, поки сторінка перестане довантажувати скрипти
+        await PAGE_WAITS.network_idle(page, 'login')
 
         # НОВЕ: Закриваємо модальне вікно з рекламою планів, якщо воно з'являється
         try:
             print(f"{Fore.YELLOW}{Style.BRIGHT}Checking for plans modal window")
             # Чекаємо появу модального вікна протягом 5 секунд
-            modal_close_btn = await page.wait_for_selector('.closeBtn', timeout=5000)
-            if modal_close_btn:
+            if await PAGE_WAITS.selector(page, 'login_modals', '.closeBtn'):
                 print(f"{Fore.YELLOW}{Style.BRIGHT}Plans modal found, closing it")
-                await modal_close_btn.click()
-                await asyncio.sleep(2)  # Збільшуємо час очікування після закриття
+                await page.click('.closeBtn')
+                await PAGE_WAITS.hidden(page, 'login_modals', '.closeBtn')
                 print(f"{Fore.GREEN}{Style.BRIGHT}Plans modal closed successfully")
             else:
                 print(f"{Fore.YELLOW}{Style.BRIGHT}Plans modal not found")
         except Exception as e:
             print(f"{Fore.YELLOW}{Style.BRIGHT}No plans modal found or failed to close it: {str(e)}")
 
-        # Додаткова пауза перед початком логіну
-        await asyncio.sleep(2)
-
         # Click to call login popup
         print(f"{Fore.YELLOW}{Style.BRIGHT}Opening login popup")
         try:
             # Новий селектор для кнопки login
             await page.wait_for_selector('a[href=""] img[alt="login"]', timeout=10000)
             await page.click('a[href=""] img[alt="login"]')
-            await asyncio.sleep(2)  # Пауза після кліку
         except Exception as e:
             print(f"{Fore.RED}{Style.BRIGHT}Failed to find login popup button: {str(e)}")
             return
@@ -95,7 +147,6 @@ async def login_to_daycomics(page: Page) -> None:
         try:
             await page.wait_for_selector('button:has-text("Log In")', timeout=10000)
             await page.click('button:has-text("Log In")')
-            await asyncio.sleep(2)  # Пауза після кліку
             print(f"{Fore.GREEN}{Style.BRIGHT}'Log In' button clicked")
         except Exception as e:
             print(f"{Fore.RED}{Style.BRIGHT}Failed to find 'Log In' button: {str(e)}")
@@ -106,7 +157,6 @@ async def login_to_daycomics(page: Page) -> None:
         try:
             await page.wait_for_selector('#email-button', timeout=10000)
             await page.click('#email-button')
-            await asyncio.sleep(2)  # Пауза після кліку
             print(f"{Fore.GREEN}{Style.BRIGHT}Email button clicked")
         except Exception as e:
             print(f"{Fore.RED}{Style.BRIGHT}Failed to find email button: {str(e)}")
@@ -121,7 +171,6 @@ async def login_to_daycomics(page: Page) -> None:
             email_input = await page.wait_for_selector('input[name=email]', timeout=10000)
             if email_input:
                 await email_input.click()  # Клікаємо для фокусу
-                await asyncio.sleep(0.5)
                 await email_input.fill('')  # Очищаємо поле
                 await email_input.type(os.getenv('DAYCOMICS_LOGIN'), delay=50)  # Повільно вводимо
                 print(f"{Fore.GREEN}{Style.BRIGHT}Email entered successfully")
@@ -138,7 +187,6 @@ async def login_to_daycomics(page: Page) -> None:
             password_input = await page.wait_for_selector('input[name=password]', timeout=10000)
             if password_input:
                 await password_input.click()
-                await asyncio.sleep(0.5)
                 await password_input.fill('')
                 await password_input.type(os.getenv('DAYCOMICS_PASSWORD'), delay=50)
                 print(f"{Fore.GREEN}{Style.BRIGHT}Password entered successfully")
@@ -163,7 +211,8 @@ async def login_to_daycomics(page: Page) -> None:
 
         # Wait for login to complete
         print(f"{Fore.YELLOW}{Style.BRIGHT}Waiting for login to complete...")
-        await asyncio.sleep(5)
+        await PAGE_WAITS.hidden(page, 'login', '#signButton')
+        await PAGE_WAITS.network_idle(page, 'login')
         print(f"{Fore.GREEN}{Style.BRIGHT}Login process completed")
 
     except Exception as e:
@@ -192,12 +241,141 @@ def update_console_output(comic_progress, title, total_ep, current_ep, total_ep_
     )
 
 
-async def parse_daycomics(urls: List[str], progress_callback=None, start_episode=1):
+async def scrape_images_from_dom(page: Page) -> List[str]:
+    """Image URLs from the episode viewer's DOM, after scrolling so every strip is in it."""
+    # Спочатку прокручуємо сторінку вниз, щоб завантажилися всі зображення
+    # Оптимізований швидкий скрол
+    await page.evaluate('''
+        () => {
+            return new Promise((resolve) => {
+                // Спочатку швидко прокручуємо до кінця
+                window.scrollTo(0, document.body.scrollHeight);
+            
+                // Потім робимо невеликий скрол назад і вперед для завантаження
+                let lastHeight = document.body.scrollHeight;
+                let attempts = 0;
+                let timer = setInterval(() => {
+                    window.scrollBy(0, 500); // Великий крок для швидкості
+                    let currentHeight = document.body.scrollHeight;
+                
+                    // Якщо висота не змінюється або досягли кінця
+                    if (currentHeight === lastHeight || window.innerHeight + window.scrollY >= currentHeight - 10) {
+                        attempts++;
+                        if (attempts >= 2) { // Дві спроби без зміни висоти
+                            clearInterval(timer);
+                            resolve();
+                        }
+                    } else {
+                        attempts = 0;
+                        lastHeight = currentHeight;
+                    }
+                }, 30); // Ще менший інтервал для швидкості
+            
+                // Таймаут на випадок, якщо щось пішло не так
+                setTimeout(() => {
+                    clearInterval(timer);
+                    resolve();
+                }, 2000); // Максимум 2 секунди на скрол
+            });
+        }
+    ''')
+
+    # Чекаємо, поки кількість зображень перестане зростати
+    await PAGE_WAITS.count_stable(page, 'episode_images', '#comicContent .imgSubWrapper img')
+
+    # Збираємо всі зображення з комікса
+    return await page.evaluate('''
+        () => {
+            const imageElements = document.querySelectorAll('#comicContent .imgSubWrapper img');
+            const imageUrls = [];
+
+            imageElements.forEach(img => {
+                // Спочатку перевіряємо data-src, потім src
+                let imageUrl = img.getAttribute('data-src') || img.src;
+
+                // Пропускаємо base64 заглушки
+                if (imageUrl && !imageUrl.includes('data:image/gif;base64')) {
+                    imageUrls.push(imageUrl);
+                }
+            });
+
+            return imageUrls;
+        }
+    ''')
+
+
+async def read_description_from_modal(page: Page) -> str:
+    """Опис комікса з модального вікна Details: запасний шлях, коли його немає в даних сторінки."""
+    # Натискаємо кнопку Details для отримання опису
+    description = ''
+    try:
+        print(f"{Fore.YELLOW}{Style.BRIGHT}Clicking Details button to get description")
+        details_button = await page.wait_for_selector('button.btnRead', timeout=5000)
+        if details_button:
+            await details_button.click()
+            await PAGE_WAITS.selector(page, 'details_modal', '.cont_area p')
+
+            # Отримуємо опис
+            try:
+                description = await page.eval_on_selector('.cont_area p', 'el => el.innerText')
+                print(f"{Fore.GREEN}{Style.BRIGHT}Description: {description}")
+            except Exception as e:
+                print(f"{Fore.YELLOW}{Style.BRIGHT}Failed to get description: {str(e)}")
+                description = ''
+
+            # Закриваємо модальне вікно після отримання опису
+            try:
+                print(f"{Fore.YELLOW}{Style.BRIGHT}Closing the details modal")
+                # Пошук кнопки закриття або клік за межами модального вікна
+                close_button = await page.wait_for_selector('.btnClear, .btn-close, .close-button',
+                                                            timeout=3000)
+                if close_button:
+                    await close_button.click()
+                    print(f"{Fore.GREEN}{Style.BRIGHT}Modal closed using close button")
+                else:
+                    # Якщо кнопка не знайдена, спробуємо натиснути Escape
+                    await page.keyboard.press('Escape')
+                    print(f"{Fore.GREEN}{Style.BRIGHT}Modal closed using Escape key")
+
+                await PAGE_WAITS.hidden(page, 'details_modal', '.cont_area p')
+            except Exception as e:
+                print(
+                    f"{Fore.YELLOW}{Style.BRIGHT}Failed to close modal, trying alternative methods: {str(e)}")
+                # Спробуємо клікнути за межами модального вікна
+                try:
+                    await page.mouse.click(10, 10)  # Клік у верхньому лівому куті сторінки
+                    print(f"{Fore.GREEN}{Style.BRIGHT}Attempted to close modal by clicking outside")
+                    await PAGE_WAITS.hidden(page, 'details_modal', '.cont_area p')
+                except Exception:
+                    pass
+
+    except Exception as e:
+        print(
+            f"{Fore.YELLOW}{Style.BRIGHT}Details button not found or couldn't be clicked: {str(e)}")
+        description = ''
+
+    return description
+
+
+async def parse_daycomics(urls: List[str], progress_callback=None, start_episode=1,
+                          journal: Optional[RunJournal] = None):
     """Main function to parse and download honeytoon from DayComics."""
-    comics = []
     failed_comics = []
+    fatal_error = False
     total_comics = len(urls)
     current_comic = 0
+    # Один адаптивний лімітер на весь запуск замість Semaphore(10) на кожен епізод
+    image_limiter = AdaptiveLimiter(initial=10)
+    # JSON-відповіді сторінки епізоду, з яких береться список зображень
+    episode_responses = JsonResponses()
+    image_sources = {'page data': 0, 'DOM': 0}
+    # Кількість коміксів і сумарний час отримання метаданих для кожного шляху
+    metadata_timing = {'page data': [0, 0.0], 'modal': [0, 0.0]}
+    pipeline_stats = PipelineStats()
+    # Спільні воркери для зображень усіх епізодів; скільки з них качає одночасно, вирішує лімітер
+    scheduler = DownloadScheduler(transfers=image_limiter.maximum)
+    # Зображення з хостів, чий вимикач спрацював; докачуються після обходу всіх коміксів
+    deferred = DeferredDownloads(CIRCUIT_BREAKER)
 
     async with async_playwright() as p:
         browser = await p.chromium.launch(
@@ -213,8 +391,14 @@ async def parse_daycomics(urls: List[str], progress_callback=None, start_episode
         print(f"{Fore.GREEN}{Style.BRIGHT}Browser launched successfully")
 
         try:
-            context = await browser.new_context(viewport={'width': 1920, 'height': 1080})
+            saved_state = SESSION_CACHE.state()
+            context = await browser.new_context(viewport={'width': 1920, 'height': 1080}, storage_state=saved_state)
+            if RESOURCE_BLOCKER:
+                await RESOURCE_BLOCKER.install(context)
             page = await context.new_page()
+            if IMAGE_CAPTURE:
+                IMAGE_CAPTURE.attach(page)
+            episode_responses.attach(page)
 
             # Set timeouts
             print(f"{Fore.GREEN}{Style.BRIGHT}Setting page timeouts")
@@ -222,24 +406,59 @@ async def parse_daycomics(urls: List[str], progress_callback=None, start_episode
             page.set_default_navigation_timeout(120000)
 
             # Login once before processing honeytoon
-            print(f"{Fore.GREEN}{Style.BRIGHT}Attempting to login to DayComics")
-            await login_to_daycomics(page)
+            if saved_state and await SESSION_CACHE.probe_page(context, SESSION_PROBE_URL, LOGGED_OUT_SELECTOR):
+                print(f"{Fore.GREEN}{Style.BRIGHT}Reusing saved DayComics session from {SESSION_CACHE.path}")
+            else:
+                print(f"{Fore.GREEN}{Style.BRIGHT}Attempting to login to DayComics")
+                await login_to_daycomics(page)
+                await SESSION_CACHE.save(context)
+
+            async with aiohttp.ClientSession() as session, JsonLinesWriter(RESULTS_PATH) as results, scheduler:
+                def save_deferred_comic(comic_url: str, comic_data: Dict[str, Any], comic_folder: str,
+                                        deferred_episodes: Dict[int, str]) -> None:
+                    """Дописує комікс, що чекав на відкладені зображення, після докачування."""
+                    for index, episode_key in deferred_episodes.items():
+                        episode = comic_data['episodes'][index]
+                        episode_folder = f"{comic_folder}/{index + 1:03d}"
+                        # Як і раніше, невдале зображення позначає невдалим увесь комікс
+                        if not all(os.path.exists(f"{episode_folder}/{name}") for name in episode['images']):
+                            print(f"{Fore.RED}{Style.BRIGHT}Failed to parse comic at URL: {comic_url}")
+                            print(f"{Fore.RED}{Style.BRIGHT}Error: deferred images of {episode['title']} were lost")
+                            failed_comics.append(comic_url)
+                            return
+                        if journal:
+                            journal.record_episode(comic_url, episode_key, episode)
+                    results.write(comic_data)
+                    if journal:
+                        journal.record_comic(comic_url, comic_data)
 
-            async with aiohttp.ClientSession() as session:
                 for url in urls:
                     current_comic += 1
                     comic_progress = {'current': current_comic, 'total': total_comics}
                     update_console_output(comic_progress, "Loading...", 0, 0, 0)
 
+                    # Комікс уже повністю оброблено в перерваному запуску
+                    finished = journal.comic(url) if journal else None
+                    if finished:
+                        results.write(finished)
+                        print(f"{Fore.GREEN}{Style.BRIGHT}Skipping already parsed comic: {finished['originalTitle']}")
+                        continue
+
                     try:
+                        episode_responses.start()
+                        await RATE_LIMITER.wait_async(url)
                         await page.goto(url, wait_until='load')
-                        await asyncio.sleep(5)
+                        await PAGE_WAITS.selector(page, 'content_page', '.episodeListCon a', state='attached')
 
                         # Get comic details
                         title = await page.eval_on_selector('#titleSubWrapper > p', 'el => el.innerText')
                         print(f"{Fore.GREEN}{Style.BRIGHT}Title: {title}")
 
-                        thumbnail = await page.eval_on_selector('#bnrEpisode img', 'el => el.src')
+                        try:
+                            thumbnail = await page.eval_on_selector('#bnrEpisode img', 'el => el.src')
+                        except Exception:
+                            # Підставимо обкладинку з даних сторінки нижче
+                            thumbnail = ''
                         print(f"{Fore.GREEN}{Style.BRIGHT}Image: {thumbnail}")
 
                         # ЗМІНА: Замінюємо genres на genres_raw
@@ -247,53 +466,23 @@ async def parse_daycomics(urls: List[str], progress_callback=None, start_episode
                                                                      'els => els.map(el => el.textContent)')
                         print(f"{Fore.GREEN}{Style.BRIGHT}All genre/tag items: {genres_raw}")
 
-                        # Натискаємо кнопку Details для отримання опису
-                        description = ''
-                        try:
-                            print(f"{Fore.YELLOW}{Style.BRIGHT}Clicking Details button to get description")
-                            details_button = await page.wait_for_selector('button.btnRead', timeout=5000)
-                            if details_button:
-                                await details_button.click()
-                                await asyncio.sleep(2)  # Чекаємо, поки з'явиться опис
-
-                                # Отримуємо опис
-                                try:
-                                    description = await page.eval_on_selector('.cont_area p', 'el => el.innerText')
-                                    print(f"{Fore.GREEN}{Style.BRIGHT}Description: {description}")
-                                except Exception as e:
-                                    print(f"{Fore.YELLOW}{Style.BRIGHT}Failed to get description: {str(e)}")
-                                    description = ''
-
-                                # Закриваємо модальне вікно після отримання опису
-                                try:
-                                    print(f"{Fore.YELLOW}{Style.BRIGHT}Closing the details modal")
-                                    # Пошук кнопки закриття або клік за межами модального вікна
-                                    close_button = await page.wait_for_selector('.btnClear, .btn-close, .close-button',
-                                                                                timeout=3000)
-                                    if close_button:
-                                        await close_button.click()
-                                        print(f"{Fore.GREEN}{Style.BRIGHT}Modal closed using close button")
-                                    else:
-                                        # Якщо кнопка не знайдена, спробуємо натиснути Escape
-                                        await page.keyboard.press('Escape')
-                                        print(f"{Fore.GREEN}{Style.BRIGHT}Modal closed using Escape key")
-
-                                    await asyncio.sleep(1)  # Чекаємо, поки модальне вікно закриється
-                                except Exception as e:
-                                    print(
-                                        f"{Fore.YELLOW}{Style.BRIGHT}Failed to close modal, trying alternative methods: {str(e)}")
-                                    # Спробуємо клікнути за межами модального вікна
-                                    try:
-                                        await page.mouse.click(10, 10)  # Клік у верхньому лівому куті сторінки
-                                        print(f"{Fore.GREEN}{Style.BRIGHT}Attempted to close modal by clicking outside")
-                                        await asyncio.sleep(1)
-                                    except Exception:
-                                        pass
-
-                        except Exception as e:
-                            print(
-                                f"{Fore.YELLOW}{Style.BRIGHT}Details button not found or couldn't be clicked: {str(e)}")
-                            description = ''
+                        # Опис, ключові слова й обкладинку беремо з даних сторінки; модальне вікно Details - запасний шлях
+                        started = time.perf_counter()
+                        await episode_responses.settle(timeout=1)
+                        metadata = comic_metadata(await embedded_states(page) + episode_responses.documents, title)
+                        description = metadata.get('description', '')
+                        if description:
+                            metadata_source = 'page data'
+                            print(f"{Fore.GREEN}{Style.BRIGHT}Description from page data: {description}")
+                        else:
+                            metadata_source = 'modal'
+                            description = await read_description_from_modal(page)
+                        if not genres_raw:
+                            genres_raw = metadata.get('keywords', [])
+                        if not thumbnail:
+                            thumbnail = metadata.get('thumbnail', '')
+                        metadata_timing[metadata_source][0] += 1
+                        metadata_timing[metadata_source][1] += time.perf_counter() - started
 
                         update_console_output(comic_progress, title, 0, 0, 0)
 
@@ -302,9 +491,7 @@ async def parse_daycomics(urls: List[str], progress_callback=None, start_episode
 
                         thumbnail_extension = thumbnail.split('.')[-1]
                         thumbnail_filename = f"{comic_folder}/thumbnail.{thumbnail_extension}"
-                        await download_image(thumbnail, thumbnail_filename, session)
-
-                        await asyncio.sleep(1)
+                        await download_thumbnail(thumbnail, thumbnail_filename, session)
 
                         # Map episodes
                         episodes = await page.eval_on_selector_all('.episodeListCon a', '''
@@ -377,21 +564,32 @@ async def parse_daycomics(urls: List[str], progress_callback=None, start_episode
                         except Exception as e:
                             print(f"{Fore.YELLOW}{Style.BRIGHT}ModalContainer not found, continuing...")
 
-                        await asyncio.sleep(1)  # Зменшено з 5 до 1 секунди
+                        await PAGE_WAITS.network_idle(page, 'first_episode')
 
                         total_episodes = len(episodes)
                         current_episode = 0
                         update_console_output(comic_progress, title, total_episodes, current_episode, total_episodes)
 
-                        # For each episode, navigate to its page and extract all images
-                        for episode in episodes:
-                            current_episode += 1
+                        async def resolve_episode(index: int) -> Optional[Tuple[str, List[str]]]:
+                            """Перший етап: відкриває епізод і повертає ключ журналу та список зображень.
+
+                            None - завантажувати нічого (пропущений, уже готовий, заблокований або без URL).
+                            """
+                            episode = episodes[index]
+                            current_episode = index + 1
 
                             # НОВЕ: Пропускаємо епізоди до start_episode
                             if current_episode < start_episode:
                                 print(
                                     f"{Fore.YELLOW}{Style.BRIGHT}Skipping episode {current_episode:03d} (starting from {start_episode:03d})")
-                                continue
+                                return None
+
+                            # Епізод уже завантажено в перерваному запуску
+                            episode_key = episode.get('url') or f"{current_episode:03d}"
+                            finished_episode = journal.episode(url, episode_key) if journal else None
+                            if finished_episode:
+                                episodes[index] = finished_episode
+                                return None
 
                             update_console_output(comic_progress, title, total_episodes, current_episode,
                                                   total_episodes)
@@ -410,7 +608,7 @@ async def parse_daycomics(urls: List[str], progress_callback=None, start_episode
                                 episode_thumbnail_extension = episode_thumbnail_extension.split('?')[0]
 
                             episode_thumbnail_filename = f"{episode_folder}/thumbnail.{episode_thumbnail_extension}"
-                            await download_image(episode_thumbnail, episode_thumbnail_filename, session)
+                            await download_thumbnail(episode_thumbnail, episode_thumbnail_filename, session)
 
                             # ЗМІНА: Оновлюємо шлях до thumbnail в даних епізоду на локальний
                             episode['thumbnail'] = "thumbnail.jpg"  # Завжди використовуємо jpg для уніфікації
@@ -425,16 +623,20 @@ async def parse_daycomics(urls: List[str], progress_callback=None, start_episode
                             # Check if URL exists and is valid
                             if not episode.get('url'):
                                 print(f"{Fore.RED}{Style.BRIGHT}Episode {current_episode:03d}: No URL found, skipping")
-                                continue
+                                return None
 
                             if episode.get('isLocked', True):
                                 print(
                                     f"{Fore.YELLOW}{Style.BRIGHT}Episode {current_episode:03d}: Episode is locked, skipping")
-                                continue
+                                return None
 
                             print(
                                 f"{Fore.GREEN}{Style.BRIGHT}Episode {current_episode:03d}: Proceeding to download images...")
 
+                            if IMAGE_CAPTURE:
+                                IMAGE_CAPTURE.start()
+                            episode_responses.start()
+                            await RATE_LIMITER.wait_async(episode['url'])
                             await page.goto(episode['url'], wait_until='domcontentloaded')  # Швидше завантаження
 
                             # Check for modal and dismiss it
@@ -443,72 +645,36 @@ async def parse_daycomics(urls: List[str], progress_callback=None, start_episode
                                 if modal:
                                     await page.click('.coachMarks04 button')
                                     print(f"{Fore.YELLOW}{Style.BRIGHT}Episode modal dismissed")
-                                    await asyncio.sleep(0.3)  # Мінімальна затримка після закриття
+                                    await PAGE_WAITS.hidden(page, 'episode_modal', '#ModalContainer')
                             except Exception as e:
                                 pass  # Не виводимо повідомлення, якщо модальне вікно не знайдено
 
                             # Get images - ОНОВЛЕНИЙ КОД ДЛЯ ЗБОРУ ЗОБРАЖЕНЬ
                             print(f"{Fore.YELLOW}{Style.BRIGHT}Collecting episode images...")
 
-                            # Спочатку прокручуємо сторінку вниз, щоб завантажилися всі зображення
-                            # Оптимізований швидкий скрол
-                            await page.evaluate('''
-                                () => {
-                                    return new Promise((resolve) => {
-                                        // Спочатку швидко прокручуємо до кінця
-                                        window.scrollTo(0, document.body.scrollHeight);
-                                        
-                                        // Потім робимо невеликий скрол назад і вперед для завантаження
-                                        let lastHeight = document.body.scrollHeight;
-                                        let attempts = 0;
-                                        let timer = setInterval(() => {
-                                            window.scrollBy(0, 500); // Великий крок для швидкості
-                                            let currentHeight = document.body.scrollHeight;
-                                            
-                                            // Якщо висота не змінюється або досягли кінця
-                                            if (currentHeight === lastHeight || window.innerHeight + window.scrollY >= currentHeight - 10) {
-                                                attempts++;
-                                                if (attempts >= 2) { // Дві спроби без зміни висоти
-                                                    clearInterval(timer);
-                                                    resolve();
-                                                }
-                                            } else {
-                                                attempts = 0;
-                                                lastHeight = currentHeight;
-                                            }
-                                        }, 30); // Ще менший інтервал для швидкості
-                                        
-                                        // Таймаут на випадок, якщо щось пішло не так
-                                        setTimeout(() => {
-                                            clearInterval(timer);
-                                            resolve();
-                                        }, 2000); // Максимум 2 секунди на скрол
-                                    });
-                                }
-                            ''')
-
-                            # Чекаємо завантаження зображень
-                            await asyncio.sleep(0.5)  # Зменшено до 0.5 секунди
-
-                            # Збираємо всі зображення з комікса
-                            images = await page.evaluate('''
-                                () => {
-                                    const imageElements = document.querySelectorAll('#comicContent .imgSubWrapper img');
-                                    const imageUrls = [];
-
-                                    imageElements.forEach(img => {
-                                        // Спочатку перевіряємо data-src, потім src
-                                        let imageUrl = img.getAttribute('data-src') || img.src;
-
-                                        // Пропускаємо base64 заглушки
-                                        if (imageUrl && !imageUrl.includes('data:image/gif;base64')) {
-                                            imageUrls.push(imageUrl);
-                                        }
-                                    });
-
-                                    return imageUrls;
-                                }
-                            ''')
+                            # Список зображень беремо з даних сторінки (вбудований стан або JSON-відповідь в'ювера),
+                            # без прокручування; DOM лишається запасним шляхом
+                            # Якщо дані жодного разу не містили списку, далі не чекаємо на них
+                            data_timeout = PAGE_WAITS.bound_ms('episode_data') / 1000
+                            if not image_sources['page data'] and image_sources['DOM'] >= 3:
+                                data_timeout = 0
+                            started = time.perf_counter()
+                            images = await wait_for_image_list(page, episode_responses, timeout=data_timeout)
+                            PAGE_WAITS.record('episode_data', started, bool(images))
+                            # Список з даних приймаємо лише тоді, коли він збігається з тим, що рендерить в'ювер
+                            if images and not await matches_dom(page, images, '#comicContent .imgSubWrapper img',
+                                                                PAGE_WAITS.bound_ms('episode_images') / 1000):
+                                print(f"{Fore.YELLOW}{Style.BRIGHT}Image list from page data does not match the viewer, "
+                                      f"using the DOM")
+                                images = []
+                            if images:
+                                image_sources['page data'] += 1
+                                if IMAGE_CAPTURE:
+                                    # Перехоплення відповідей потребує, щоб браузер сам запросив кожне зображення
+                                    await IMAGE_CAPTURE.scroll_through(page)
+                            else:
+                                image_sources['DOM'] += 1
+                                images = await scrape_images_from_dom(page)
 
                             print(f"{Fore.GREEN}{Style.BRIGHT}Images found: {len(images)}")
 
@@ -518,20 +684,72 @@ async def parse_daycomics(urls: List[str], progress_callback=None, start_episode
 
                             episode['images'] = images
                             del episode['url']  # Remove temporary URL property
+                            return episode_key, images
+
+                        # Епізоди, чиї зображення ще в черзі планувальника; їх дописують ці задачі
+                        finalizers = []
+                        # Епізоди з відкладеними зображеннями (індекс -> ключ журналу), їх дописує save_deferred_comic()
+                        deferred_episodes: Dict[int, str] = {}
+
+                        async def finish_episode(index: int, episode_key: str, image_filenames: List[str],
+                                                 downloads: EpisodeDownloads) -> None:
+                            await downloads.wait()
+                            if downloads.errors:
+                                raise downloads.errors[0]
+                            # Оновлюємо шляхи до зображень в episode
+                            episode = episodes[index]
+                            episode['images'] = image_filenames
+                            if deferred.pending(f"./daycomics/{title}/{index + 1:03d}"):
+                                deferred_episodes[index] = episode_key
+                            elif journal:
+                                journal.record_episode(url, episode_key, episode)
+
+                        async def download_episode(index: int, job: Optional[Tuple[str, List[str]]]) -> None:
+                            """Другий етап: ставить зображення епізоду в чергу спільного планувальника завантажень.
+
+                            Епізод дописується, коли завершаться всі його зображення, а воркери тим часом
+                            беруть зображення наступного епізоду замість чекати найповільніше з цього.
+                            """
+                            if job is None:
+                                return
+                            episode_key, images = job
+                            current_episode = index + 1
+                            episode_folder = f"./daycomics/{title}/{current_episode:03d}"
+                            episode_journal = journal.for_episode(url, episode_key) if journal else None
 
                             total_images = len(images)
                             current_image = 0
 
                             # Підготовка даних для паралельного завантаження
-                            semaphore = asyncio.Semaphore(10)  # Обмежуємо до 10 одночасних завантажень
                             image_filenames = []
-                            
-                            async def download_with_semaphore(image_url, image_filename):
-                                async with semaphore:
-                                    await download_image(image_url, image_filename, session)
-                            
+
+                            async def download_deferred(index, image_url, image_filename):
+                                await download_image(image_url, image_filename, session, limiter=image_limiter)
+                                if episode_journal:
+                                    episode_journal.record_image(index, os.path.basename(image_filename))
+                                return image_filename
+
+                            async def download_with_limiter(index, image_url, image_filename):
+                                nonlocal current_image
+                                try:
+                                    if not (episode_journal and episode_journal.image_done(index, image_filename)):
+                                        # Зображення, отримане браузером, зберігаємо з відповіді, решту качаємо
+                                        if not (IMAGE_CAPTURE and await IMAGE_CAPTURE.save(image_url, image_filename)):
+                                            await download_image(image_url, image_filename, session,
+                                                                 limiter=image_limiter)
+                                        if episode_journal:
+                                            episode_journal.record_image(index, os.path.basename(image_filename))
+                                except CircuitOpenError:
+                                    # Хост недоступний: зображення докачається наприкінці запуску, ім'я вже в епізоді
+                                    deferred.defer(image_url, partial(download_deferred, index, image_url, image_filename),
+                                                   episode_folder, os.path.dirname(episode_folder))
+                                current_image += 1
+                                update_console_output(comic_progress, title, total_episodes, current_episode,
+                                                      total_episodes,
+                                                      current_image, total_images)
+
                             # Створюємо задачі для паралельного завантаження
-                            download_tasks = []
+                            download_jobs = []
                             for i, image in enumerate(images):
                                 # Get image extension
                                 image_extension = image.split('.')[-1]
@@ -543,18 +761,27 @@ async def parse_daycomics(urls: List[str], progress_callback=None, start_episode
                                 # ЗМІНА: Використовуємо новий формат назви файлу
                                 image_filename = f"{episode_folder}/episode_{current_episode:03d}_{i + 1:03d}.{image_extension}"
                                 image_filenames.append(f"episode_{current_episode:03d}_{i + 1:03d}.{image_extension}")
-                                download_tasks.append(download_with_semaphore(image, image_filename))
+                                download_jobs.append(partial(download_with_limiter, i, image, image_filename))
 
-                            # Завантажуємо зображення паралельно з оновленням прогресу
-                            for completed_task in asyncio.as_completed(download_tasks):
-                                await completed_task
-                                current_image += 1
-                                update_console_output(comic_progress, title, total_episodes, current_episode,
-                                                      total_episodes,
-                                                      current_image, total_images)
-                            
-                            # Оновлюємо шляхи до зображень в episode
-                            episode['images'] = image_filenames
+                            downloads = await scheduler.submit(download_jobs)
+                            finalizer = finish_episode(index, episode_key, image_filenames, downloads)
+                            if IMAGE_CAPTURE:
+                                # Перехоплені відповіді належать сторінці, яку наступний епізод перезапише
+                                await finalizer
+                            else:
+                                finalizers.append(asyncio.ensure_future(finalizer))
+
+                        # Поки качається епізод N, браузер уже відкриває N+1; черга обмежує випередження.
+                        # Перехоплені відповіді належать єдиній сторінці, тому з --capture-images етапи йдуть по черзі
+                        try:
+                            await run_pipeline(total_episodes, resolve_episode, download_episode,
+                                               depth=0 if IMAGE_CAPTURE else 1, stats=pipeline_stats)
+                        finally:
+                            outcomes = await asyncio.gather(*finalizers, return_exceptions=True)
+                        # Невдале зображення, як і раніше, позначає невдалим увесь комікс
+                        for outcome in outcomes:
+                            if isinstance(outcome, Exception):
+                                raise outcome
 
                         print(f"{Fore.GREEN}{Style.BRIGHT}Successfully parsed comic: {title}")
 
@@ -579,7 +806,7 @@ async def parse_daycomics(urls: List[str], progress_callback=None, start_episode
                             thumbnail_extension = thumbnail_extension.split('?')[0]
                         thumbnail_local = f"thumbnail.{thumbnail_extension}"
 
-                        comics.append({
+                        comic_data = {
                             'title': normalized_title,
                             'originalTitle': original_title,
                             'description': description,
@@ -588,8 +815,17 @@ async def parse_daycomics(urls: List[str], progress_callback=None, start_episode
                             'genres': genres,
                             'tags': tags,
                             'episodes': episodes
-                        })
-                        # Кінець нового коду
+                        }
+                        if deferred_episodes:
+                            # Записуємо після докачування, коли відомо, чи всі відкладені зображення на місці
+                            deferred.after_drain(partial(save_deferred_comic, url, comic_data, f"./daycomics/{title}",
+                                                         deferred_episodes))
+                        else:
+                            results.write(comic_data)
+                            # Кінець нового коду
+
+                            if journal:
+                                journal.record_comic(url, comic_data)
 
                         # Call progress callback
                         if progress_callback:
@@ -603,6 +839,11 @@ async def parse_daycomics(urls: List[str], progress_callback=None, start_episode
                         failed_comics.append(url)
                         continue
 
+                if deferred.items:
+                    print(f"{Fore.YELLOW}{Style.BRIGHT}Retrying {len(deferred.items)} deferred images from hosts: "
+                          f"{', '.join(CIRCUIT_BREAKER.open_hosts())}")
+                    await deferred.drain()
+
             # Clear screen before finishing
             print('\033[2J\033[0f', end='')
 
@@ -610,9 +851,30 @@ async def parse_daycomics(urls: List[str], progress_callback=None, start_episode
             # Clear screen before showing error
             print('\033[2J\033[0f', end='')
             print(f"{Fore.RED}{Style.BRIGHT}Fatal error: {str(e)}")
+            fatal_error = True
         finally:
             await browser.close()
 
+    print(f"{Fore.CYAN}{Style.BRIGHT}Image downloads: {image_limiter.summary()}")
+    print(f"{Fore.CYAN}{Style.BRIGHT}Retries: {RETRY_POLICY.report()}")
+    print(f"{Fore.CYAN}{Style.BRIGHT}Circuit breaker: {CIRCUIT_BREAKER.report()}")
+    if deferred.recovered or deferred.lost:
+        print(f"{Fore.CYAN}{Style.BRIGHT}Deferred downloads: {deferred.report()}")
+    print(f"{Fore.CYAN}{Style.BRIGHT}Page waits: {PAGE_WAITS.report()}")
+    print(f"{Fore.CYAN}{Style.BRIGHT}Episode image lists: {image_sources['page data']} from page data, "
+          f"{image_sources['DOM']} scraped from the DOM")
+    print(f"{Fore.CYAN}{Style.BRIGHT}Comic metadata: " + ", ".join(
+        f"{count} from {source} ({seconds / count:.2f} s per comic)" if count else f"0 from {source}"
+        for source, (count, seconds) in metadata_timing.items()))
+    print(f"{Fore.CYAN}{Style.BRIGHT}Episode pipeline: {pipeline_stats.report()}")
+    print(f"{Fore.CYAN}{Style.BRIGHT}Download scheduler: {scheduler.report()}")
+    if IMAGE_STORE:
+        print(f"{Fore.CYAN}{Style.BRIGHT}Deduplication: {IMAGE_STORE.report()}")
+    if RESOURCE_BLOCKER:
+        print(f"{Fore.CYAN}{Style.BRIGHT}Resource blocking: {RESOURCE_BLOCKER.report()}")
+    if IMAGE_CAPTURE:
+        print(f"{Fore.CYAN}{Style.BRIGHT}Response capture: {IMAGE_CAPTURE.report()}")
+
     # Save failed honeytoon to a separate file
     if failed_comics:
         with open('failed_daycomics.json', 'w', encoding='utf-8') as f:
@@ -621,23 +883,15 @@ async def parse_daycomics(urls: List[str], progress_callback=None, start_episode
             f"{Fore.YELLOW}{Style.BRIGHT}{len(failed_comics)} honeytoon failed to parse. URLs saved to failed_daycomics.json")
 
     # Save the result to a JSON file
-    with open('daycomics.json', 'w', encoding='utf-8') as f:
-        json.dump(comics, f, indent=2)
-
-    # Save the result to an XML file
-    xml = dicttoxml(
-        {'item': comics},
-        root=False,
-        attr_type=False,
-        item_func=lambda x: 'item'
-    )
+    compact(RESULTS_PATH, 'daycomics.json')
 
-    # Make XML pretty
-    dom = minidom.parseString(xml)
-    pretty_xml = dom.toprettyxml(indent="  ")
+    # Save the result to an XML file, streamed from the same JSON Lines file
+    write_xml(iter_json_lines(RESULTS_PATH), 'daycomics.xml')
 
-    with open('daycomics.xml', 'w', encoding='utf-8') as f:
-        f.write(pretty_xml)
+    # The journal is the resume state: keep it unless every comic finished without a fatal error
+    if journal:
+        if not journal.finish_if_complete(urls, failed=fatal_error or bool(failed_comics)):
+            print(f"{Fore.YELLOW}{Style.BRIGHT}Run incomplete, journal kept for resume: {journal.path}")
 
     return failed_comics
 
@@ -668,7 +922,23 @@ if __name__ == "__main__":
     parser.add_argument('--urls', nargs='+', help='URLs to parse')
     parser.add_argument('--file', help='File containing URLs (one per line)')
     parser.add_argument('--example', action='store_true', help='Run with an example URL')
+    parser.add_argument('--rate', type=float, default=RATE_LIMITER.rate,
+                        help=f'Requests per second per host, 0 disables pacing (default: {RATE_LIMITER.rate})')
+    parser.add_argument('--burst', type=int, default=RATE_LIMITER.burst,
+                        help=f'Requests per host allowed back to back (default: {RATE_LIMITER.burst})')
+    parser.add_argument('--image-store',
+                        help='Directory of a content-addressed image store; episode files become hardlinks')
+    parser.add_argument('--block-resources', action='store_true',
+                        help='Abort image, font, media and analytics requests in the browser; '
+                             'images are still downloaded once through aiohttp')
+    parser.add_argument('--capture-images', action='store_true',
+                        help='Save episode images from the browser\'s network responses; '
+                             'only images the browser missed are downloaded with aiohttp')
     parser.add_argument('--start', type=int, default=1, help='Start from episode number (default: 001)')
+    parser.add_argument('--relogin', action='store_true',
+                        help=f'Log in again instead of reusing the saved session ({SESSION_CACHE.path})')
+    parser.add_argument('--fresh', action='store_true',
+                        help=f'Ignore the journal of an interrupted run ({JOURNAL_PATH}) and start over')
 
     args = parser.parse_args()
 
@@ -706,8 +976,23 @@ if __name__ == "__main__":
     if args.start > 1:
         print(f"{Fore.GREEN}{Style.BRIGHT}Starting from episode {args.start}")
 
+    RATE_LIMITER.configure(rate=args.rate, burst=args.burst)
+    if args.image_store:
+        IMAGE_STORE = ContentStore(args.image_store)
+    if args.block_resources and args.capture_images:
+        parser.error('--block-resources stops the browser from receiving the images --capture-images saves')
+    if args.block_resources:
+        RESOURCE_BLOCKER = ResourceBlocker()
+    if args.capture_images:
+        IMAGE_CAPTURE = ResponseCapture(store=IMAGE_STORE)
+    if args.relogin:
+        SESSION_CACHE.discard()
+    journal = RunJournal(JOURNAL_PATH, fresh=args.fresh)
+    if journal.resumed:
+        print(f"{Fore.YELLOW}{Style.BRIGHT}Resuming interrupted run from {JOURNAL_PATH}")
+
     try:
-        asyncio.run(parse_daycomics(urls, start_episode=args.start))
+        asyncio.run(parse_daycomics(urls, start_episode=args.start, journal=journal))
     except KeyboardInterrupt:
         print(f"{Fore.YELLOW}{Style.BRIGHT}\nScript interrupted by user. Exiting...")
     except Exception as e:
@@ -0,0 +1,126 @@
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, List, Optional, Sequence, Tuple
+
+
+Job = Callable[[], Awaitable[Any]]
+
+
+class EpisodeDownloads:
+    """Completion handle for one episode's jobs in a DownloadScheduler.
+
+    ``future`` resolves to the job results in submission order once every job
+    has finished; a job that raised leaves None in its place and its error
+    in ``errors``.
+    """
+
+    def __init__(self, count: int):
+        self.results: List[Any] = [None] * count
+        self.errors: List[BaseException] = []
+        self.remaining = count
+        self.future: "asyncio.Future[List[Any]]" = asyncio.get_running_loop().create_future()
+        if count == 0:
+            self.future.set_result(self.results)
+
+    def finish(self, index: int, result: Any = None, error: Optional[BaseException] = None) -> None:
+        if error is not None:
+            self.errors.append(error)
+        else:
+            self.results[index] = result
+        self.remaining -= 1
+        if self.remaining == 0 and not self.future.done():
+            self.future.set_result(self.results)
+
+    async def wait(self) -> List[Any]:
+        return await asyncio.shield(self.future)
+
+
+class DownloadScheduler:
+    """One long-lived set of transfer workers shared by every episode of a run.
+
+    Episodes queue their image jobs with submit() and get a completion handle
+    back, so the next episode's images start as soon as a worker frees up
+    instead of after the slowest image of the previous episode. The queue
+    holds at most ``backlog`` jobs; submit() waits for room, which keeps the
+    producer from running arbitrarily far ahead of the transfers.
+    """
+
+    def __init__(self, transfers: int = 20, backlog: Optional[int] = None):
+        self.transfers = max(1, transfers)
+        self.backlog = backlog or self.transfers
+        self.queue: Optional["asyncio.Queue[Tuple[EpisodeDownloads, int, Job]]"] = None
+        self.workers: List[asyncio.Task] = []
+        self.in_flight = 0
+        self.completed = 0
+        self.failed = 0
+        self.busy_time = 0.0
+        self.started_at = 0.0
+        self.stopped_at = 0.0
+        self.last_change = 0.0
+
+    async def __aenter__(self) -> "DownloadScheduler":
+        self.start()
+        return self
+
+    async def __aexit__(self, exc_type, *exc_info) -> None:
+        await self.close(drain=exc_type is None)
+
+    def start(self) -> None:
+        self.queue = asyncio.Queue(maxsize=self.backlog)
+        self.started_at = self.last_change = time.perf_counter()
+        self.workers = [asyncio.ensure_future(self.worker()) for _ in range(self.transfers)]
+
+    async def submit(self, jobs: Sequence[Job]) -> EpisodeDownloads:
+        """Queue one episode's jobs; the handle completes when all of them have run."""
+        downloads = EpisodeDownloads(len(jobs))
+        for index, job in enumerate(jobs):
+            await self.queue.put((downloads, index, job))
+        return downloads
+
+    async def run(self, jobs: Sequence[Job]) -> List[Any]:
+        """Queue jobs and wait for them, for callers that need the results before moving on."""
+        return await (await self.submit(jobs)).wait()
+
+    def track(self, delta: int) -> None:
+        # busy_time integrates the number of running jobs over time.
+        now = time.perf_counter()
+        self.busy_time += self.in_flight * (now - self.last_change)
+        self.last_change = now
+        self.in_flight += delta
+
+    async def worker(self) -> None:
+        while True:
+            downloads, index, job = await self.queue.get()
+            self.track(+1)
+            try:
+                result = await job()
+            except asyncio.CancelledError:
+                downloads.finish(index, error=asyncio.CancelledError())
+                raise
+            except Exception as error:
+                self.failed += 1
+                downloads.finish(index, error=error)
+            else:
+                self.completed += 1
+                downloads.finish(index, result)
+            finally:
+                self.track(-1)
+                self.queue.task_done()
+
+    async def close(self, drain: bool = True) -> None:
+        if self.queue is not None and drain:
+            await self.queue.join()
+        for worker in self.workers:
+            worker.cancel()
+        await asyncio.gather(*self.workers, return_exceptions=True)
+        self.workers = []
+        self.track(0)
+        self.stopped_at = time.perf_counter()
+
+    def report(self) -> str:
+        elapsed = (self.stopped_at or time.perf_counter()) - self.started_at
+        average = self.busy_time / elapsed if elapsed > 0 else 0.0
+        return (
+            f"{self.completed} jobs done, {self.failed} failed, "
+            f"{average:.1f} of {self.transfers} workers busy on average"
+        )
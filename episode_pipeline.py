@@ -0,0 +1,91 @@
+import asyncio
+import time
+from typing import Awaitable, Callable, List, Tuple, TypeVar
+
+
+Job = TypeVar("Job")
+
+
+class PipelineStats:
+    """Time spent resolving and downloading episodes against the wall time of the run."""
+
+    def __init__(self) -> None:
+        self.episodes = 0
+        self.resolving = 0.0
+        self.downloading = 0.0
+        self.wall = 0.0
+
+    def report(self) -> str:
+        overlapped = max(0.0, min(self.resolving, self.downloading, self.resolving + self.downloading - self.wall))
+        return (
+            f"{self.episodes} episodes in {self.wall:.1f} s: resolving {self.resolving:.1f} s, "
+            f"downloading {self.downloading:.1f} s, {overlapped:.1f} s overlapped"
+        )
+
+
+async def run_pipeline(
+    count: int,
+    resolve: Callable[[int], Awaitable[Job]],
+    download: Callable[[int, Job], Awaitable[None]],
+    resolvers: int = 1,
+    depth: int = 1,
+    stats: PipelineStats = None,
+) -> None:
+    """Resolve episodes 0..count-1 in one stage and download them in another.
+
+    Resolvers take episodes in order and hand what they found to the
+    downloader through a queue of depth entries, so the browser works on the
+    next episodes while the current one downloads and stops once depth
+    episodes are waiting. depth=0 runs the stages strictly one after the
+    other, for callers whose download still needs the page it resolved on.
+    An exception in either stage cancels the other and propagates.
+    """
+    stats = stats if stats is not None else PipelineStats()
+    started = time.perf_counter()
+
+    async def timed_resolve(index: int) -> Job:
+        began = time.perf_counter()
+        try:
+            return await resolve(index)
+        finally:
+            stats.resolving += time.perf_counter() - began
+
+    async def timed_download(index: int, job: Job) -> None:
+        began = time.perf_counter()
+        try:
+            await download(index, job)
+        finally:
+            stats.downloading += time.perf_counter() - began
+            stats.episodes += 1
+
+    try:
+        if depth <= 0:
+            for index in range(count):
+                await timed_download(index, await timed_resolve(index))
+            return
+
+        queue: "asyncio.Queue[Tuple[int, Job]]" = asyncio.Queue(maxsize=depth)
+        next_index = 0
+
+        async def resolver() -> None:
+            nonlocal next_index
+            while next_index < count:
+                index = next_index
+                next_index += 1
+                job = await timed_resolve(index)
+                await queue.put((index, job))
+
+        async def downloader() -> None:
+            for _ in range(count):
+                index, job = await queue.get()
+                await timed_download(index, job)
+
+        tasks: List[asyncio.Future] = [asyncio.ensure_future(resolver()) for _ in range(max(1, resolvers))]
+        tasks.append(asyncio.ensure_future(downloader()))
+        try:
+            await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                task.cancel()
+    finally:
+        stats.wall += time.perf_counter() - started
@@ -1,9 +1,11 @@
+import asyncio
 import os
 import time
 import random
 import base64
 import json
 import requests
+from functools import partial
 from dotenv import load_dotenv
 from selenium import webdriver
 from selenium.webdriver.common.by import By
@@ -14,13 +16,33 @@ from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.common.action_chains import ActionChains
 from selenium.common.exceptions import WebDriverException, TimeoutException
-from requests.adapters import HTTPAdapter
-from urllib3.util.retry import Retry
 from urllib.parse import urlparse
 from webdriver_manager.chrome import ChromeDriverManager
 
+from circuit_breaker import CircuitOpenError, DeferredDownloads, HostCircuitBreaker
+from image_store import ContentStore, write_chunks
+from jsonl_export import JsonLinesWriter, compact
+from rate_limiter import HostRateLimiter
+from retry_policy import RetryPolicy
+from run_journal import RunJournal
+
 load_dotenv()
 
+# Обмеження кількості запитів на секунду до кожного хоста (сторінки і зображення)
+rate_limiter = HostRateLimiter(
+    rate=float(os.getenv("HONEYTOON_RATE", "3")),
+    burst=int(os.getenv("HONEYTOON_BURST", "6")),
+)
+
+# Замість urllib3 Retry, щоб 429/503 чекали Retry-After
+retry_policy = RetryPolicy()
+circuit_breaker = HostCircuitBreaker()
+# Зображення з хостів, чий вимикач спрацював; докачуються після обходу всіх коміксів
+deferred_downloads = DeferredDownloads(circuit_breaker)
+
+# Необов'язкове сховище з дедуплікацією зображень: файли епізодів стають жорсткими посиланнями
+image_store = ContentStore(os.getenv("HONEYTOON_IMAGE_STORE")) if os.getenv("HONEYTOON_IMAGE_STORE") else None
+
 
 def is_valid_url(url):
     """Перевіряє чи є URL коректним"""
@@ -36,6 +58,59 @@ def is_valid_url(url):
         return False
 
 
+def get_with_retry(url, **kwargs):
+    """GET зображення з повторами за retry_policy; повертає успішну відповідь або кидає останню помилку"""
+    attempt = 0
+    while True:
+        attempt += 1
+        # Поки хост лежить, CircuitOpenError летить одразу, без повторів
+        circuit_breaker.before(url)
+        retry_policy.started(attempt)
+        try:
+            rate_limiter.wait(url)
+            response = session.get(url, stream=True, **kwargs)
+            response.raise_for_status()
+            circuit_breaker.success(url)
+            retry_policy.success()
+            return response
+        except requests.exceptions.RequestException as e:
+            circuit_breaker.failure(url, e)
+            delay = retry_policy.retry_delay(attempt, e)
+            if delay is None:
+                raise
+            print(f"🔄 Повтор {attempt}/{retry_policy.attempts} для {url} через {delay:.1f}s: {e}")
+            time.sleep(delay)
+
+
+def download_deferred_image(url, image_path, episode_journal, index):
+    """Повторне завантаження відкладеного зображення; True, якщо файл збережено"""
+    response = get_with_retry(url, verify=False)
+    if response.status_code != 200:
+        return False
+    write_chunks(response.iter_content(1024), image_path, store=image_store)
+    episode_journal.record_image(index, os.path.basename(image_path))
+    print(f"Saved image: {image_path} (URL: {url})")
+    return True
+
+
+def finish_deferred_comic(display_title, comic_data, deferred_episodes, comic_complete):
+    """Дописує комікс, що чекав на відкладені зображення, коли їх уже докачано"""
+    global run_complete
+    for episode_link, (episode_data, episode_dir, episode_complete) in deferred_episodes.items():
+        # Зображення, які так і не з'явилися на диску, прибираємо з епізоду
+        images = [name for name in episode_data["images"] if os.path.exists(os.path.join(episode_dir, name))]
+        if episode_complete and len(images) == len(episode_data["images"]):
+            journal.record_episode(display_title, episode_link, episode_data)
+        else:
+            comic_complete = False
+        episode_data["images"] = images
+    results_writer.write(comic_data)
+    if comic_complete:
+        journal.record_comic(display_title, comic_data)
+    else:
+        run_complete = False
+
+
 def safe_navigate_to_url(driver, url, max_retries=3):
     """Безпечна навігація до URL з обробкою помилок"""
     if not url:
@@ -52,6 +127,7 @@ def safe_navigate_to_url(driver, url, max_retries=3):
     for attempt in range(max_retries):
         try:
             print(f"🔄 Спроба {attempt + 1}/{max_retries} - завантаження URL: {url}")
+            rate_limiter.wait(url)
             driver.get(url)
             WebDriverWait(driver, 20).until(EC.presence_of_element_located((By.TAG_NAME, "body")))
             print(f"✅ Успішно завантажено: {url}")
@@ -87,12 +163,6 @@ def safe_navigate_to_url(driver, url, max_retries=3):
 
 
 session = requests.Session()
-retries = Retry(
-    total=5,
-    backoff_factor=1,
-    status_forcelist=[500, 502, 503, 504],
-)
-session.mount("https://", HTTPAdapter(max_retries=retries))
 
 chrome_options = Options()
 chrome_options.add_argument(
@@ -104,8 +174,18 @@ driver = webdriver.Chrome(service=service, options=chrome_options)
 base_dir = "honeytoon"
 os.makedirs(base_dir, exist_ok=True)
 
-comics_data = []
+# Журнал завершених коміксів/епізодів/зображень: після збою наступний запуск продовжує з місця зупинки.
+# HONEYTOON_FRESH=1 відкидає журнал і починає з нуля.
+journal = RunJournal(os.path.join(base_dir, "honeytoon_journal.jsonl"), fresh=os.getenv("HONEYTOON_FRESH") == "1")
+if journal.resumed:
+    print("🔁 Знайдено журнал перерваного запуску, продовжуємо з місця зупинки")
+
+# Кожен готовий комікс одразу дописується сюди; stolen_taste.json збирається з нього наприкінці
+results_path = os.path.join(base_dir, "stolen_taste.jsonl")
+results_writer = JsonLinesWriter(results_path)
+
 failed_urls = []  # Для збереження невдалих URL
+run_complete = True  # Хибне, якщо хоч один комікс чи епізод не завершено; тоді журнал лишається
 
 try:
     honeytoon_email = os.getenv("HONEYTOON_EMAIL")
@@ -155,6 +235,15 @@ try:
                         display_title = original_title.replace("'", "")
                         display_title = ' '.join(word.capitalize() for word in display_title.split())
 
+                        finished_comic = journal.comic(display_title)
+                        if finished_comic:
+                            print(f"⏭️ Комікс '{display_title}' вже оброблено, пропускаємо")
+                            results_writer.write(finished_comic)
+                            continue
+                        comic_complete = True
+                        # Епізоди з відкладеними зображеннями: посилання -> (дані, папка, чи решта зображень на місці)
+                        deferred_episodes = {}
+
                         description = comic.find_element(By.CLASS_NAME, "comic-book__desc").text.strip()
                         genres = [genre.text.strip() for genre in
                                   comic.find_elements(By.CSS_SELECTOR, ".comic-book__labels .label__item")]
@@ -191,11 +280,9 @@ try:
                         # Завантаження thumbnail
                         try:
                             image_path = os.path.join(comic_dir, "thumbnail.jpg")
-                            response = session.get(main_image, stream=True, verify=False)
+                            response = get_with_retry(main_image, verify=False)
                             if response.status_code == 200:
-                                with open(image_path, "wb") as img_file:
-                                    for chunk in response.iter_content(1024):
-                                        img_file.write(chunk)
+                                write_chunks(response.iter_content(1024), image_path, store=image_store)
                         except Exception as e:
                             print(f"⚠️ Не вдалося завантажити thumbnail: {e}")
 
@@ -214,11 +301,9 @@ try:
                             )
                             preview_image = search_result.find_element(By.TAG_NAME, "img").get_attribute("src")
                             preview_image_path = os.path.join(comic_dir, "preview-thumbnail.jpg")
-                            response = requests.get(preview_image, stream=True)
+                            response = get_with_retry(preview_image)
                             if response.status_code == 200:
-                                with open(preview_image_path, "wb") as img_file:
-                                    for chunk in response.iter_content(1024):
-                                        img_file.write(chunk)
+                                write_chunks(response.iter_content(1024), preview_image_path, store=image_store)
                         except Exception as e:
                             print(f"⚠️ Не вдалося завантажити preview thumbnail: {e}")
 
@@ -259,9 +344,18 @@ try:
 
                                     print(f"📺 Обробка епізоду {episode_index}/{len(episode_links)}")
 
+                                    finished_episode = journal.episode(display_title, episode_link)
+                                    if finished_episode:
+                                        print(f"⏭️ Епізод вже завантажено: {episode_link}")
+                                        comic_data["episodes"].append(finished_episode)
+                                        episode_counter += 1
+                                        continue
+                                    episode_journal = journal.for_episode(display_title, episode_link)
+
                                     # Безпечна навігація до епізоду
                                     if not safe_navigate_to_url(driver, episode_link):
                                         print(f"❌ Пропускаємо епізод через помилку завантаження: {episode_link}")
+                                        comic_complete = False
                                         failed_urls.append({
                                             "type": "episode",
                                             "url": episode_link,
@@ -271,10 +365,11 @@ try:
                                         continue
 
                                     try:
-                                        time.sleep(5)
-
-                                        header_title = driver.find_element(By.CLASS_NAME,
-                                                                           "header-episode__title-number").text.strip()
+                                        # Замість фіксованої паузи чекаємо саме на заголовок епізоду
+                                        header_title = WebDriverWait(driver, 20).until(
+                                            EC.presence_of_element_located(
+                                                (By.CLASS_NAME, "header-episode__title-number"))
+                                        ).text.strip()
                                         print(f"📄 Заголовок епізоду: {header_title}")
 
                                         # Пропускаємо прологи
@@ -290,12 +385,9 @@ try:
                                         if episode_link in episode_thumbnails:
                                             try:
                                                 image_path = os.path.join(episode_dir, "thumbnail.jpg")
-                                                response = session.get(episode_thumbnails[episode_link], stream=True,
-                                                                       verify=False)
+                                                response = get_with_retry(episode_thumbnails[episode_link], verify=False)
                                                 if response.status_code == 200:
-                                                    with open(image_path, "wb") as img_file:
-                                                        for chunk in response.iter_content(1024):
-                                                            img_file.write(chunk)
+                                                    write_chunks(response.iter_content(1024), image_path, store=image_store)
                                             except Exception as e:
                                                 print(f"⚠️ Не вдалося завантажити thumbnail епізоду: {e}")
 
@@ -307,32 +399,45 @@ try:
 
                                             images = single_inner.find_elements(By.TAG_NAME, "img")
                                             episode_images = []
+                                            episode_complete = True
 
                                             for index, image in enumerate(images):
-                                                image_url = driver.execute_script(
-                                                    "return arguments[0].currentSrc || arguments[0].src;", image)
                                                 image_filename = f"episode_{episode_counter:03d}_{index + 1:03d}.jpg"
                                                 episode_images.append(image_filename)
+                                                image_path = os.path.join(episode_dir, image_filename)
+                                                if episode_journal.image_done(index, image_path):
+                                                    continue
+                                                image_url = driver.execute_script(
+                                                    "return arguments[0].currentSrc || arguments[0].src;", image)
 
                                                 try:
                                                     if image_url.startswith("data:image/"):
                                                         header, encoded = image_url.split(",", 1)
                                                         image_data = base64.b64decode(encoded)
-                                                        image_path = os.path.join(episode_dir, image_filename)
-                                                        with open(image_path, "wb") as img_file:
-                                                            img_file.write(image_data)
+                                                        write_chunks([image_data], image_path, store=image_store)
                                                     else:
-                                                        response = session.get(image_url, stream=True, verify=False)
-                                                        if response.status_code == 200:
-                                                            image_path = os.path.join(episode_dir, image_filename)
-                                                            with open(image_path, "wb") as img_file:
-                                                                for chunk in response.iter_content(1024):
-                                                                    img_file.write(chunk)
+                                                        response = get_with_retry(image_url, verify=False)
+                                                        if response.status_code != 200:
+                                                            episode_complete = False
+                                                            continue
+                                                        write_chunks(response.iter_content(1024), image_path, store=image_store)
 
+                                                    episode_journal.record_image(index, image_filename)
                                                     print(f"Saved image: {image_path} (URL: {image_url})")
+                                                except CircuitOpenError:
+                                                    # Хост недоступний: зображення докачається наприкінці запуску
+                                                    deferred_downloads.defer(
+                                                        image_url,
+                                                        partial(asyncio.to_thread, download_deferred_image, image_url,
+                                                                image_path, episode_journal, index),
+                                                        comic_dir,
+                                                        episode_dir,
+                                                    )
                                                 except requests.exceptions.SSLError as e:
+                                                    episode_complete = False
                                                     print(f"SSL error for URL {image_url}: {e}")
                                                 except Exception as e:
+                                                    episode_complete = False
                                                     print(f"Failed to save image from URL {image_url}: {e}")
 
                                             # Add episode data to comic_data structure
@@ -345,15 +450,24 @@ try:
                                                 "images": episode_images
                                             }
                                             comic_data["episodes"].append(episode_data)
+                                            if deferred_downloads.pending(episode_dir):
+                                                deferred_episodes[episode_link] = (episode_data, episode_dir,
+                                                                                   episode_complete)
+                                            elif episode_complete:
+                                                journal.record_episode(display_title, episode_link, episode_data)
+                                            else:
+                                                comic_complete = False
 
                                             episode_counter += 1
 
                                         except Exception as e:
                                             print(f"❌ Помилка при обробці зображень епізоду: {e}")
+                                            comic_complete = False
                                             continue
 
                                     except Exception as e:
                                         print(f"❌ Помилка при обробці епізоду {episode_link}: {e}")
+                                        comic_complete = False
                                         failed_urls.append({
                                             "type": "episode",
                                             "url": episode_link,
@@ -364,22 +478,39 @@ try:
 
                         except Exception as e:
                             print(f"❌ Помилка при читанні файлу з епізодами: {e}")
-
-                        # Add the comic data to the comics_data list
-                        comics_data.append(comic_data)
+                            comic_complete = False
+
+                        if deferred_episodes:
+                            # Комікс дописуємо після докачування, коли епізоди вже мають остаточні списки зображень
+                            deferred_downloads.after_drain(partial(finish_deferred_comic, display_title, comic_data,
+                                                                   deferred_episodes, comic_complete))
+                        else:
+                            # Add the comic data to the results file
+                            results_writer.write(comic_data)
+                            if comic_complete:
+                                journal.record_comic(display_title, comic_data)
+                            else:
+                                run_complete = False
                         print(f"✅ Комікс '{display_title}' успішно оброблено")
 
                     except Exception as e:
                         print(f"❌ Помилка при обробці коміксу: {e}")
+                        run_complete = False
                         continue
 
             except Exception as e:
                 print(f"❌ Загальна помилка при обробці сторінки коміксів: {e}")
+                run_complete = False
                 continue
 
+    if deferred_downloads.items:
+        print(f"🔁 Докачую {len(deferred_downloads.items)} відкладених зображень з хостів: "
+              f"{', '.join(circuit_breaker.open_hosts())}")
+        asyncio.run(deferred_downloads.drain())
+
     # Збереження результатів
-    with open(os.path.join(base_dir, "stolen_taste.json"), "w", encoding="utf-8") as json_file:
-        json.dump(comics_data, json_file, indent=2, ensure_ascii=False)
+    results_writer.close()
+    compact(results_path, os.path.join(base_dir, "stolen_taste.json"), ensure_ascii=False)
 
     # Збереження невдалих URL
     if failed_urls:
@@ -387,10 +518,32 @@ try:
             json.dump(failed_urls, failed_file, indent=2, ensure_ascii=False)
         print(f"\n⚠️ {len(failed_urls)} URL не вдалося обробити. Збережено в failed_urls.json")
 
-    print(f"\n✅ Програма завершена. Оброблено {len(comics_data)} коміксів.")
+    # Журнал видаляємо лише після повністю успішного запуску, інакше наступний продовжить з місця зупинки
+    if not journal.finish_if_complete(failed=not run_complete or bool(failed_urls)):
+        print(f"⚠️ Запуск неповний, журнал збережено для продовження: {journal.path}")
+
+    if image_store:
+        print(
+            f"🗄️ Сховище зображень: {image_store.stored} нових, {image_store.duplicates} дублікатів, "
+            f"заощаджено {image_store.bytes_saved / (1024 * 1024):.1f} МБ"
+        )
+
+    if retry_policy.retried or retry_policy.given_up:
+        print(
+            f"🔄 Повтори: {retry_policy.attempted} спроб на {retry_policy.requests} запитів, "
+            f"{retry_policy.succeeded} успішних, {retry_policy.retried} повторів, {retry_policy.given_up} відмов "
+            f"(з них {retry_policy.over_budget} через вичерпаний бюджет)"
+        )
+    if circuit_breaker.opened:
+        print(f"🔌 Вимикачі хостів: спрацювали {circuit_breaker.opened} разів, "
+              f"{circuit_breaker.rejected} запитів відхилено одразу; відкладені зображення: "
+              f"{deferred_downloads.recovered} докачано, {deferred_downloads.lost} втрачено")
+
+    print(f"\n✅ Програма завершена. Оброблено {results_writer.count} коміксів.")
 
 except Exception as e:
     print(f"❌ Критична помилка: {e}")
 finally:
+    results_writer.close()
     driver.quit()
     print("🔒 Браузер закрито")
\ No newline at end of file
@@ -0,0 +1,137 @@
+import hashlib
+import json
+import os
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+import aiofiles
+
+
+DEFAULT_CACHE_DIR = Path(".http_cache")
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+
+
+@dataclass
+class CacheEntry:
+    url: str
+    body: str
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+
+
+class HttpCache:
+    """Persistent URL-keyed response cache revalidated with ETag / Last-Modified."""
+
+    def __init__(self, directory: Path = DEFAULT_CACHE_DIR, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.bytes_saved = 0
+        self.total_bytes = sum(path.stat().st_size for path in self.directory.glob("*.*"))
+
+    def paths(self, url: str) -> Tuple[Path, Path]:
+        key = hashlib.sha256(url.encode("utf-8")).hexdigest()
+        return self.directory / f"{key}.json", self.directory / f"{key}.body"
+
+    async def load(self, url: str) -> Optional[CacheEntry]:
+        """Return the stored entry for url, or None (counted as a miss) if it is missing or unreadable."""
+        meta_path, body_path = self.paths(url)
+        try:
+            with open(meta_path, "r", encoding="utf-8") as meta_file:
+                meta = json.load(meta_file)
+            async with aiofiles.open(body_path, "r", encoding="utf-8") as body_file:
+                body = await body_file.read()
+        except (OSError, ValueError):
+            self.misses += 1
+            return None
+        if meta.get("url") != url:
+            self.misses += 1
+            return None
+        return CacheEntry(
+            url=url,
+            body=body,
+            etag=meta.get("etag"),
+            last_modified=meta.get("last_modified"),
+        )
+
+    @staticmethod
+    def conditional_headers(entry: Optional[CacheEntry]) -> Dict[str, str]:
+        """Validators to send so the server can answer 304 Not Modified."""
+        headers: Dict[str, str] = {}
+        if entry is None:
+            return headers
+        if entry.etag:
+            headers["If-None-Match"] = entry.etag
+        if entry.last_modified:
+            headers["If-Modified-Since"] = entry.last_modified
+        return headers
+
+    def hit(self, entry: CacheEntry) -> str:
+        """Record a 304 for entry and return its cached body."""
+        meta_path, body_path = self.paths(entry.url)
+        now = time.time()
+        for path in (meta_path, body_path):
+            try:
+                os.utime(path, (now, now))
+            except OSError:
+                pass
+        self.hits += 1
+        self.bytes_saved += len(entry.body.encode("utf-8"))
+        return entry.body
+
+    async def store(
+        self,
+        url: str,
+        body: str,
+        etag: Optional[str],
+        last_modified: Optional[str],
+    ) -> None:
+        """Persist a 200 response that carries at least one validator."""
+        if not etag and not last_modified:
+            return
+        meta_path, body_path = self.paths(url)
+        previous = sum(path.stat().st_size for path in (meta_path, body_path) if path.exists())
+
+        temp_body = body_path.with_suffix(".body.tmp")
+        async with aiofiles.open(temp_body, "w", encoding="utf-8") as body_file:
+            await body_file.write(body)
+        os.replace(temp_body, body_path)
+
+        temp_meta = meta_path.with_suffix(".json.tmp")
+        with open(temp_meta, "w", encoding="utf-8") as meta_file:
+            json.dump({"url": url, "etag": etag, "last_modified": last_modified}, meta_file)
+        os.replace(temp_meta, meta_path)
+
+        self.total_bytes += meta_path.stat().st_size + body_path.stat().st_size - previous
+        if self.total_bytes > self.max_bytes:
+            self.evict()
+
+    def evict(self) -> None:
+        """Drop least recently used entries until the cache fits max_bytes."""
+        entries = []
+        for meta_path in self.directory.glob("*.json"):
+            body_path = meta_path.with_suffix(".body")
+            try:
+                size = meta_path.stat().st_size
+                accessed = meta_path.stat().st_mtime
+                if body_path.exists():
+                    size += body_path.stat().st_size
+            except OSError:
+                continue
+            entries.append((accessed, size, meta_path, body_path))
+
+        self.total_bytes = sum(size for _, size, _, _ in entries)
+        target = self.max_bytes * 0.9
+        for _, size, meta_path, body_path in sorted(entries, key=lambda entry: entry[0]):
+            if self.total_bytes <= target:
+                break
+            for path in (meta_path, body_path):
+                try:
+                    path.unlink()
+                except FileNotFoundError:
+                    pass
+            self.total_bytes -= size
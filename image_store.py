@@ -0,0 +1,122 @@
+import hashlib
+import os
+import shutil
+import threading
+from pathlib import Path
+from typing import Iterable, Optional, Union
+
+
+DEFAULT_STORE_DIR = Path(".image_store")
+HASH_ALGORITHM = "sha256"
+
+
+class ContentStore:
+    """Content-addressed blob store that hardlinks each blob into the scraper layout.
+
+    Every image is hashed while it is written; the bytes are kept once under
+    ``<root>/<digest[:2]>/<digest>`` and the usual
+    ``<site>/<title>/<NNN>/episode_NNN_MMM.ext`` path becomes a hardlink to the
+    blob, so JSON/XML outputs do not change.
+    """
+
+    def __init__(self, root: Union[str, Path] = DEFAULT_STORE_DIR):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.lock = threading.Lock()
+        self.stored = 0
+        self.duplicates = 0
+        self.bytes_stored = 0
+        self.bytes_saved = 0
+
+    def blob_path(self, digest: str) -> Path:
+        return self.root / digest[:2] / digest
+
+    def commit(self, temp_path: Path, digest: str, destination: Union[str, Path]) -> Path:
+        """Move a fully written temp file into the store and link it to destination."""
+        destination = Path(destination)
+        blob = self.blob_path(digest)
+        size = temp_path.stat().st_size
+        blob.parent.mkdir(parents=True, exist_ok=True)
+
+        if blob.exists():
+            temp_path.unlink()
+            duplicate = True
+        else:
+            os.replace(temp_path, blob)
+            duplicate = False
+
+        self.link(blob, destination)
+
+        with self.lock:
+            if duplicate:
+                self.duplicates += 1
+                self.bytes_saved += size
+            else:
+                self.stored += 1
+                self.bytes_stored += size
+        return destination
+
+    @staticmethod
+    def link(blob: Path, destination: Path) -> None:
+        if destination.exists() and os.path.samefile(blob, destination):
+            return
+        staging = destination.with_name(f"{destination.name}.link")
+        try:
+            staging.unlink()
+        except FileNotFoundError:
+            pass
+        try:
+            os.link(blob, staging)
+        except OSError:
+            # Different filesystem or no hardlink support: fall back to a copy.
+            shutil.copyfile(blob, staging)
+        os.replace(staging, destination)
+
+    def report(self) -> str:
+        return (
+            f"image store: {self.stored} new blobs ({self.bytes_stored / (1024 * 1024):.1f} MiB), "
+            f"{self.duplicates} duplicates linked, {self.bytes_saved / (1024 * 1024):.1f} MiB saved"
+        )
+
+
+def write_chunks(
+    chunks: Iterable[bytes],
+    destination: Union[str, Path],
+    store: Optional[ContentStore] = None,
+    offset: int = 0,
+    keep_partial: bool = False,
+) -> int:
+    """Synchronous streaming write through a ``.part`` file, deduplicated when a store is given.
+
+    A non-zero ``offset`` appends to an existing ``.part`` of that size (a
+    Range resume); ``keep_partial`` leaves the ``.part`` behind on failure so
+    the next attempt can resume it.
+    """
+    destination = Path(destination)
+    temp_path = destination.with_name(f"{destination.name}.part")
+    digest = hashlib.new(HASH_ALGORITHM)
+    if offset:
+        with open(temp_path, "rb") as existing:
+            for block in iter(lambda: existing.read(1 << 16), b""):
+                digest.update(block)
+    written = 0
+    try:
+        with open(temp_path, "ab" if offset else "wb") as output:
+            for chunk in chunks:
+                if not chunk:
+                    continue
+                output.write(chunk)
+                digest.update(chunk)
+                written += len(chunk)
+        if store is not None:
+            store.commit(temp_path, digest.hexdigest(), destination)
+        else:
+            os.replace(temp_path, destination)
+    except BaseException:
+        if not keep_partial:
+            try:
+                temp_path.unlink()
+            except FileNotFoundError:
+                pass
+        raise
+    return written
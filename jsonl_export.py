@@ -0,0 +1,156 @@
+import json
+import os
+import threading
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, Optional, Union
+
+
+class JsonLinesWriter:
+    """Appends one JSON record per line as soon as it is ready.
+
+    Every write is flushed, so the file always holds every finished comic and
+    the per-record cost does not depend on how many records came before.
+    Safe to share between threads.
+    """
+
+    def __init__(self, path: Union[str, Path], fresh: bool = True):
+        self.path = Path(path)
+        self.lock = threading.Lock()
+        self.count = 0
+        self.handle = open(self.path, "w" if fresh else "a", encoding="utf-8")
+
+    def write(self, record: Dict[str, Any]) -> None:
+        line = json.dumps(record, ensure_ascii=False)
+        with self.lock:
+            self.handle.write(line + "\n")
+            self.handle.flush()
+            self.count += 1
+
+    def close(self) -> None:
+        with self.lock:
+            if not self.handle.closed:
+                self.handle.close()
+
+    def __enter__(self) -> "JsonLinesWriter":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+class OrderedEmitter:
+    """Hands position-tagged records to a writer in position order.
+
+    Parallel workers finish out of order; a record is held back only until
+    every earlier position has been put, so the output keeps the input order.
+    A ``None`` record marks a position with nothing to write (a failed comic).
+    """
+
+    def __init__(self, writer: JsonLinesWriter, first_position: int = 0):
+        self.writer = writer
+        self.next_position = first_position
+        self.pending: Dict[int, Optional[Dict[str, Any]]] = {}
+        self.lock = threading.Lock()
+
+    def put(self, position: int, record: Optional[Dict[str, Any]]) -> None:
+        with self.lock:
+            self.pending[position] = record
+            while self.next_position in self.pending:
+                ready = self.pending.pop(self.next_position)
+                if ready:
+                    self.writer.write(ready)
+                self.next_position += 1
+
+
+def iter_json_lines(path: Union[str, Path]) -> Iterator[Dict[str, Any]]:
+    """Records of a JSON Lines file, skipping blank lines and a line cut short by a crash."""
+    path = Path(path)
+    if not path.exists():
+        return
+    with open(path, "r", encoding="utf-8") as lines:
+        for line in lines:
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if isinstance(record, dict):
+                yield record
+
+
+def write_json_array(
+    records: Iterable[Dict[str, Any]],
+    path: Union[str, Path],
+    indent: int = 2,
+    ensure_ascii: bool = True,
+) -> int:
+    """Stream records into the same bytes ``json.dump(list(records), f, indent=indent)`` writes.
+
+    The file is written next to path and moved into place, so readers never
+    see a half-written array. Returns the number of records written.
+    """
+    path = Path(path)
+    temp_path = path.with_name(f"{path.name}.tmp")
+    prefix = "\n" + " " * indent
+    count = 0
+    try:
+        with open(temp_path, "w", encoding="utf-8") as output:
+            for record in records:
+                output.write("[" if count == 0 else ",")
+                # JSON strings never hold a raw newline, so re-indenting line by line is safe.
+                body = json.dumps(record, indent=indent, ensure_ascii=ensure_ascii)
+                output.write(prefix + body.replace("\n", prefix))
+                count += 1
+            output.write("\n]" if count else "[]")
+        os.replace(temp_path, path)
+    except BaseException:
+        try:
+            temp_path.unlink()
+        except FileNotFoundError:
+            pass
+        raise
+    return count
+
+
+def latest_records(path: Union[str, Path], key: str) -> Iterator[Dict[str, Any]]:
+    """Records of a JSON Lines file, one per value of ``key``: the last one written, at its position.
+
+    Two passes over the file keep memory at one index per key. Records
+    without the key are all kept.
+    """
+    last: Dict[Any, int] = {}
+    for index, record in enumerate(iter_json_lines(path)):
+        if record.get(key) is not None:
+            last[record[key]] = index
+    for index, record in enumerate(iter_json_lines(path)):
+        value = record.get(key)
+        if value is None or last.get(value) == index:
+            yield record
+
+
+def compact(
+    source: Union[str, Path],
+    target: Union[str, Path],
+    indent: int = 2,
+    ensure_ascii: bool = True,
+    key: Optional[str] = None,
+) -> int:
+    """Rewrite a JSON Lines file as the legacy pretty-printed JSON array.
+
+    With ``key``, a record written again later (a comic scraped again)
+    replaces the earlier one instead of appearing twice.
+    """
+    records = latest_records(source, key) if key else iter_json_lines(source)
+    return write_json_array(records, target, indent=indent, ensure_ascii=ensure_ascii)
+
+
+def convert_legacy(json_path: Union[str, Path], jsonl_path: Union[str, Path]) -> int:
+    """One-off migration of an existing JSON array file into JSON Lines."""
+    with open(json_path, "r", encoding="utf-8") as legacy:
+        records = json.load(legacy)
+    with JsonLinesWriter(jsonl_path, fresh=True) as writer:
+        for record in records:
+            if isinstance(record, dict):
+                writer.write(record)
+    return writer.count
@@ -3,18 +3,35 @@ import json
 import os
 import re
 import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
+from html import unescape
 from pathlib import Path
-from typing import Dict, List, Optional, Tuple
+from typing import Callable, Dict, Iterator, List, Optional, Tuple, TypeVar
 
-import aiofiles
 import aiohttp
 import colorama
 from aiohttp.client_exceptions import ClientError
 from bs4 import BeautifulSoup
 from colorama import Fore, Style
-from dicttoxml import dicttoxml
 from dotenv import load_dotenv
-from xml.dom import minidom
+
+from adaptive_limiter import AdaptiveLimiter
+from circuit_breaker import CircuitOpenError, DeferredDownloads, HostCircuitBreaker
+from http_cache import DEFAULT_CACHE_DIR, DEFAULT_MAX_BYTES, HttpCache
+from image_store import ContentStore
+from jsonl_export import JsonLinesWriter, OrderedEmitter, compact, iter_json_lines, write_json_array
+from rate_limiter import HostRateLimiter
+from retry_policy import RetryPolicy
+from run_journal import EpisodeJournal, RunJournal
+from streaming_download import (
+    RESUME_STATS,
+    IncompleteDownloadError,
+    discard_partial,
+    resume_headers,
+    stream_to_file,
+)
+from xml_export import write_xml
 
 
 colorama.init(autoreset=True)
@@ -46,6 +63,34 @@ CHAPTER_PATTERN = re.compile(
     r"/title/[^\"'>\s]+/\d+[^\"'>\s]*-chapter-[^\"'>\s]+",
     re.IGNORECASE,
 )
+CHAPTER_CONCURRENCY = 4
+IMAGE_CONCURRENCY = 10
+MAX_IMAGE_CONCURRENCY = 40
+COMIC_CONCURRENCY = 1
+PARSER_WORKERS = min(4, os.cpu_count() or 1)
+REQUESTS_PER_SECOND = 8.0
+REQUEST_BURST = 16
+JOURNAL_PATH = Path("mangapark_journal.jsonl")
+RESULTS_PATH = Path("mangapark.jsonl")
+RATE_LIMITER = HostRateLimiter(rate=REQUESTS_PER_SECOND, burst=REQUEST_BURST)
+RETRY_POLICY = RetryPolicy()
+# Окремо для кожного дзеркала s\d+: лежить одне — інші качають далі.
+CIRCUIT_BREAKER = HostCircuitBreaker()
+IMAGE_STORE: Optional[ContentStore] = None
+GENRE_CONTAINER_CLASSES = ("flex", "items-center", "flex-wrap")
+NON_TEXT_PATTERN = re.compile(
+    r"<!--.*?-->|<(script|style)\b[^>]*>.*?</\1\s*>",
+    re.IGNORECASE | re.DOTALL,
+)
+MARKUP_PATTERN = re.compile(r"<[^>]*>")
+# Вирізаний коментар/script/style лишає межу, як окремі текстові вузли в дереві BeautifulSoup.
+TEXT_BOUNDARY = "<>"
+IMG_TAG_PATTERN = re.compile(r"<img\b[^>]*>", re.IGNORECASE)
+SRC_ATTR_PATTERN = re.compile(r"""\bsrc\s*=\s*(?:"([^"]*)"|'([^']*)'|([^\s>]+))""", re.IGNORECASE)
+CLASS_ATTR_PATTERN = re.compile(r"""\bclass\s*=\s*(?:"([^"]*)"|'([^']*)'|([^\s>]+))""", re.IGNORECASE)
+
+ParsedValue = TypeVar("ParsedValue")
+parser_pool: Optional[ProcessPoolExecutor] = None
 
 
 def ensure_directory(path: Path) -> None:
@@ -81,8 +126,12 @@ def chapter_sort_key(url: str) -> Tuple[float, str]:
     return float("inf"), tail
 
 
+def normalize_whitespace(text: str) -> str:
+    return " ".join(text.split())
+
+
 def extract_text(element: Optional[BeautifulSoup]) -> str:
-    return element.get_text(" ", strip=True) if element else ""
+    return normalize_whitespace(element.get_text(" ", strip=True)) if element else ""
 
 
 def extract_chapter_links(html: str) -> List[Dict[str, str]]:
@@ -111,31 +160,199 @@ def extract_image_urls(html: str) -> List[str]:
     return ordered_urls
 
 
+def fragment_text(fragment: str, separator: str = " ") -> str:
+    # Аналог get_text(separator, strip=True) з нормалізованими пробілами: коментарі, script і style не враховуються.
+    fragment = NON_TEXT_PATTERN.sub(TEXT_BOUNDARY, fragment)
+    parts = (unescape(part).strip() for part in MARKUP_PATTERN.split(fragment))
+    return normalize_whitespace(separator.join(part for part in parts if part))
+
+
+def attribute_value(pattern: re.Pattern, tag: str) -> Optional[str]:
+    match = pattern.search(tag)
+    if not match:
+        return None
+    value = next(group for group in match.groups() if group is not None)
+    return unescape(value)
+
+
+def iter_elements(
+    html: str,
+    tag: Optional[str] = None,
+    classes: Tuple[str, ...] = (),
+    start: int = 0,
+    end: Optional[int] = None,
+) -> Iterator[Tuple[int, int]]:
+    # Повертає межі вмісту елементів "tag.class1.class2" без побудови дерева:
+    # переглядаються лише теги з потрібним ім'ям, вкладеність рахується по ньому ж.
+    end = len(html) if end is None else end
+    name_pattern = re.escape(tag) if tag else r"[a-zA-Z][a-zA-Z0-9-]*"
+    opening = re.compile(rf"<({name_pattern})\b[^>]*>", re.IGNORECASE)
+
+    position = start
+    while True:
+        match = opening.search(html, position, end)
+        if not match:
+            return
+        position = match.end()
+        if classes:
+            class_value = attribute_value(CLASS_ATTR_PATTERN, match.group()) or ""
+            if not set(classes).issubset(class_value.split()):
+                continue
+        if match.group().endswith("/>"):
+            yield position, position
+            continue
+        name = match.group(1)
+        balance = re.compile(rf"<(/?){re.escape(name)}\b[^>]*>", re.IGNORECASE)
+        depth = 1
+        inner_end = end
+        for token in balance.finditer(html, position, end):
+            if token.group(1):
+                depth -= 1
+            elif not token.group().endswith("/>"):
+                depth += 1
+            if depth == 0:
+                inner_end = token.start()
+                break
+        yield position, inner_end
+
+
+def select_first_text(html: str, *path: Tuple[Optional[str], Tuple[str, ...]]) -> str:
+    # Перший елемент за шляхом нащадків, напр. (("h6", ()), ("span", ())) == "h6 span".
+    def descend(start: int, end: int, depth: int) -> Optional[str]:
+        tag, classes = path[depth]
+        for inner_start, inner_end in iter_elements(html, tag, classes, start, end):
+            if depth == len(path) - 1:
+                return fragment_text(html[inner_start:inner_end])
+            found = descend(inner_start, inner_end, depth + 1)
+            if found is not None:
+                return found
+        return None
+
+    return descend(0, len(html), 0) or ""
+
+
+def extract_chapter_title(html: str) -> str:
+    html = NON_TEXT_PATTERN.sub(TEXT_BOUNDARY, html)
+    return select_first_text(html, ("h6", ()), ("span", ()))
+
+
+def extract_thumbnail_url(html: str) -> Optional[str]:
+    for tag in IMG_TAG_PATTERN.findall(html):
+        src = attribute_value(SRC_ATTR_PATTERN, tag)
+        if src and "/thumb/" in src:
+            return src
+    return None
+
+
+def extract_genre_names(html: str) -> List[str]:
+    genres: List[str] = []
+    seen_spans = set()
+    for inner_start, inner_end in iter_elements(html, "div", GENRE_CONTAINER_CLASSES):
+        for span_start, span_end in iter_elements(
+            html, "span", ("whitespace-nowrap",), inner_start, inner_end
+        ):
+            if span_start in seen_spans:
+                continue
+            seen_spans.add(span_start)
+            text = fragment_text(html[span_start:span_end], separator="")
+            if text:
+                genres.append(text)
+    return genres
+
+
+def extract_comic_details(html: str) -> Dict[str, object]:
+    html = NON_TEXT_PATTERN.sub(TEXT_BOUNDARY, html)
+    return {
+        "title": select_first_text(html, ("h3", ()), ("a", ())),
+        "description": select_first_text(html, (None, ("limit-html",))),
+        "thumbnail_url": extract_thumbnail_url(html),
+        "genres": extract_genre_names(html),
+    }
+
+
+def parse_comic_details(html: str) -> Dict[str, object]:
+    # Повний розбір дерева; виконується в пулі процесів, а не в циклі подій.
+    soup = BeautifulSoup(html, "html.parser")
+    thumbnail_img = soup.select_one("img[src*='/thumb/']")
+    return {
+        "title": extract_text(soup.select_one("h3 a")),
+        "description": extract_text(soup.select_one(".limit-html")),
+        "thumbnail_url": thumbnail_img.get("src") if thumbnail_img else None,
+        "genres": extract_genres(soup),
+    }
+
+
+def parse_chapter_title(html: str) -> str:
+    soup = BeautifulSoup(html, "html.parser")
+    return extract_text(soup.select_one("h6 span"))
+
+
+def get_parser_pool() -> ProcessPoolExecutor:
+    global parser_pool
+    if parser_pool is None:
+        parser_pool = ProcessPoolExecutor(max_workers=PARSER_WORKERS)
+    return parser_pool
+
+
+def shutdown_parser_pool() -> None:
+    global parser_pool
+    if parser_pool is not None:
+        parser_pool.shutdown(wait=True)
+        parser_pool = None
+
+
+async def parse_off_loop(parse: Callable[[str], ParsedValue], html: str) -> ParsedValue:
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_parser_pool(), parse, html)
+
+
 async def fetch_text(
     session: aiohttp.ClientSession,
     url: str,
     referer: Optional[str] = None,
-    retries: int = 3,
     timeout: int = 60,
+    cache: Optional[HttpCache] = None,
 ) -> str:
     headers = DEFAULT_HEADERS.copy()
     if referer:
         headers["Referer"] = referer
-
-    for attempt in range(1, retries + 1):
+    cached = await cache.load(url) if cache else None
+    headers.update(HttpCache.conditional_headers(cached))
+
+    attempt = 0
+    while True:
+        attempt += 1
+        CIRCUIT_BREAKER.before(url)
+        RETRY_POLICY.started(attempt)
         try:
+            await RATE_LIMITER.wait_async(url)
             async with session.get(url, headers=headers, timeout=timeout) as response:
+                if response.status == 304 and cached:
+                    CIRCUIT_BREAKER.success(url)
+                    RETRY_POLICY.success()
+                    return cache.hit(cached)
                 response.raise_for_status()
-                return await response.text()
+                text = await response.text()
+                if cache:
+                    await cache.store(
+                        url,
+                        text,
+                        etag=response.headers.get("ETag"),
+                        last_modified=response.headers.get("Last-Modified"),
+                    )
+                CIRCUIT_BREAKER.success(url)
+                RETRY_POLICY.success()
+                return text
         except (ClientError, asyncio.TimeoutError) as error:
-            if attempt == retries:
+            CIRCUIT_BREAKER.failure(url, error)
+            delay = RETRY_POLICY.retry_delay(attempt, error)
+            if delay is None:
                 raise
-            delay = attempt * 2
             print(
-                f"{Fore.YELLOW}{Style.BRIGHT}Повторю запит {url} (спроба {attempt}/{retries}) через {delay}s — {error}"
+                f"{Fore.YELLOW}{Style.BRIGHT}Повторю запит {url} (спроба {attempt}/{RETRY_POLICY.attempts}) "
+                f"через {delay:.1f}s — {error}"
             )
             await asyncio.sleep(delay)
-    return ""
 
 
 async def download_file(
@@ -143,7 +360,7 @@ async def download_file(
     url: str,
     destination: Path,
     referer: Optional[str] = None,
-    retries: int = 3,
+    limiter: Optional[AdaptiveLimiter] = None,
 ) -> Optional[Path]:
     ensure_directory(destination.parent)
     headers = DEFAULT_HEADERS.copy()
@@ -151,22 +368,37 @@ async def download_file(
     if referer:
         headers["Referer"] = referer
 
-    for attempt in range(1, retries + 1):
+    attempt = 0
+    while True:
+        attempt += 1
+        # Відкритий вимикач хоста піднімає CircuitOpenError назовні, щоб викликач міг відкласти файл.
+        CIRCUIT_BREAKER.before(url)
+        RETRY_POLICY.started(attempt)
         try:
-            async with session.get(url, headers=headers) as response:
-                response.raise_for_status()
-                async with aiofiles.open(destination, "wb") as file_handle:
-                    async for chunk in response.content.iter_chunked(1 << 15):
-                        await file_handle.write(chunk)
+            await RATE_LIMITER.wait_async(url)
+            async with limiter.slot() if limiter else nullcontext():
+                # Продовжуємо з байтів, що вже лежать у .part після попередньої спроби.
+                request_headers = {**headers, **resume_headers(destination)}
+                async with session.get(url, headers=request_headers) as response:
+                    if response.status == 416:
+                        # Сервер не приймає наш діапазон — наступна спроба почне з нуля.
+                        discard_partial(destination)
+                    response.raise_for_status()
+                    await stream_to_file(
+                        response, destination, chunk_size=1 << 15, store=IMAGE_STORE, resume=True
+                    )
+            CIRCUIT_BREAKER.success(url)
+            RETRY_POLICY.success()
             return destination
-        except (ClientError, asyncio.TimeoutError) as error:
-            if attempt == retries:
+        except (ClientError, asyncio.TimeoutError, IncompleteDownloadError) as error:
+            CIRCUIT_BREAKER.failure(url, error)
+            delay = RETRY_POLICY.retry_delay(attempt, error)
+            if delay is None:
                 print(
                     f"{Fore.RED}{Style.BRIGHT}Не вдалося завантажити файл {url}: {error}"
                 )
                 return None
-            await asyncio.sleep(attempt * 2)
-    return None
+            await asyncio.sleep(delay)
 
 
 async def download_images(
@@ -175,32 +407,56 @@ async def download_images(
     episode_folder: Path,
     episode_number: int,
     referer: str,
-    concurrency: int = 10,
+    concurrency: int = IMAGE_CONCURRENCY,
+    limiter: Optional[AdaptiveLimiter] = None,
+    journal: Optional[EpisodeJournal] = None,
+    deferred: Optional[DeferredDownloads] = None,
 ) -> List[str]:
     ensure_directory(episode_folder)
-    semaphore = asyncio.Semaphore(concurrency)
+    if limiter is None:
+        limiter = AdaptiveLimiter(initial=concurrency)
     results: List[Optional[str]] = [None] * len(image_urls)
 
     async def worker(index: int, image_url: str) -> None:
-        async with semaphore:
-            parsed = image_url.split("?")[0]
-            extension = Path(parsed).suffix.lower()
-            if extension not in {".jpg", ".jpeg", ".png", ".gif", ".webp"}:
-                extension = ".jpg"
-            filename = f"episode_{episode_number:03d}_{index + 1:03d}{extension}"
-            destination = episode_folder / filename
+        parsed = image_url.split("?")[0]
+        extension = Path(parsed).suffix.lower()
+        if extension not in {".jpg", ".jpeg", ".png", ".gif", ".webp"}:
+            extension = ".jpg"
+        filename = f"episode_{episode_number:03d}_{index + 1:03d}{extension}"
+        destination = episode_folder / filename
+        if journal and journal.image_done(index, destination):
+            results[index] = filename
+            return
+
+        async def download() -> Optional[Path]:
+            # Слот лімітера тримається лише на час самого запиту, не під час пауз між спробами.
             downloaded = await download_file(
                 session=session,
                 url=image_url,
                 destination=destination,
                 referer=referer,
+                limiter=limiter,
+            )
+            if downloaded is not None and journal:
+                journal.record_image(index, filename)
+            return downloaded
+
+        try:
+            downloaded = await download()
+        except CircuitOpenError as error:
+            if deferred is None:
+                print(f"{Fore.RED}{Style.BRIGHT}Зображення {index + 1} не завантажено: {error}")
+                return
+            # Хост недоступний: файл докачається наприкінці запуску, а його ім'я вже стоїть в епізоді.
+            deferred.defer(image_url, download, episode_folder.parent, episode_folder)
+            results[index] = filename
+            return
+        if downloaded is not None:
+            results[index] = filename
+        else:
+            print(
+                f"{Fore.RED}{Style.BRIGHT}Зображення {index + 1} не завантажено: {image_url}"
             )
-            if downloaded is not None:
-                results[index] = filename
-            else:
-                print(
-                    f"{Fore.RED}{Style.BRIGHT}Зображення {index + 1} не завантажено: {image_url}"
-                )
 
     tasks = [asyncio.create_task(worker(idx, url)) for idx, url in enumerate(image_urls)]
     await asyncio.gather(*tasks)
@@ -213,12 +469,15 @@ async def scrape_chapter(
     comic_dir: Path,
     episode_index: int,
     label: str,
+    image_limiter: Optional[AdaptiveLimiter] = None,
+    cache: Optional[HttpCache] = None,
+    journal: Optional[EpisodeJournal] = None,
+    deferred: Optional[DeferredDownloads] = None,
 ) -> Dict[str, object]:
     print(
         f"  {Fore.GREEN}{Style.BRIGHT}Епізод {episode_index:03d}: {label or chapter_url}"
     )
-    html = await fetch_text(session, chapter_url, referer=BASE_DOMAIN)
-    soup = BeautifulSoup(html, "html.parser")
+    html = await fetch_text(session, chapter_url, referer=BASE_DOMAIN, cache=cache)
     image_urls = extract_image_urls(html)
 
     if not image_urls:
@@ -231,12 +490,18 @@ async def scrape_chapter(
         episode_folder=episode_folder,
         episode_number=episode_index,
         referer=chapter_url,
+        limiter=image_limiter,
+        journal=journal,
+        deferred=deferred,
     )
 
-    episode_title = extract_text(soup.select_one("h6 span")) or label
+    episode_title = extract_chapter_title(html)
+    if not episode_title and "<h6" in html.lower():
+        episode_title = await parse_off_loop(parse_chapter_title, html)
+    episode_title = episode_title or label
     thumbnail = images[0] if images else ""
 
-    return {
+    episode_data = {
         "parentTitle": comic_dir.name,
         "title": f"episode {episode_index:03d}",
         "slag": f"episode-{episode_index:03d}",
@@ -247,6 +512,19 @@ async def scrape_chapter(
         "label": episode_title,
     }
 
+    def finish_episode() -> None:
+        # Зображення, які так і не вдалося докачати, прибираємо з епізоду.
+        episode_data["images"] = [name for name in images if (episode_folder / name).exists()]
+        episode_data["thumbnail"] = episode_data["images"][0] if episode_data["images"] else ""
+        if journal and len(episode_data["images"]) == len(image_urls):
+            journal.journal.record_episode(journal.comic_key, journal.episode_key, episode_data)
+
+    if deferred and deferred.pending(episode_folder):
+        deferred.after_drain(finish_episode)
+    elif journal and len(images) == len(image_urls):
+        journal.journal.record_episode(journal.comic_key, journal.episode_key, episode_data)
+    return episode_data
+
 
 async def download_thumbnail(
     session: aiohttp.ClientSession,
@@ -262,85 +540,150 @@ async def download_thumbnail(
         full_url = BASE_DOMAIN + full_url
 
     destination = comic_dir / "thumbnail.jpg"
-    downloaded = await download_file(
-        session=session,
-        url=full_url,
-        destination=destination,
-        referer=BASE_DOMAIN,
-    )
+    try:
+        downloaded = await download_file(
+            session=session,
+            url=full_url,
+            destination=destination,
+            referer=BASE_DOMAIN,
+        )
+    except CircuitOpenError as error:
+        print(f"{Fore.YELLOW}{Style.BRIGHT}Обкладинку пропущено: {error}")
+        return ""
     return downloaded.name if downloaded else ""
 
 
 def extract_genres(soup: BeautifulSoup) -> List[str]:
     genres = []
     for span in soup.select("div.flex.items-center.flex-wrap span.whitespace-nowrap"):
-        text = span.get_text(strip=True)
+        text = normalize_whitespace(span.get_text(strip=True))
         if text:
             genres.append(text)
     return genres
 
 
+async def scrape_chapters(
+    session: aiohttp.ClientSession,
+    chapters: List[Dict[str, str]],
+    comic_dir: Path,
+    chapter_concurrency: int = CHAPTER_CONCURRENCY,
+    image_limiter: Optional[AdaptiveLimiter] = None,
+    cache: Optional[HttpCache] = None,
+    first_index: int = 1,
+    journal: Optional[RunJournal] = None,
+    comic_url: str = "",
+    deferred: Optional[DeferredDownloads] = None,
+) -> List[Dict[str, object]]:
+    if image_limiter is None:
+        image_limiter = AdaptiveLimiter(initial=IMAGE_CONCURRENCY)
+    queue: asyncio.Queue = asyncio.Queue()
+    for position, chapter in enumerate(chapters):
+        queue.put_nowait((position, first_index + position, chapter))
+    results: List[Optional[Dict[str, object]]] = [None] * len(chapters)
+
+    async def worker() -> None:
+        while True:
+            try:
+                position, episode_index, chapter = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            finished = journal.episode(comic_url, chapter["url"]) if journal else None
+            if finished:
+                results[position] = finished
+                continue
+            try:
+                results[position] = await scrape_chapter(
+                    session=session,
+                    chapter_url=chapter["url"],
+                    comic_dir=comic_dir,
+                    episode_index=episode_index,
+                    label=chapter["label"],
+                    image_limiter=image_limiter,
+                    cache=cache,
+                    journal=journal.for_episode(comic_url, chapter["url"]) if journal else None,
+                    deferred=deferred,
+                )
+            except Exception as error:
+                print(
+                    f"{Fore.YELLOW}{Style.BRIGHT}Не вдалося обробити главу {chapter['url']}: {error}"
+                )
+
+    workers = max(1, min(chapter_concurrency, len(chapters)))
+    await asyncio.gather(*(worker() for _ in range(workers)))
+    return [episode for episode in results if episode]
+
+
 async def scrape_comic(
     session: aiohttp.ClientSession,
     url: str,
+    chapter_concurrency: int = CHAPTER_CONCURRENCY,
+    image_limiter: Optional[AdaptiveLimiter] = None,
+    cache: Optional[HttpCache] = None,
+    previous: Optional[Dict[str, object]] = None,
+    journal: Optional[RunJournal] = None,
+    deferred: Optional[DeferredDownloads] = None,
 ) -> Optional[Dict[str, object]]:
     print(f"{Fore.CYAN}{Style.BRIGHT}Обробка коміксу: {url}")
     start_time = time.time()
 
     try:
-        html = await fetch_text(session, url)
+        html = await fetch_text(session, url, cache=cache)
     except Exception as error:
         print(f"{Fore.RED}{Style.BRIGHT}Не вдалося завантажити сторінку: {error}")
         return None
 
-    soup = BeautifulSoup(html, "html.parser")
-    title_element = soup.select_one("h3 a")
-    title = extract_text(title_element) or "Unknown title"
-    clean_title = sanitize_filename(title)
+    details = extract_comic_details(html)
+    if not all(details.values()):
+        # Цільовий екстрактор щось пропустив — повний розбір поза циклом подій.
+        details = await parse_off_loop(parse_comic_details, html)
+
+    title = details["title"] or "Unknown title"
+    # В режимі оновлення тека лишається тією ж, навіть якщо назва на сайті змінилась.
+    clean_title = previous["title"] if previous else sanitize_filename(title)
     comic_dir = BASE_OUTPUT_DIR / clean_title
     ensure_directory(comic_dir)
 
-    description = ""
-    description_block = soup.select_one(".limit-html")
-    if description_block:
-        description = extract_text(description_block)
-
-    thumbnail_url = None
-    thumbnail_img = soup.select_one("img[src*='/thumb/']")
-    if thumbnail_img:
-        thumbnail_url = thumbnail_img.get("src")
-
-    thumbnail_local = await download_thumbnail(session, thumbnail_url, comic_dir)
-    genres = extract_genres(soup)
+    description = details["description"]
+    genres = details["genres"]
+    if previous and previous.get("thumbnail") and (comic_dir / previous["thumbnail"]).exists():
+        thumbnail_local = previous["thumbnail"]
+    else:
+        thumbnail_local = await download_thumbnail(session, details["thumbnail_url"], comic_dir)
     chapters = extract_chapter_links(html)
 
     if not chapters:
         print(f"{Fore.RED}{Style.BRIGHT}Не знайдено жодної глави на сторінці {url}")
         return None
 
-    episodes: List[Dict[str, object]] = []
-    for episode_index, chapter in enumerate(chapters, start=1):
-        try:
-            episode_data = await scrape_chapter(
-                session=session,
-                chapter_url=chapter["url"],
-                comic_dir=comic_dir,
-                episode_index=episode_index,
-                label=chapter["label"],
-            )
-            episodes.append(episode_data)
-        except Exception as error:
-            print(
-                f"{Fore.YELLOW}{Style.BRIGHT}Не вдалося обробити главу {chapter['url']}: {error}"
-            )
+    stored_episodes: List[Dict[str, object]] = list(previous.get("episodes", [])) if previous else []
+    if stored_episodes:
+        stored_sources = {episode.get("source") for episode in stored_episodes}
+        chapters = [chapter for chapter in chapters if chapter["url"] not in stored_sources]
+        print(
+            f"{Fore.CYAN}{Style.BRIGHT}Збережено {len(stored_episodes)} епізодів, нових глав: {len(chapters)}"
+        )
+
+    new_episodes = await scrape_chapters(
+        session=session,
+        chapters=chapters,
+        comic_dir=comic_dir,
+        chapter_concurrency=chapter_concurrency,
+        image_limiter=image_limiter,
+        cache=cache,
+        first_index=next_episode_index(stored_episodes),
+        journal=journal,
+        comic_url=url,
+        deferred=deferred,
+    )
+    episodes = stored_episodes + new_episodes
 
     elapsed = time.time() - start_time
     print(
         f"{Fore.GREEN}{Style.BRIGHT}Завершено {title} за {elapsed:.1f} секунди. "
-        f"Зібрано {len(episodes)} епізодів."
+        f"Зібрано {len(new_episodes)} епізодів."
     )
 
-    return {
+    comic_data = {
         "title": clean_title,
         "originalTitle": title,
         "description": description,
@@ -352,16 +695,54 @@ async def scrape_comic(
         "source": url,
     }
 
+    def record_comic() -> None:
+        # Комікс завершено, лише коли кожна глава записана в журнал повністю, з усіма зображеннями.
+        if all(journal.episode(url, chapter["url"]) for chapter in chapters):
+            journal.record_comic(url, comic_data)
+
+    if journal and len(new_episodes) == len(chapters):
+        if deferred and deferred.pending(comic_dir):
+            # Записуємо комікс після докачування, коли епізоди вже мають остаточні списки зображень.
+            deferred.after_drain(record_comic)
+        else:
+            record_comic()
+    return comic_data
+
+
+def next_episode_index(episodes: List[Dict[str, object]]) -> int:
+    numbers = [0]
+    for episode in episodes:
+        match = re.search(r"(\d+)$", str(episode.get("slag", "")))
+        if match:
+            numbers.append(int(match.group(1)))
+    return max(numbers) + 1
 
-def save_results(results: List[Dict[str, object]], failed: List[str]) -> None:
-    if results:
-        with open("mangapark.json", "w", encoding="utf-8") as json_file:
-            json.dump(results, json_file, indent=2, ensure_ascii=False)
 
-        xml = dicttoxml({"item": results}, root=False, attr_type=False, item_func=lambda _: "item")
-        dom = minidom.parseString(xml)
-        with open("mangapark.xml", "w", encoding="utf-8") as xml_file:
-            xml_file.write(dom.toprettyxml(indent="  "))
+def load_previous_results(path: Path = Path("mangapark.json")) -> List[Dict[str, object]]:
+    if not path.exists():
+        return []
+    try:
+        with open(path, "r", encoding="utf-8") as json_file:
+            previous = json.load(json_file)
+    except (OSError, ValueError) as error:
+        print(f"{Fore.YELLOW}{Style.BRIGHT}Не вдалося прочитати попередні результати {path}: {error}")
+        return []
+    return [comic for comic in previous if isinstance(comic, dict)]
+
+
+def save_results(
+    results: List[Dict[str, object]],
+    failed: List[str],
+    records_path: Optional[Path] = None,
+) -> None:
+    if results:
+        # Якщо комікси вже записані рядками JSON Lines, збираємо mangapark.json потоково з них.
+        if records_path:
+            compact(records_path, "mangapark.json", ensure_ascii=False)
+            write_xml(iter_json_lines(records_path), "mangapark.xml")
+        else:
+            write_json_array(results, "mangapark.json", ensure_ascii=False)
+            write_xml(results, "mangapark.xml")
 
     if failed:
         with open("failed_mangapark.json", "w", encoding="utf-8") as failed_file:
@@ -372,31 +753,145 @@ def save_results(results: List[Dict[str, object]], failed: List[str]) -> None:
         )
 
 
-async def parse_mangapark(urls: List[str]) -> None:
+async def parse_mangapark(
+    urls: List[str],
+    chapter_concurrency: int = CHAPTER_CONCURRENCY,
+    image_concurrency: int = IMAGE_CONCURRENCY,
+    comic_concurrency: int = COMIC_CONCURRENCY,
+    cache: Optional[HttpCache] = None,
+    update: bool = False,
+    max_image_concurrency: int = MAX_IMAGE_CONCURRENCY,
+    journal: Optional[RunJournal] = None,
+) -> None:
     ensure_directory(BASE_OUTPUT_DIR)
+    previous_results = load_previous_results() if update else []
+    previous_by_source = {comic.get("source"): comic for comic in previous_results}
     timeout = aiohttp.ClientTimeout(total=120)
-    connector = aiohttp.TCPConnector(limit_per_host=5)
-
-    async with aiohttp.ClientSession(timeout=timeout, connector=connector) as session:
-        comics: List[Dict[str, object]] = []
-        failed: List[str] = []
+    # Глобальний бюджет: сторінки глав + зображення, щоб пул з'єднань був повним, але обмеженим.
+    # Окремого ліміту на хост немає: сайт і його дзеркала мають отримати весь бюджет, а темп тримає RATE_LIMITER.
+    connector = aiohttp.TCPConnector(
+        limit=comic_concurrency * chapter_concurrency + max(image_concurrency, max_image_concurrency),
+        limit_per_host=0,
+    )
+    image_limiter = AdaptiveLimiter(initial=image_concurrency, maximum=max_image_concurrency)
+    # Зображення з хостів із відкритим вимикачем, докачуються після всіх коміксів.
+    deferred = DeferredDownloads(CIRCUIT_BREAKER)
 
+    async with aiohttp.ClientSession(timeout=timeout, connector=connector) as session, \
+            JsonLinesWriter(RESULTS_PATH) as records:
         total = len(urls)
-        for index, url in enumerate(urls, start=1):
-            print(
-                f"{Fore.CYAN}{Style.BRIGHT}Комікс {index}/{total}"
-            )
-            try:
-                comic_data = await scrape_comic(session, url)
-                if comic_data:
-                    comics.append(comic_data)
+        results: List[Optional[Dict[str, object]]] = [None] * total
+        # Готові комікси одразу дописуються в mangapark.jsonl у порядку вхідного списку.
+        emitter = OrderedEmitter(records)
+        # Комікси з відкладеними зображеннями записуються лише після докачування.
+        held: List[int] = []
+        queue: asyncio.Queue = asyncio.Queue()
+        for position in range(total):
+            queue.put_nowait(position)
+
+        async def worker() -> None:
+            while True:
+                try:
+                    position = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                url = urls[position]
+                finished = journal.comic(url) if journal else None
+                if finished:
+                    print(f"{Fore.GREEN}Комікс {position + 1}/{total} вже оброблено, пропускаємо: {url}")
+                    results[position] = finished
+                    emitter.put(position, finished)
+                    continue
+                print(
+                    f"{Fore.CYAN}{Style.BRIGHT}Комікс {position + 1}/{total}"
+                )
+                try:
+                    results[position] = await scrape_comic(
+                        session,
+                        url,
+                        chapter_concurrency=chapter_concurrency,
+                        image_limiter=image_limiter,
+                        cache=cache,
+                        previous=previous_by_source.get(url),
+                        journal=journal,
+                        deferred=deferred,
+                    )
+                except Exception as error:
+                    print(f"{Fore.RED}{Style.BRIGHT}Помилка при обробці {url}: {error}")
+                comic = results[position]
+                if comic and deferred.pending(BASE_OUTPUT_DIR / comic["title"]):
+                    held.append(position)
                 else:
-                    failed.append(url)
-            except Exception as error:
-                print(f"{Fore.RED}{Style.BRIGHT}Помилка при обробці {url}: {error}")
-                failed.append(url)
+                    emitter.put(position, comic)
 
-        save_results(comics, failed)
+        workers = max(1, min(comic_concurrency, total))
+        try:
+            await asyncio.gather(*(worker() for _ in range(workers)))
+            if deferred.items:
+                print(
+                    f"{Fore.YELLOW}{Style.BRIGHT}Докачую {len(deferred.items)} відкладених зображень "
+                    f"з хостів: {', '.join(CIRCUIT_BREAKER.open_hosts())}"
+                )
+                await deferred.drain()
+            for position in sorted(held):
+                emitter.put(position, results[position])
+        finally:
+            shutdown_parser_pool()
+
+        comics = [comic for comic in results if comic]
+        failed = [url for url, comic in zip(urls, results) if not comic]
+        records.close()
+        if update:
+            save_results(merge_results(previous_results, comics), failed)
+        else:
+            save_results(comics, failed, records_path=RESULTS_PATH)
+        # Журнал - це стан для продовження: видаляємо його лише тоді, коли всі комікси завершено повністю.
+        if journal:
+            if not journal.finish_if_complete(urls, failed=bool(failed)):
+                print(f"{Fore.YELLOW}{Style.BRIGHT}Запуск неповний, журнал збережено для продовження: {journal.path}")
+
+    print(
+        f"{Fore.CYAN}{Style.BRIGHT}Паралельність завантаження зображень встановилась на {image_limiter.current} "
+        f"(пік {image_limiter.peak}, зменшень {image_limiter.decreases})"
+    )
+    if IMAGE_STORE:
+        print(
+            f"{Fore.CYAN}{Style.BRIGHT}Сховище зображень: {IMAGE_STORE.stored} нових, "
+            f"{IMAGE_STORE.duplicates} дублікатів, заощаджено {IMAGE_STORE.bytes_saved / (1024 * 1024):.1f} МБ"
+        )
+    if RESUME_STATS.resumed or RESUME_STATS.restarted:
+        print(
+            f"{Fore.CYAN}{Style.BRIGHT}Докачування: {RESUME_STATS.resumed} файлів продовжено, "
+            f"{RESUME_STATS.restarted} почато заново, заощаджено {RESUME_STATS.bytes_saved / (1024 * 1024):.1f} МБ"
+        )
+    if RETRY_POLICY.retried or RETRY_POLICY.given_up:
+        print(
+            f"{Fore.CYAN}{Style.BRIGHT}Повтори: {RETRY_POLICY.attempted} спроб на {RETRY_POLICY.requests} запитів, "
+            f"{RETRY_POLICY.succeeded} успішних, {RETRY_POLICY.retried} повторів, {RETRY_POLICY.given_up} відмов "
+            f"(з них {RETRY_POLICY.over_budget} через вичерпаний бюджет)"
+        )
+    if CIRCUIT_BREAKER.opened:
+        print(
+            f"{Fore.CYAN}{Style.BRIGHT}Вимикачі хостів: спрацювали {CIRCUIT_BREAKER.opened} разів, "
+            f"{CIRCUIT_BREAKER.rejected} запитів відхилено одразу; відкладені зображення: "
+            f"{deferred.recovered} докачано, {deferred.lost} втрачено"
+        )
+    if cache:
+        print(
+            f"{Fore.CYAN}{Style.BRIGHT}HTTP-кеш: {cache.hits} без змін (304), {cache.misses} не знайдено в кеші, "
+            f"заощаджено {cache.bytes_saved / (1024 * 1024):.1f} МБ"
+        )
+
+
+def merge_results(
+    previous: List[Dict[str, object]],
+    current: List[Dict[str, object]],
+) -> List[Dict[str, object]]:
+    # Оновлені комікси стають на своє старе місце, нові додаються в кінець.
+    updated = {comic["source"]: comic for comic in current}
+    merged = [updated.pop(comic.get("source"), comic) for comic in previous]
+    merged.extend(comic for comic in current if comic["source"] in updated)
+    return merged
 
 
 def read_urls_from_file(file_path: Path) -> List[str]:
@@ -415,6 +910,68 @@ if __name__ == "__main__":
     parser.add_argument("--urls", nargs="+", help="Посилання на сторінки коміксів")
     parser.add_argument("--file", help="Файл із посиланнями (по одному на рядок)")
     parser.add_argument("--example", action="store_true", help="Запустити з демонстраційними посиланнями")
+    parser.add_argument(
+        "--chapter-workers",
+        type=int,
+        default=CHAPTER_CONCURRENCY,
+        help=f"Кількість глав, що обробляються одночасно (за замовчуванням {CHAPTER_CONCURRENCY})",
+    )
+    parser.add_argument(
+        "--image-workers",
+        type=int,
+        default=IMAGE_CONCURRENCY,
+        help=f"Початковий загальний ліміт одночасних завантажень зображень (за замовчуванням {IMAGE_CONCURRENCY})",
+    )
+    parser.add_argument(
+        "--max-image-workers",
+        type=int,
+        default=MAX_IMAGE_CONCURRENCY,
+        help=f"Верхня межа адаптивного ліміту завантажень (за замовчуванням {MAX_IMAGE_CONCURRENCY})",
+    )
+    parser.add_argument(
+        "--parallel-comics",
+        type=int,
+        default=COMIC_CONCURRENCY,
+        help=f"Кількість коміксів, що обробляються одночасно (за замовчуванням {COMIC_CONCURRENCY})",
+    )
+    parser.add_argument(
+        "--cache-dir",
+        default=str(DEFAULT_CACHE_DIR),
+        help=f"Каталог HTTP-кешу сторінок (за замовчуванням {DEFAULT_CACHE_DIR})",
+    )
+    parser.add_argument(
+        "--cache-size",
+        type=int,
+        default=DEFAULT_MAX_BYTES // (1024 * 1024),
+        help="Максимальний розмір HTTP-кешу в МБ",
+    )
+    parser.add_argument("--no-cache", action="store_true", help="Не використовувати HTTP-кеш сторінок")
+    parser.add_argument(
+        "--rate",
+        type=float,
+        default=REQUESTS_PER_SECOND,
+        help=f"Запитів на секунду до кожного хоста, 0 — без обмеження (за замовчуванням {REQUESTS_PER_SECOND})",
+    )
+    parser.add_argument(
+        "--burst",
+        type=int,
+        default=REQUEST_BURST,
+        help=f"Скільки запитів до хоста можна виконати одразу (за замовчуванням {REQUEST_BURST})",
+    )
+    parser.add_argument(
+        "--image-store",
+        help="Каталог сховища зображень за хешем вмісту; файли епізодів стають жорсткими посиланнями",
+    )
+    parser.add_argument(
+        "--update",
+        action="store_true",
+        help="Завантажити лише нові глави, дописавши їх до попереднього mangapark.json",
+    )
+    parser.add_argument(
+        "--fresh",
+        action="store_true",
+        help=f"Ігнорувати журнал перерваного запуску ({JOURNAL_PATH}) і почати з нуля",
+    )
 
     args = parser.parse_args()
 
@@ -432,5 +989,22 @@ if __name__ == "__main__":
         parser.print_help()
         raise SystemExit(0)
 
-    asyncio.run(parse_mangapark(url_list))
+    RATE_LIMITER.configure(rate=args.rate, burst=args.burst)
+    if args.image_store:
+        IMAGE_STORE = ContentStore(Path(args.image_store))
+    journal = RunJournal(JOURNAL_PATH, fresh=args.fresh)
+    if journal.resumed:
+        print(f"{Fore.YELLOW}{Style.BRIGHT}Знайдено журнал {JOURNAL_PATH}, продовжуємо перерваний запуск")
+    asyncio.run(
+        parse_mangapark(
+            url_list,
+            chapter_concurrency=max(1, args.chapter_workers),
+            image_concurrency=max(1, args.image_workers),
+            comic_concurrency=max(1, args.parallel_comics),
+            cache=None if args.no_cache else HttpCache(Path(args.cache_dir), args.cache_size * 1024 * 1024),
+            update=args.update,
+            max_image_concurrency=max(1, args.max_image_workers),
+            journal=journal,
+        )
+    )
 
@@ -0,0 +1,81 @@
+import asyncio
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Awaitable, Callable, List, Optional, Set
+
+from playwright.async_api import BrowserContext, Page
+
+
+class PagePool:
+    """A fixed number of pages in one browser context, handed out to concurrent tasks.
+
+    The pages share the context's cookies, so a single login covers all of
+    them. A page that crashed or was closed is replaced with a fresh one when
+    it is given back, so a bad episode does not shrink the pool.
+    """
+
+    def __init__(
+        self,
+        context: BrowserContext,
+        size: int,
+        setup: Optional[Callable[[Page], Awaitable[None]]] = None,
+    ):
+        self.context = context
+        self.size = max(1, size)
+        self.setup = setup
+        self.idle: "asyncio.Queue[Page]" = asyncio.Queue()
+        self.pages: List[Page] = []
+        self.crashed: Set[Page] = set()
+        self.recycled = 0
+
+    async def open(self) -> None:
+        for _ in range(self.size):
+            self.idle.put_nowait(await self.new_page())
+
+    async def new_page(self) -> Page:
+        page = await self.context.new_page()
+        page.on("crash", self.crashed.add)
+        if self.setup:
+            await self.setup(page)
+        self.pages.append(page)
+        return page
+
+    def broken(self, page: Page) -> bool:
+        return page in self.crashed or page.is_closed()
+
+    async def recycle(self, page: Page) -> Page:
+        try:
+            await page.close()
+        except Exception:
+            # A crashed page may refuse to close; it is dropped either way.
+            pass
+        fresh = await self.new_page()
+        self.crashed.discard(page)
+        self.pages.remove(page)
+        self.recycled += 1
+        return fresh
+
+    @asynccontextmanager
+    async def page(self) -> AsyncIterator[Page]:
+        """Borrow an idle page, waiting for one if all of them are busy."""
+        page = await self.idle.get()
+        try:
+            yield page
+        finally:
+            if self.broken(page):
+                try:
+                    page = await self.recycle(page)
+                except Exception:
+                    # The context itself is gone; the next borrower fails fast instead of waiting forever.
+                    pass
+            self.idle.put_nowait(page)
+
+    async def close(self) -> None:
+        for page in self.pages:
+            try:
+                await page.close()
+            except Exception:
+                pass
+        self.pages.clear()
+
+    def report(self) -> str:
+        return f"{self.size} pages, {self.recycled} recycled after a crash"
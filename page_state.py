@@ -0,0 +1,264 @@
+import asyncio
+import json
+import re
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple
+from urllib.parse import urlparse
+
+from playwright.async_api import Page, Response
+
+
+IMAGE_URL_PATTERN = re.compile(r"^(?:https?:)?//[^\s\"']+?\.(?:jpe?g|png|webp|gif|avif)(?:[?#][^\s\"']*)?$", re.IGNORECASE)
+# Keys whose lists hold covers and episode thumbnails rather than the episode's own pages.
+THUMBNAIL_KEY_PATTERN = re.compile(r"thumb|cover|banner|poster|avatar|icon|logo|profile", re.IGNORECASE)
+JSON_CONTENT_TYPES = ("application/json", "text/json", "+json")
+
+# Frameworks keep the server-rendered data in one of these; whichever the page has is returned.
+EMBEDDED_STATE_SCRIPT = """
+() => {
+    const states = [];
+    for (const id of ['__NEXT_DATA__', '__NUXT_DATA__']) {
+        const script = document.getElementById(id);
+        if (script && script.textContent) states.push(script.textContent);
+    }
+    for (const script of document.querySelectorAll('script[type="application/json"], script[type="application/ld+json"]')) {
+        if (script.textContent && !script.id.startsWith('__N')) states.push(script.textContent);
+    }
+    for (const name of ['__NUXT__', '__INITIAL_STATE__', '__PRELOADED_STATE__', '__APOLLO_STATE__']) {
+        try {
+            if (window[name]) states.push(JSON.stringify(window[name]));
+        } catch (e) {}
+    }
+    return states;
+}
+"""
+
+
+# Image sources of the viewer's <img> elements, placeholders included, so their count is the page count.
+DOM_IMAGE_SOURCES_SCRIPT = """
+(selector) => Array.from(document.querySelectorAll(selector), img => img.getAttribute('data-src') || img.src || '')
+"""
+
+
+def is_image_url(value: Any) -> bool:
+    return isinstance(value, str) and IMAGE_URL_PATTERN.match(value) is not None
+
+
+def absolute(url: str) -> str:
+    return f"https:{url}" if url.startswith("//") else url
+
+
+def walk(data: Any, path: Tuple[str, ...] = ()) -> Iterator[Tuple[Tuple[str, ...], Any]]:
+    """Every value in a JSON document with the keys leading to it."""
+    yield path, data
+    if isinstance(data, dict):
+        for key, value in data.items():
+            yield from walk(value, path + (str(key),))
+    elif isinstance(data, list):
+        for value in data:
+            yield from walk(value, path)
+
+
+def image_of(item: Any) -> Optional[str]:
+    """The page image a list item stands for: the URL itself or the one image URL field of an object."""
+    if is_image_url(item):
+        return item
+    if isinstance(item, dict):
+        urls = [value for key, value in item.items() if is_image_url(value) and not THUMBNAIL_KEY_PATTERN.search(key)]
+        if len(urls) == 1:
+            return urls[0]
+    return None
+
+
+def image_lists(data: Any, min_count: int = 2) -> List[List[str]]:
+    """Lists in a JSON document where every item is one image, skipping thumbnail/cover lists."""
+    found = []
+    for path, value in walk(data):
+        if not isinstance(value, list) or len(value) < min_count:
+            continue
+        if path and THUMBNAIL_KEY_PATTERN.search(path[-1]):
+            continue
+        images = [image_of(item) for item in value]
+        if all(images):
+            found.append([absolute(image) for image in images])
+    return found
+
+
+def best_image_list(documents: List[Any], min_count: int = 2) -> List[str]:
+    """The longest image list across documents; an episode's pages outnumber any other list in its data."""
+    best: List[str] = []
+    for document in documents:
+        for images in image_lists(document, min_count):
+            if len(images) > len(best):
+                best = images
+    return best
+
+
+async def embedded_states(page: Page) -> List[Any]:
+    """JSON state the page was rendered with, parsed; empty when it has none."""
+    try:
+        texts = await page.evaluate(EMBEDDED_STATE_SCRIPT)
+    except Exception:
+        return []
+    states = []
+    for text in texts:
+        try:
+            states.append(json.loads(text))
+        except ValueError:
+            continue
+    return states
+
+
+class JsonResponses:
+    """Keeps the JSON bodies of a page's XHR/fetch responses since the last start()."""
+
+    def __init__(self) -> None:
+        self.documents: List[Any] = []
+        self.pending: Set[asyncio.Future] = set()
+
+    def attach(self, page: Page) -> None:
+        page.on("response", self.on_response)
+
+    def start(self) -> None:
+        for task in self.pending:
+            task.cancel()
+        self.pending.clear()
+        self.documents = []
+
+    def on_response(self, response: Response) -> None:
+        if response.request.resource_type not in ("xhr", "fetch") or response.status != 200:
+            return
+        content_type = response.headers.get("content-type", "")
+        if not any(kind in content_type for kind in JSON_CONTENT_TYPES):
+            return
+        task = asyncio.ensure_future(self.read(response, self.documents))
+        self.pending.add(task)
+        task.add_done_callback(self.pending.discard)
+
+    async def read(self, response: Response, documents: List[Any]) -> None:
+        try:
+            documents.append(await response.json())
+        except Exception:
+            # Not JSON after all, or the page navigated away before the body was read.
+            pass
+
+    async def settle(self, timeout: float = 2.0) -> None:
+        if self.pending:
+            await asyncio.wait(set(self.pending), timeout=timeout)
+
+
+async def wait_for_image_list(
+    page: Page,
+    responses: Optional[JsonResponses],
+    timeout: float,
+    poll: float = 0.1,
+    min_count: int = 2,
+) -> List[str]:
+    """Image URLs from the page's embedded state or its JSON responses, as soon as either has them.
+
+    Returns an empty list when neither carries an image list within timeout,
+    so the caller falls back to scraping the DOM.
+    """
+    images = best_image_list(await embedded_states(page), min_count)
+    if images:
+        return images
+    if responses is None:
+        return []
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    while True:
+        images = best_image_list(responses.documents, min_count)
+        if images:
+            # Bodies still being read may hold the full list the first hit was part of.
+            await responses.settle(poll * 5)
+            return best_image_list(responses.documents, min_count)
+        if loop.time() >= deadline:
+            return []
+        await asyncio.sleep(poll)
+
+
+async def matches_dom(page: Page, images: List[str], selector: str, timeout: float) -> bool:
+    """Whether an image list taken from page data is the one the viewer renders into selector.
+
+    The longest list in a JSON response is not necessarily the episode's
+    pages (a recommendations feed or another episode's prefetch can be
+    longer), so it is accepted only when the viewer has the same number of
+    <img> elements and its real (non-placeholder) sources share a host with it.
+    """
+    try:
+        await page.wait_for_selector(selector, state="attached", timeout=timeout * 1000)
+        sources = await page.evaluate(DOM_IMAGE_SOURCES_SCRIPT, selector)
+    except Exception:
+        return False
+    if len(sources) != len(images):
+        return False
+    dom_hosts = {urlparse(absolute(source)).netloc for source in sources if is_image_url(source)}
+    return not dom_hosts or bool(dom_hosts & {urlparse(image).netloc for image in images})
+
+
+TITLE_KEYS = ("title", "name", "titleName", "contentTitle", "comicTitle")
+DESCRIPTION_KEYS = ("description", "synopsis", "summary", "introduction", "intro", "story")
+KEYWORD_KEYS = ("genres", "genre", "keywords", "tags", "hashtags", "categories")
+COVER_KEYS = ("thumbnail", "thumbnailUrl", "coverImage", "cover", "image", "imageUrl", "poster")
+
+
+def normalize_title(text: str) -> str:
+    return " ".join(text.split()).casefold()
+
+
+def find_record(documents: List[Any], title: str) -> Optional[Dict[str, Any]]:
+    """The object in the page data that describes the item called title.
+
+    Matching on the title the page shows keeps the lookup independent of the
+    site's schema and of how deep the record is nested.
+    """
+    wanted = normalize_title(title)
+    if not wanted:
+        return None
+    best = None
+    for document in documents:
+        for _, value in walk(document):
+            if not isinstance(value, dict):
+                continue
+            if any(isinstance(value.get(key), str) and normalize_title(value[key]) == wanted for key in TITLE_KEYS):
+                # The richest match is the detail record, not a breadcrumb or a related-title card.
+                if best is None or len(value) > len(best):
+                    best = value
+    return best
+
+
+def names(value: Any) -> List[str]:
+    """Strings of a keyword field: a list of strings, a list of {name: ...} objects or a comma separated string."""
+    if isinstance(value, str):
+        return [part.strip() for part in value.split(",") if part.strip()]
+    if not isinstance(value, list):
+        return []
+    found = []
+    for item in value:
+        if isinstance(item, str):
+            found.append(item.strip())
+        elif isinstance(item, dict):
+            name = next((item[key] for key in TITLE_KEYS if isinstance(item.get(key), str)), None)
+            if name:
+                found.append(name.strip())
+    return [name for name in found if name]
+
+
+def comic_metadata(documents: List[Any], title: str) -> Dict[str, Any]:
+    """Description, keywords and cover of the comic called title, where the page data has them."""
+    record = find_record(documents, title)
+    if record is None:
+        return {}
+    metadata: Dict[str, Any] = {}
+    description = next(
+        (record[key] for key in DESCRIPTION_KEYS if isinstance(record.get(key), str) and record[key].strip()), None)
+    if description:
+        metadata["description"] = description.strip()
+    keywords: List[str] = []
+    for key in KEYWORD_KEYS:
+        keywords.extend(name for name in names(record.get(key)) if name not in keywords)
+    if keywords:
+        metadata["keywords"] = keywords
+    cover = next((record[key] for key in COVER_KEYS if is_image_url(record.get(key))), None)
+    if cover:
+        metadata["thumbnail"] = absolute(cover)
+    return metadata
@@ -0,0 +1,96 @@
+import asyncio
+import time
+from typing import Callable, Dict, Optional
+
+from playwright.async_api import Page
+
+
+class PageWaits:
+    """Condition-based page waits with per-stage upper bounds and time accounting.
+
+    Each wait returns as soon as its condition holds (a selector appears or
+    disappears, the URL changes, the network goes idle, the image count stops
+    growing) and gives up at the stage's bound instead of failing, so callers
+    carry on exactly as they did after a fixed sleep. The time spent per stage
+    is kept for report().
+    """
+
+    def __init__(self, bounds: Optional[Dict[str, float]] = None, default_bound: float = 10.0):
+        self.bounds = dict(bounds or {})
+        self.default_bound = default_bound
+        self.waited: Dict[str, float] = {}
+        self.counts: Dict[str, int] = {}
+        self.timeouts: Dict[str, int] = {}
+
+    def bound_ms(self, stage: str) -> float:
+        return self.bounds.get(stage, self.default_bound) * 1000
+
+    def record(self, stage: str, started: float, met: bool) -> bool:
+        self.waited[stage] = self.waited.get(stage, 0.0) + time.perf_counter() - started
+        self.counts[stage] = self.counts.get(stage, 0) + 1
+        if not met:
+            self.timeouts[stage] = self.timeouts.get(stage, 0) + 1
+        return met
+
+    async def selector(self, page: Page, stage: str, selector: str, state: str = "visible") -> bool:
+        """Wait until selector reaches state ("visible", "attached", "hidden", "detached")."""
+        started = time.perf_counter()
+        try:
+            await page.wait_for_selector(selector, state=state, timeout=self.bound_ms(stage))
+            met = True
+        except Exception:
+            met = False
+        return self.record(stage, started, met)
+
+    async def hidden(self, page: Page, stage: str, selector: str) -> bool:
+        return await self.selector(page, stage, selector, state="hidden")
+
+    async def url(self, page: Page, stage: str, predicate: Callable[[str], bool]) -> bool:
+        started = time.perf_counter()
+        try:
+            await page.wait_for_url(predicate, timeout=self.bound_ms(stage))
+            met = True
+        except Exception:
+            met = False
+        return self.record(stage, started, met)
+
+    async def network_idle(self, page: Page, stage: str) -> bool:
+        started = time.perf_counter()
+        try:
+            await page.wait_for_load_state("networkidle", timeout=self.bound_ms(stage))
+            met = True
+        except Exception:
+            met = False
+        return self.record(stage, started, met)
+
+    async def count_stable(self, page: Page, stage: str, selector: str, quiet: float = 0.3, poll: float = 0.1) -> int:
+        """Wait until the number of elements matching selector is non-zero and unchanged for quiet seconds."""
+        started = time.perf_counter()
+        deadline = started + self.bound_ms(stage) / 1000
+        last_count = -1
+        changed_at = started
+        while True:
+            count = await page.eval_on_selector_all(selector, "els => els.length")
+            now = time.perf_counter()
+            if count != last_count:
+                last_count, changed_at = count, now
+            elif count and now - changed_at >= quiet:
+                self.record(stage, started, True)
+                return count
+            if now >= deadline:
+                self.record(stage, started, False)
+                return count
+            await asyncio.sleep(poll)
+
+    def total(self) -> float:
+        return sum(self.waited.values())
+
+    def report(self) -> str:
+        if not self.waited:
+            return "no waits"
+        stages = ", ".join(
+            f"{stage} {seconds:.1f} s over {self.counts[stage]}"
+            + (f" ({self.timeouts[stage]} hit the bound)" if self.timeouts.get(stage) else "")
+            for stage, seconds in sorted(self.waited.items(), key=lambda item: -item[1])
+        )
+        return f"{self.total():.1f} s waiting in total: {stages}"
@@ -0,0 +1,97 @@
+import asyncio
+import threading
+import time
+from typing import Dict, Optional, Tuple
+from urllib.parse import urlparse
+
+
+DEFAULT_RATE = 5.0
+DEFAULT_BURST = 10
+
+
+class TokenBucket:
+    """Classic token bucket: ``rate`` tokens per second, at most ``burst`` saved up."""
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self.tokens = float(self.burst)
+        self.updated = time.monotonic()
+
+    def reserve(self) -> float:
+        """Take one token and return how long the caller must wait before using it."""
+        if self.rate <= 0:
+            return 0.0
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        self.tokens -= 1
+        # A negative balance is a reservation: callers queue up behind each other.
+        return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+
+class HostRateLimiter:
+    """Per-host token buckets usable from asyncio code and from threads.
+
+    Reservations are taken under a ``threading.Lock`` and never block, so the
+    same instance can pace aiohttp coroutines (``wait_async``) and
+    requests/Selenium calls (``wait``).
+    """
+
+    def __init__(
+        self,
+        rate: float = DEFAULT_RATE,
+        burst: int = DEFAULT_BURST,
+        host_limits: Optional[Dict[str, Tuple[float, int]]] = None,
+    ):
+        self.rate = rate
+        self.burst = burst
+        self.host_limits: Dict[str, Tuple[float, int]] = dict(host_limits or {})
+        self.buckets: Dict[str, TokenBucket] = {}
+        self.waited: Dict[str, float] = {}
+        self.lock = threading.Lock()
+
+    def configure(self, rate: Optional[float] = None, burst: Optional[int] = None, host: Optional[str] = None) -> None:
+        """Change the default limits, or the limits of one host (and its subdomains)."""
+        with self.lock:
+            if host:
+                current_rate, current_burst = self.host_limits.get(host, (self.rate, self.burst))
+                self.host_limits[host] = (
+                    current_rate if rate is None else rate,
+                    current_burst if burst is None else burst,
+                )
+            else:
+                self.rate = self.rate if rate is None else rate
+                self.burst = self.burst if burst is None else burst
+            self.buckets.clear()
+
+    def limits_for(self, host: str) -> Tuple[float, int]:
+        for pattern, limits in self.host_limits.items():
+            if host == pattern or host.endswith(f".{pattern}"):
+                return limits
+        return self.rate, self.burst
+
+    def delay(self, url: str) -> float:
+        host = (urlparse(url).hostname or url).lower()
+        with self.lock:
+            bucket = self.buckets.get(host)
+            if bucket is None:
+                bucket = self.buckets[host] = TokenBucket(*self.limits_for(host))
+            delay = bucket.reserve()
+            if delay > 0:
+                self.waited[host] = self.waited.get(host, 0.0) + delay
+        return delay
+
+    def wait(self, url: str) -> float:
+        """Block the calling thread until a request to url's host is allowed."""
+        delay = self.delay(url)
+        if delay > 0:
+            time.sleep(delay)
+        return delay
+
+    async def wait_async(self, url: str) -> float:
+        """Asyncio counterpart of wait()."""
+        delay = self.delay(url)
+        if delay > 0:
+            await asyncio.sleep(delay)
+        return delay
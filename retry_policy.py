@@ -0,0 +1,133 @@
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import Any, Optional
+
+
+# 416 is retried on purpose: the resuming downloaders drop their stale ``.part`` and start over.
+RETRYABLE_STATUSES = {408, 416, 425, 429}
+RETRY_AFTER_STATUSES = {429, 503}
+
+
+def status_of(error: BaseException) -> Optional[int]:
+    """HTTP status behind an aiohttp, requests or HttpStatusError failure; None for network errors."""
+    status = getattr(error, "status", None)
+    if isinstance(status, int):
+        return status
+    response = getattr(error, "response", None)
+    status = getattr(response, "status_code", None)
+    return status if isinstance(status, int) else None
+
+
+def headers_of(error: BaseException) -> Any:
+    headers = getattr(error, "headers", None)
+    if headers is None:
+        headers = getattr(getattr(error, "response", None), "headers", None)
+    return headers or {}
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Seconds to wait from a Retry-After header: delta-seconds or an HTTP date."""
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError, OverflowError):
+        return None
+
+
+def retry_after(error: BaseException) -> Optional[float]:
+    """The server's requested wait for a 429/503 failure, if it sent one."""
+    if status_of(error) not in RETRY_AFTER_STATUSES:
+        return None
+    explicit = getattr(error, "retry_after", None)
+    if explicit is not None:
+        return explicit
+    return parse_retry_after(headers_of(error).get("Retry-After"))
+
+
+def is_retryable(error: BaseException) -> bool:
+    """Network errors, timeouts, 5xx and the few 4xx that can succeed later; a 404 or 403 will not."""
+    status = status_of(error)
+    return status is None or status in RETRYABLE_STATUSES or status >= 500
+
+
+class RetryPolicy:
+    """Retry decisions shared by every downloader of a run.
+
+    Attempt n waits a random time between 0 and ``base_delay * 2 ** (n - 1)``
+    (full jitter, capped at ``max_delay``), so clients that failed together do
+    not come back together. A 429/503 with Retry-After waits at least what
+    the server asked for, up to ``max_retry_after``. The run has a retry
+    budget of ``budget_minimum`` retries plus ``budget_ratio`` per request:
+    once a struggling host has used it up, failures are given up at once
+    instead of multiplying the load. Like HostRateLimiter, one instance
+    serves coroutines and threads.
+    """
+
+    def __init__(
+        self,
+        attempts: int = 4,
+        base_delay: float = 1.0,
+        max_delay: float = 30.0,
+        max_retry_after: float = 120.0,
+        budget_ratio: float = 0.2,
+        budget_minimum: int = 10,
+    ):
+        self.attempts = max(1, attempts)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_retry_after = max_retry_after
+        self.budget_ratio = budget_ratio
+        self.budget_minimum = budget_minimum
+        self.requests = 0
+        self.attempted = 0
+        self.succeeded = 0
+        self.retried = 0
+        self.given_up = 0
+        self.over_budget = 0
+        self.lock = threading.Lock()
+
+    def started(self, attempt: int) -> None:
+        """Count one attempt; attempt 1 is a new request and adds to the retry budget."""
+        with self.lock:
+            self.attempted += 1
+            if attempt == 1:
+                self.requests += 1
+
+    def success(self) -> None:
+        with self.lock:
+            self.succeeded += 1
+
+    def backoff(self, attempt: int) -> float:
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+
+    def budget_left(self) -> bool:
+        return self.retried < self.budget_minimum + self.budget_ratio * self.requests
+
+    def retry_delay(self, attempt: int, error: BaseException) -> Optional[float]:
+        """Seconds to wait before attempt + 1, or None when the request should be given up."""
+        with self.lock:
+            if attempt >= self.attempts or not is_retryable(error):
+                self.given_up += 1
+                return None
+            if not self.budget_left():
+                self.given_up += 1
+                self.over_budget += 1
+                return None
+            self.retried += 1
+        delay = self.backoff(attempt)
+        requested = retry_after(error)
+        if requested is not None:
+            delay = max(delay, min(requested, self.max_retry_after))
+        return delay
+
+    def report(self) -> str:
+        return (
+            f"{self.attempted} attempts for {self.requests} requests: {self.succeeded} succeeded, "
+            f"{self.retried} retries, {self.given_up} given up ({self.over_budget} over the retry budget)"
+        )
@@ -0,0 +1,143 @@
+import json
+import os
+import threading
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Union
+
+
+class EpisodeJournal:
+    """View of a RunJournal bound to one comic/episode, handed to image download loops."""
+
+    def __init__(self, journal: "RunJournal", comic_key: str, episode_key: str):
+        self.journal = journal
+        self.comic_key = comic_key
+        self.episode_key = episode_key
+
+    def image_done(self, index: int, filepath: Union[str, Path]) -> Optional[str]:
+        """Recorded filename if image ``index`` finished earlier and is still on disk."""
+        return self.journal.image_done(self.comic_key, self.episode_key, index, filepath)
+
+    def record_image(self, index: int, filename: str) -> None:
+        self.journal.record_image(self.comic_key, self.episode_key, index, filename)
+
+
+class RunJournal:
+    """Append-only JSON Lines log of finished comics, episodes and images.
+
+    Each line is flushed as soon as the work it describes is done, so after a
+    crash the next run can skip finished work and rebuild its outputs from the
+    recorded comic records. The file is removed by finish() once a run
+    completes and its outputs are written.
+    """
+
+    def __init__(self, path: Union[str, Path], fresh: bool = False):
+        self.path = Path(path)
+        self.lock = threading.Lock()
+        self.comics: Dict[str, Dict[str, Any]] = {}
+        self.episodes: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        self.images: Dict[Tuple[str, str, int], str] = {}
+        if fresh and self.path.exists():
+            self.path.unlink()
+        self.load()
+        self.handle = open(self.path, "a", encoding="utf-8")
+        if self.path.stat().st_size and not self.ends_with_newline():
+            # Terminate a line cut short by a crash so the next entry starts clean.
+            self.handle.write("\n")
+            self.handle.flush()
+
+    def ends_with_newline(self) -> bool:
+        with open(self.path, "rb") as journal_file:
+            journal_file.seek(-1, os.SEEK_END)
+            return journal_file.read(1) == b"\n"
+
+    def load(self) -> None:
+        if not self.path.exists():
+            return
+        with open(self.path, "r", encoding="utf-8") as journal_file:
+            for line in journal_file:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # The last line may be cut short by the crash being recovered from.
+                    continue
+                kind = entry.get("type")
+                if kind == "comic":
+                    self.comics[entry["comic"]] = entry["record"]
+                elif kind == "episode":
+                    self.episodes[(entry["comic"], entry["episode"])] = entry["record"]
+                elif kind == "image":
+                    self.images[(entry["comic"], entry["episode"], entry["index"])] = entry["file"]
+
+    @property
+    def resumed(self) -> bool:
+        return bool(self.comics or self.episodes or self.images)
+
+    def append(self, entry: Dict[str, Any], sync: bool = False) -> None:
+        line = json.dumps(entry, ensure_ascii=False)
+        with self.lock:
+            self.handle.write(line + "\n")
+            self.handle.flush()
+            if sync:
+                os.fsync(self.handle.fileno())
+
+    def comic(self, comic_key: str) -> Optional[Dict[str, Any]]:
+        return self.comics.get(comic_key)
+
+    def episode(self, comic_key: str, episode_key: str) -> Optional[Dict[str, Any]]:
+        return self.episodes.get((comic_key, episode_key))
+
+    def for_episode(self, comic_key: str, episode_key: str) -> EpisodeJournal:
+        return EpisodeJournal(self, comic_key, episode_key)
+
+    def image_done(self, comic_key: str, episode_key: str, index: int, filepath: Union[str, Path]) -> Optional[str]:
+        filename = self.images.get((comic_key, episode_key, index))
+        if filename is None:
+            return None
+        path = Path(filepath)
+        if not path.exists() or path.stat().st_size == 0:
+            return None
+        return filename
+
+    def record_image(self, comic_key: str, episode_key: str, index: int, filename: str) -> None:
+        self.images[(comic_key, episode_key, index)] = filename
+        self.append({"type": "image", "comic": comic_key, "episode": episode_key, "index": index, "file": filename})
+
+    def record_episode(self, comic_key: str, episode_key: str, record: Dict[str, Any]) -> None:
+        self.episodes[(comic_key, episode_key)] = record
+        self.append({"type": "episode", "comic": comic_key, "episode": episode_key, "record": record}, sync=True)
+
+    def record_comic(self, comic_key: str, record: Dict[str, Any]) -> None:
+        self.comics[comic_key] = record
+        self.append({"type": "comic", "comic": comic_key, "record": record}, sync=True)
+
+    def all_recorded(self, comic_keys: Iterable[str]) -> bool:
+        """True when every comic in comic_keys has a finished record, i.e. nothing is left to resume."""
+        return all(key in self.comics for key in comic_keys)
+
+    def completed(self, comic_keys: List[str]) -> List[Dict[str, Any]]:
+        """Recorded comic records in the order of comic_keys."""
+        return [self.comics[key] for key in comic_keys if key in self.comics]
+
+    def close(self) -> None:
+        with self.lock:
+            if not self.handle.closed:
+                self.handle.close()
+
+    def finish(self) -> None:
+        """Close and delete the journal after the run's outputs have been written."""
+        self.close()
+        try:
+            self.path.unlink()
+        except FileNotFoundError:
+            pass
+
+    def finish_if_complete(self, comic_keys: Iterable[str] = (), failed: bool = False) -> bool:
+        """finish() the journal if nothing failed and every comic in comic_keys was recorded.
+
+        Otherwise the journal stays on disk for the next run to resume from.
+        Returns whether it was removed.
+        """
+        if failed or not self.all_recorded(comic_keys):
+            return False
+        self.finish()
+        return True
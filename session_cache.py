@@ -0,0 +1,91 @@
+import json
+import os
+import time
+from pathlib import Path
+from typing import Optional, Union
+
+from playwright.async_api import BrowserContext
+from playwright.async_api import TimeoutError as PlaywrightTimeoutError
+
+
+DEFAULT_SESSION_DIR = Path(".sessions")
+# A saved session older than this is logged into again even if the probe would accept it.
+DEFAULT_MAX_AGE = 7 * 24 * 3600
+
+
+class SessionCache:
+    """Playwright storage state (cookies and localStorage) of a logged-in context, saved per site.
+
+    state() hands the file to ``browser.new_context(storage_state=...)`` as
+    long as it is recent and still holds a cookie that has not expired.
+    Whether the server still accepts it is checked separately with probe()
+    or, for sites that draw their login controls client-side, probe_page(),
+    so a scraper only logs in when the cached session is missing or stale.
+    """
+
+    def __init__(self, site: str, directory: Union[str, Path] = DEFAULT_SESSION_DIR, max_age: float = DEFAULT_MAX_AGE):
+        self.path = Path(directory) / f"{site}.json"
+        self.max_age = max_age
+
+    def state(self) -> Optional[str]:
+        """Path of a usable saved state, or None when a fresh login is needed."""
+        if not self.path.exists():
+            return None
+        if time.time() - self.path.stat().st_mtime > self.max_age:
+            return None
+        try:
+            with open(self.path, "r", encoding="utf-8") as state_file:
+                cookies = json.load(state_file).get("cookies", [])
+        except (OSError, ValueError, AttributeError):
+            return None
+        now = time.time()
+        # Session cookies carry expires == -1 and live as long as the saved state does.
+        if not any(cookie.get("expires", -1) < 0 or cookie["expires"] > now for cookie in cookies):
+            return None
+        return str(self.path)
+
+    async def save(self, context: BrowserContext) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        temp_path = self.path.with_name(f"{self.path.name}.tmp")
+        await context.storage_state(path=str(temp_path))
+        os.replace(temp_path, self.path)
+
+    def discard(self) -> None:
+        try:
+            self.path.unlink()
+        except FileNotFoundError:
+            pass
+
+    async def probe(self, context: BrowserContext, url: str, logged_out_marker: str) -> bool:
+        """Fetch url with the context's cookies, without rendering it; True if the session is still logged in."""
+        try:
+            response = await context.request.get(url, timeout=15000)
+            body = await response.text()
+        except Exception:
+            return False
+        return response.ok and logged_out_marker not in body
+
+    async def probe_page(
+        self, context: BrowserContext, url: str, logged_out_selector: str, timeout: float = 5000
+    ) -> bool:
+        """Render url in a throwaway page; True if logged_out_selector does not show up within timeout ms.
+
+        For sites whose login button only exists after their scripts run, so
+        the raw HTML that probe() sees looks the same whether or not the
+        session is still valid.
+        """
+        page = await context.new_page()
+        try:
+            try:
+                await page.goto(url, wait_until="load", timeout=30000)
+            except Exception:
+                return False
+            try:
+                await page.wait_for_selector(logged_out_selector, state="attached", timeout=timeout)
+            except PlaywrightTimeoutError:
+                return True
+            except Exception:
+                return False
+            return False
+        finally:
+            await page.close()
@@ -0,0 +1,197 @@
+import hashlib
+import os
+import re
+import threading
+from pathlib import Path
+from typing import Dict, Mapping, Optional, Union
+
+import aiofiles
+import aiohttp
+
+from image_store import HASH_ALGORITHM, ContentStore
+
+
+CHUNK_SIZE = 1 << 16
+CONTENT_RANGE_PATTERN = re.compile(r"bytes\s+(\d+)-(\d+)/(\d+|\*)")
+
+
+class IncompleteDownloadError(Exception):
+    """Raised when a response body is shorter or longer than its Content-Length."""
+
+
+class HttpStatusError(Exception):
+    """Non-200 image response; keeps the status and headers so callers can tell 429/5xx apart and honour Retry-After."""
+
+    def __init__(self, status: int, headers: Optional[Mapping[str, str]] = None):
+        super().__init__(f"HTTP error {status}")
+        self.status = status
+        self.headers = headers or {}
+
+
+class ResumeStats:
+    """Counters for Range resumes, shared by the async and the threaded downloaders."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.resumed = 0
+        self.restarted = 0
+        self.bytes_saved = 0
+
+    def record(self, offset: int, had_partial: bool) -> None:
+        with self.lock:
+            if offset:
+                self.resumed += 1
+                self.bytes_saved += offset
+            elif had_partial:
+                self.restarted += 1
+
+    def report(self) -> str:
+        return (
+            f"range resume: {self.resumed} transfers resumed, {self.restarted} restarted from zero, "
+            f"{self.bytes_saved / (1024 * 1024):.1f} MiB not downloaded again"
+        )
+
+
+RESUME_STATS = ResumeStats()
+
+
+def partial_path(filepath: Union[str, Path]) -> Path:
+    path = Path(filepath)
+    return path.with_name(f"{path.name}.part")
+
+
+def validator_path(filepath: Union[str, Path]) -> Path:
+    path = Path(filepath)
+    return path.with_name(f"{path.name}.part.validator")
+
+
+def partial_size(filepath: Union[str, Path]) -> int:
+    try:
+        return partial_path(filepath).stat().st_size
+    except FileNotFoundError:
+        return 0
+
+
+def discard_partial(filepath: Union[str, Path]) -> None:
+    for path in (partial_path(filepath), validator_path(filepath)):
+        try:
+            path.unlink()
+        except FileNotFoundError:
+            pass
+
+
+def resume_headers(filepath: Union[str, Path]) -> Dict[str, str]:
+    """Headers for every attempt of a resumable download.
+
+    The identity encoding is asked for from the first attempt on: the
+    ``.part`` file holds decoded bytes, which only line up with Range offsets
+    when the body was not compressed. Once a ``.part`` exists, Range/If-Range
+    continue it; If-Range makes the server send the whole body (200) instead
+    of a range when the image changed since the partial bytes were written.
+    """
+    headers = {"Accept-Encoding": "identity"}
+    size = partial_size(filepath)
+    if not size:
+        return headers
+    headers["Range"] = f"bytes={size}-"
+    try:
+        headers["If-Range"] = validator_path(filepath).read_text(encoding="utf-8").strip()
+    except FileNotFoundError:
+        pass
+    return headers
+
+
+def resume_offset(status: int, headers: Mapping[str, str], filepath: Union[str, Path]) -> int:
+    """Size of the ``.part`` file a response continues, or 0 when it starts from byte zero."""
+    if status != 206:
+        return 0
+    match = CONTENT_RANGE_PATTERN.match(headers.get("Content-Range", ""))
+    size = partial_size(filepath)
+    if not match or int(match.group(1)) != size:
+        # A range we did not ask for cannot be appended; start over next time.
+        discard_partial(filepath)
+        raise IncompleteDownloadError(f"Unexpected Content-Range {headers.get('Content-Range')!r}")
+    return size
+
+
+def save_validator(filepath: Union[str, Path], headers: Mapping[str, str]) -> None:
+    """Remember the strong ETag (or Last-Modified) so a later resume can send If-Range."""
+    etag = headers.get("ETag", "")
+    validator = etag if etag and not etag.startswith("W/") else headers.get("Last-Modified", "")
+    path = validator_path(filepath)
+    if validator:
+        path.write_text(validator, encoding="utf-8")
+    else:
+        try:
+            path.unlink()
+        except FileNotFoundError:
+            pass
+
+
+def hash_partial(filepath: Union[str, Path], offset: int):
+    """Digest seeded with the bytes already in the ``.part`` file."""
+    digest = hashlib.new(HASH_ALGORITHM)
+    if offset:
+        with open(partial_path(filepath), "rb") as existing:
+            for block in iter(lambda: existing.read(CHUNK_SIZE), b""):
+                digest.update(block)
+    return digest
+
+
+def expected_length(response: aiohttp.ClientResponse) -> int:
+    """Body size announced by the server, or -1 if it cannot be checked."""
+    if response.headers.get("Content-Encoding", "identity") != "identity":
+        # aiohttp decompresses transparently, so the header counts encoded bytes.
+        return -1
+    return response.content_length if response.content_length is not None else -1
+
+
+async def stream_to_file(
+    response: aiohttp.ClientResponse,
+    filepath: Union[str, Path],
+    chunk_size: int = CHUNK_SIZE,
+    store: Optional[ContentStore] = None,
+    resume: bool = False,
+) -> int:
+    """Write the response body chunk by chunk and atomically move it to filepath.
+
+    The body goes to ``<name>.part`` first, so an interrupted transfer never
+    leaves a truncated file under the final name. With a ``store`` the body is
+    hashed on the way and deduplicated into it. With ``resume`` a 206 response
+    to resume_headers() is appended to the existing ``.part`` file, and a
+    failed transfer keeps its ``.part`` for the next attempt. Returns the bytes
+    written by this call.
+    """
+    destination = Path(filepath)
+    temp_path = partial_path(destination)
+    had_partial = resume and temp_path.exists()
+    offset = resume_offset(response.status, response.headers, destination) if resume else 0
+    if resume and not offset:
+        save_validator(destination, response.headers)
+    digest = hash_partial(destination, offset) if store is not None else None
+    written = 0
+    try:
+        async with aiofiles.open(temp_path, "ab" if offset else "wb") as f:
+            async for chunk in response.content.iter_chunked(chunk_size):
+                await f.write(chunk)
+                if digest is not None:
+                    digest.update(chunk)
+                written += len(chunk)
+
+        expected = expected_length(response)
+        if expected >= 0 and written != expected:
+            raise IncompleteDownloadError(f"Expected {expected} bytes, got {written}")
+
+        if store is not None:
+            store.commit(temp_path, digest.hexdigest(), destination)
+        else:
+            os.replace(temp_path, destination)
+    except BaseException as error:
+        overlong = isinstance(error, IncompleteDownloadError) and written > expected_length(response) >= 0
+        if not resume or overlong:
+            discard_partial(destination)
+        raise
+    if resume:
+        discard_partial(destination)
+        RESUME_STATS.record(offset, had_partial)
+    return written
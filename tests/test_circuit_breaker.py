@@ -0,0 +1,225 @@
+import asyncio
+import threading
+
+import pytest
+
+from circuit_breaker import CircuitOpenError, DeferredDownloads, HostCircuitBreaker
+from streaming_download import HttpStatusError
+
+
+URL = "https://img.example.com/1.jpg"
+OTHER_URL = "https://cdn.example.org/1.jpg"
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+    async def sleep(self, seconds):
+        self.now += seconds
+
+
+def tripped(clock, threshold=3, reset_timeout=10, max_reset_timeout=40):
+    breaker = HostCircuitBreaker(threshold, reset_timeout, max_reset_timeout, clock=clock)
+    for _ in range(threshold):
+        breaker.before(URL)
+        breaker.failure(URL, ConnectionError())
+    return breaker
+
+
+def test_opens_after_consecutive_failures():
+    clock = FakeClock()
+    breaker = HostCircuitBreaker(failure_threshold=3, clock=clock)
+    for _ in range(2):
+        breaker.before(URL)
+        breaker.failure(URL, ConnectionError())
+    assert breaker.opened == 0
+    breaker.before(URL)
+    breaker.failure(URL, ConnectionError())
+    assert breaker.opened == 1
+    assert breaker.open_hosts() == ["img.example.com"]
+
+
+def test_success_resets_the_failure_count():
+    breaker = HostCircuitBreaker(failure_threshold=3, clock=FakeClock())
+    for _ in range(10):
+        breaker.failure(URL, ConnectionError())
+        breaker.failure(URL, ConnectionError())
+        breaker.success(URL)
+    breaker.before(URL)
+    assert breaker.opened == 0
+
+
+def test_permanent_errors_do_not_count():
+    breaker = HostCircuitBreaker(failure_threshold=2, clock=FakeClock())
+    for _ in range(5):
+        breaker.failure(URL, HttpStatusError(404))
+    breaker.before(URL)
+    assert breaker.open_hosts() == []
+
+
+def test_rejects_while_open():
+    clock = FakeClock()
+    breaker = tripped(clock)
+    clock.now += 4
+    with pytest.raises(CircuitOpenError) as error:
+        breaker.before(URL)
+    assert error.value.retry_in == pytest.approx(6)
+    assert breaker.retry_in(URL) == pytest.approx(6)
+    assert breaker.rejected == 1
+    # Other hosts are not affected.
+    breaker.before(OTHER_URL)
+
+
+def test_half_open_lets_a_single_probe_through():
+    clock = FakeClock()
+    breaker = tripped(clock)
+    clock.now += 10
+    breaker.before(URL)
+    with pytest.raises(CircuitOpenError):
+        breaker.before(URL)
+    breaker.success(URL)
+    breaker.before(URL)
+    breaker.before(URL)
+    assert breaker.open_hosts() == []
+
+
+def test_probe_that_never_reports_back_is_replaced():
+    clock = FakeClock()
+    breaker = tripped(clock)
+    clock.now += 10
+    breaker.before(URL)
+    clock.now += 10
+    breaker.before(URL)
+
+
+def test_failed_probe_doubles_the_reset_timeout_up_to_the_cap():
+    clock = FakeClock()
+    breaker = tripped(clock, reset_timeout=10, max_reset_timeout=40)
+    for expected in (20, 40, 40):
+        clock.now += breaker.retry_in(URL)
+        breaker.before(URL)
+        breaker.failure(URL, ConnectionError())
+        assert breaker.retry_in(URL) == pytest.approx(expected)
+    clock.now += breaker.retry_in(URL)
+    breaker.before(URL)
+    breaker.success(URL)
+    # A closed circuit starts again from the base timeout.
+    for _ in range(3):
+        breaker.failure(URL, ConnectionError())
+    assert breaker.retry_in(URL) == pytest.approx(10)
+
+
+class FlakyHost:
+    """A deferred image download against a host that comes back after ``down_for`` seconds."""
+
+    def __init__(self, breaker, clock, down_for):
+        self.breaker = breaker
+        self.clock = clock
+        self.up_at = clock.now + down_for
+        self.sent = []
+
+    def download(self, url, result="saved", attempts=3):
+        # Like the scrapers' downloaders: retries until the breaker reopens and raises CircuitOpenError.
+        async def retry():
+            for _ in range(attempts):
+                self.breaker.before(url)
+                self.sent.append(url)
+                if self.clock.now >= self.up_at:
+                    self.breaker.success(url)
+                    return result
+                self.breaker.failure(url, ConnectionError())
+            return None
+
+        return retry
+
+
+def test_drain_probes_once_then_sends_the_rest():
+    clock = FakeClock()
+    breaker = tripped(clock)
+    host = FlakyHost(breaker, clock, down_for=5)
+    deferred = DeferredDownloads(breaker, sleep=clock.sleep)
+    urls = [f"https://img.example.com/{index}.jpg" for index in range(4)]
+    for url in urls:
+        deferred.defer(url, host.download(url), "episode-1")
+    finished = []
+    deferred.after_drain(lambda: finished.append(deferred.pending("episode-1")))
+
+    asyncio.run(deferred.drain())
+
+    assert host.sent == urls
+    assert (deferred.recovered, deferred.lost) == (4, 0)
+    assert finished == [True]
+    assert deferred.items == []
+
+
+def test_drain_retries_over_rounds_while_the_host_is_down():
+    clock = FakeClock()
+    breaker = tripped(clock, reset_timeout=10, max_reset_timeout=40)
+    host = FlakyHost(breaker, clock, down_for=60)
+    deferred = DeferredDownloads(breaker, rounds=5, sleep=clock.sleep)
+    deferred.defer(URL, host.download(URL))
+    deferred.defer(URL, host.download(URL))
+
+    asyncio.run(deferred.drain())
+
+    assert (deferred.recovered, deferred.lost) == (2, 0)
+    # Probes at +10 and +30 fail and double the timeout; the one at +70 gets through.
+    assert clock.now == pytest.approx(1000 + 10 + 20 + 40)
+    assert host.sent == [URL, URL, URL, URL]
+
+
+def test_drain_gives_up_after_its_rounds():
+    clock = FakeClock()
+    breaker = tripped(clock)
+    deferred = DeferredDownloads(breaker, rounds=3, sleep=clock.sleep)
+
+    async def still_open():
+        raise CircuitOpenError("img.example.com", 10)
+
+    for _ in range(3):
+        deferred.defer(URL, still_open)
+    asyncio.run(deferred.drain())
+
+    assert (deferred.recovered, deferred.lost) == (0, 3)
+
+
+def test_retry_that_gives_up_counts_as_lost():
+    clock = FakeClock()
+    breaker = tripped(clock)
+    host = FlakyHost(breaker, clock, down_for=0)
+    deferred = DeferredDownloads(breaker, sleep=clock.sleep)
+    deferred.defer(URL, host.download(URL, result=None))
+    deferred.defer(URL, host.download(URL))
+
+    asyncio.run(deferred.drain())
+
+    assert (deferred.recovered, deferred.lost) == (1, 1)
+
+
+def test_threads_defer_into_one_queue():
+    clock = FakeClock()
+    breaker = tripped(clock)
+    host = FlakyHost(breaker, clock, down_for=0)
+    deferred = DeferredDownloads(breaker, sleep=clock.sleep)
+    finished = []
+
+    def worker(comic):
+        for page in range(50):
+            deferred.defer(URL, host.download(URL), comic, (comic, page // 10))
+        deferred.after_drain(lambda: finished.append(comic))
+
+    threads = [threading.Thread(target=worker, args=(comic,)) for comic in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(deferred.items) == 200
+    assert all(deferred.groups[comic] == 50 for comic in range(4))
+    asyncio.run(deferred.drain())
+    assert (deferred.recovered, deferred.lost) == (200, 0)
+    assert sorted(finished) == [0, 1, 2, 3]
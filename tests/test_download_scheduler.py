@@ -0,0 +1,162 @@
+import asyncio
+
+import pytest
+
+from download_scheduler import DownloadScheduler, EpisodeDownloads
+
+
+class FakeDownloader:
+    """Image jobs that finish when the test releases them; tracks how many run at once."""
+
+    def __init__(self):
+        self.gates = {}
+        self.started = []
+        self.running = 0
+        self.peak = 0
+
+    def job(self, name, fail=False):
+        gate = self.gates[name] = asyncio.Event()
+
+        async def download():
+            self.started.append(name)
+            self.running += 1
+            self.peak = max(self.peak, self.running)
+            try:
+                await gate.wait()
+                if fail:
+                    raise ConnectionError(name)
+                return f"{name}.jpg"
+            finally:
+                self.running -= 1
+
+        return download
+
+    def release(self, *names):
+        for name in names:
+            self.gates[name].set()
+
+
+async def settle():
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+def test_results_come_back_in_submission_order():
+    async def main():
+        downloader = FakeDownloader()
+        async with DownloadScheduler(transfers=3) as scheduler:
+            downloads = await scheduler.submit([downloader.job(name) for name in ("a", "b", "c")])
+            await settle()
+            downloader.release("c", "a", "b")
+            return await downloads.wait()
+
+    assert asyncio.run(main()) == ["a.jpg", "b.jpg", "c.jpg"]
+
+
+def test_episode_completes_without_waiting_for_later_episodes():
+    async def main():
+        downloader = FakeDownloader()
+        async with DownloadScheduler(transfers=4, backlog=8) as scheduler:
+            first = await scheduler.submit([downloader.job("1a"), downloader.job("1b")])
+            second = await scheduler.submit([downloader.job("2a"), downloader.job("2b")])
+            await settle()
+            # Both episodes' images are in flight together.
+            assert downloader.running == 4
+            downloader.release("1a", "1b")
+            assert await first.wait() == ["1a.jpg", "1b.jpg"]
+            assert not second.future.done()
+            downloader.release("2a", "2b")
+            assert await second.wait() == ["2a.jpg", "2b.jpg"]
+
+    asyncio.run(main())
+
+
+def test_transfers_bound_the_jobs_in_flight():
+    async def main():
+        downloader = FakeDownloader()
+        names = [str(index) for index in range(10)]
+        async with DownloadScheduler(transfers=3, backlog=20) as scheduler:
+            downloads = await scheduler.submit([downloader.job(name) for name in names])
+            await settle()
+            assert downloader.started == names[:3]
+            for name in names:
+                downloader.release(name)
+                await settle()
+            await downloads.wait()
+        return downloader.peak, scheduler
+
+    peak, scheduler = asyncio.run(main())
+    assert peak == 3
+    assert (scheduler.completed, scheduler.failed) == (10, 0)
+    assert scheduler.workers == []
+
+
+def test_failed_job_leaves_none_and_records_the_error():
+    async def main():
+        downloader = FakeDownloader()
+        async with DownloadScheduler(transfers=2) as scheduler:
+            downloads = await scheduler.submit([downloader.job("a"), downloader.job("b", fail=True)])
+            await settle()
+            downloader.release("a", "b")
+            results = await downloads.wait()
+        return results, downloads, scheduler
+
+    results, downloads, scheduler = asyncio.run(main())
+    assert results == ["a.jpg", None]
+    assert [str(error) for error in downloads.errors] == ["b"]
+    assert scheduler.failed == 1
+
+
+def test_episode_without_jobs_is_complete_at_once():
+    async def main():
+        async with DownloadScheduler() as scheduler:
+            downloads = await scheduler.submit([])
+            assert downloads.future.done()
+            return await downloads.wait()
+
+    assert asyncio.run(main()) == []
+
+
+def test_submit_waits_for_room_in_the_backlog():
+    async def main():
+        downloader = FakeDownloader()
+        async with DownloadScheduler(transfers=1, backlog=1) as scheduler:
+            submitting = asyncio.ensure_future(scheduler.submit([downloader.job(str(index)) for index in range(4)]))
+            await settle()
+            # One job running, one queued: the producer is held back.
+            assert not submitting.done()
+            for index in range(4):
+                downloader.release(str(index))
+                await settle()
+            await (await submitting).wait()
+
+    asyncio.run(main())
+
+
+def test_waiting_episode_survives_a_cancelled_waiter():
+    async def main():
+        downloader = FakeDownloader()
+        async with DownloadScheduler(transfers=1) as scheduler:
+            downloads = await scheduler.submit([downloader.job("a")])
+            waiter = asyncio.ensure_future(downloads.wait())
+            await settle()
+            waiter.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await waiter
+            downloader.release("a")
+            return await downloads.wait()
+
+    assert asyncio.run(main()) == ["a.jpg"]
+
+
+def test_finish_counts_down_to_the_future():
+    async def main():
+        downloads = EpisodeDownloads(2)
+        downloads.finish(1, "b")
+        assert not downloads.future.done()
+        downloads.finish(0, error=ValueError("a"))
+        return await downloads.wait(), downloads.errors
+
+    results, errors = asyncio.run(main())
+    assert results == [None, "b"]
+    assert isinstance(errors[0], ValueError)
@@ -0,0 +1,98 @@
+import json
+
+import pytest
+
+from jsonl_export import JsonLinesWriter, compact, iter_json_lines, write_json_array
+
+
+RECORDS = [
+    {
+        "title": "Solo Leveling",
+        "description": "Line one\nline \"two\" \\ <three> & four\t",
+        "thumbnail": "thumbnail.jpg",
+        "genres": ["Action", "Fantasy"],
+        "tags": [],
+        "rating": 4.5,
+        "completed": False,
+        "author": None,
+        "episodes": [
+            {"title": "episode 001", "images": ["episode_001_001.jpg", "episode_001_002.jpg"], "meta": {}},
+            {"title": "episode 002", "images": []},
+        ],
+    },
+    {
+        "title": "Пригоди в Києві — том 2",
+        "description": "Історія про «кохання» 🌸 та 日本語",
+        "genres": ["Романтика"],
+        "episodes": [],
+    },
+]
+
+# Exactly what json.dump(RECORDS[1:], f, indent=2) wrote; pinned so a change on either side shows up.
+GOLDEN = (
+    '[\n'
+    '  {\n'
+    '    "title": "\\u041f\\u0440\\u0438\\u0433\\u043e\\u0434\\u0438 \\u0432 '
+    '\\u041a\\u0438\\u0454\\u0432\\u0456 \\u2014 \\u0442\\u043e\\u043c 2",\n'
+    '    "description": "\\u0406\\u0441\\u0442\\u043e\\u0440\\u0456\\u044f \\u043f\\u0440\\u043e '
+    '\\u00ab\\u043a\\u043e\\u0445\\u0430\\u043d\\u043d\\u044f\\u00bb \\ud83c\\udf38 \\u0442\\u0430 '
+    '\\u65e5\\u672c\\u8a9e",\n'
+    '    "genres": [\n'
+    '      "\\u0420\\u043e\\u043c\\u0430\\u043d\\u0442\\u0438\\u043a\\u0430"\n'
+    '    ],\n'
+    '    "episodes": []\n'
+    '  }\n'
+    ']'
+)
+
+
+def legacy_dump(records, path, **kwargs):
+    with open(path, "w", encoding="utf-8") as legacy_file:
+        json.dump(records, legacy_file, indent=2, **kwargs)
+    return path.read_bytes()
+
+
+@pytest.mark.parametrize("records", [RECORDS, RECORDS[:1], []], ids=["many", "one", "empty"])
+@pytest.mark.parametrize("ensure_ascii", [True, False])
+def test_array_matches_json_dump(tmp_path, records, ensure_ascii):
+    expected = legacy_dump(records, tmp_path / "legacy.json", ensure_ascii=ensure_ascii)
+
+    count = write_json_array(iter(records), tmp_path / "streamed.json", ensure_ascii=ensure_ascii)
+
+    assert count == len(records)
+    assert (tmp_path / "streamed.json").read_bytes() == expected
+
+
+def test_array_matches_golden_output(tmp_path):
+    write_json_array(RECORDS[1:], tmp_path / "streamed.json")
+    assert (tmp_path / "streamed.json").read_text(encoding="utf-8") == GOLDEN
+    assert legacy_dump(RECORDS[1:], tmp_path / "legacy.json").decode("utf-8") == GOLDEN
+
+
+def test_compact_round_trips_json_lines(tmp_path):
+    with JsonLinesWriter(tmp_path / "comics.jsonl") as writer:
+        for record in RECORDS:
+            writer.write(record)
+
+    compact(tmp_path / "comics.jsonl", tmp_path / "comics.json")
+
+    assert list(iter_json_lines(tmp_path / "comics.jsonl")) == RECORDS
+    assert (tmp_path / "comics.json").read_bytes() == legacy_dump(RECORDS, tmp_path / "legacy.json")
+
+
+def test_compact_by_key_keeps_the_last_record(tmp_path):
+    with JsonLinesWriter(tmp_path / "comics.jsonl") as writer:
+        writer.write({"title": "A", "episodes": 1})
+        writer.write({"title": "B", "episodes": 1})
+        writer.write({"title": "A", "episodes": 2})
+
+    compact(tmp_path / "comics.jsonl", tmp_path / "comics.json", key="title")
+
+    expected = [{"title": "B", "episodes": 1}, {"title": "A", "episodes": 2}]
+    assert (tmp_path / "comics.json").read_bytes() == legacy_dump(expected, tmp_path / "legacy.json")
+
+
+def test_truncated_last_line_is_skipped(tmp_path):
+    path = tmp_path / "comics.jsonl"
+    path.write_text(json.dumps(RECORDS[0]) + "\n\n" + '{"title": "cut sh', encoding="utf-8")
+    assert list(iter_json_lines(path)) == [RECORDS[0]]
@@ -0,0 +1,34 @@
+import pytest
+
+import mangapark_parser as mangapark
+
+
+CHAPTER_PAGES = [
+    "<h6><span>Chapter 12: two <!-- ad --> end</span></h6>",
+    "<h6><span>one<script>var x = 1;</script>two</span></h6>",
+    "<h6><span>\n  Chapter   3 \n <b>The</b>  Return <style>b{}</style> </span></h6>",
+    "<h6><span>Fish &amp; <!--x-->Chips</span></h6>",
+]
+
+COMIC_PAGE = """
+<h3><a href="/title/1">Solo <!-- promo --> Leveling</a></h3>
+<div class="limit-html">First  line<br>second <script>track()</script> line</div>
+<img src="https://mangapark.io/thumb/1.jpg">
+<div class="flex items-center flex-wrap">
+  <span class="whitespace-nowrap">Sci <!--x--> Fi</span>
+  <span class="whitespace-nowrap"> Action   Adventure </span>
+</div>
+"""
+
+
+@pytest.mark.parametrize("html", CHAPTER_PAGES)
+def test_chapter_title_matches_beautifulsoup(html):
+    assert mangapark.extract_chapter_title(html) == mangapark.parse_chapter_title(html)
+
+
+def test_comment_inside_text_leaves_single_space():
+    assert mangapark.extract_chapter_title(CHAPTER_PAGES[0]) == "Chapter 12: two end"
+
+
+def test_comic_details_match_beautifulsoup():
+    assert mangapark.extract_comic_details(COMIC_PAGE) == mangapark.parse_comic_details(COMIC_PAGE)
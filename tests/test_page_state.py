@@ -0,0 +1,119 @@
+import asyncio
+import json
+
+import pytest
+
+pytest.importorskip("playwright")
+
+from page_state import JsonResponses, best_image_list, image_lists, matches_dom, wait_for_image_list
+
+
+CDN = "https://cdn.daycomics.com/episode/123"
+PAGES = [f"{CDN}/{index:03d}.jpg" for index in range(1, 6)]
+
+EPISODE_RESPONSE = {
+    "data": {
+        "episode": {
+            "title": "Episode 12",
+            "thumbnail": f"{CDN}/thumb.jpg",
+            "images": [{"imageUrl": url, "width": 800, "height": 1200} for url in PAGES],
+        },
+        # Longer than the episode, but every item is a cover: not page images.
+        "thumbnails": [f"https://cdn.daycomics.com/cover/{index}.jpg" for index in range(20)],
+    }
+}
+
+RECOMMENDATIONS_RESPONSE = {
+    "items": [
+        {"title": f"Comic {index}", "url": f"https://img.other-cdn.com/promo/{index}.webp"} for index in range(8)
+    ]
+}
+
+EMBEDDED_STATE = {
+    "props": {
+        "pageProps": {
+            "content": {"cover": f"{CDN}/cover.png", "banner": f"{CDN}/banner.png"},
+            "pages": [url.replace("https:", "") for url in PAGES],
+        }
+    }
+}
+
+
+def test_lists_of_objects_with_one_image_field_count():
+    assert best_image_list([EPISODE_RESPONSE]) == PAGES
+
+
+def test_thumbnail_and_cover_lists_are_skipped():
+    assert all(not images[0].startswith("https://cdn.daycomics.com/cover/") for images in image_lists(EPISODE_RESPONSE))
+
+
+def test_protocol_relative_urls_are_made_absolute():
+    assert best_image_list([EMBEDDED_STATE]) == PAGES
+
+
+def test_items_with_several_image_fields_are_ambiguous():
+    document = {"pages": [{"full": url, "preview": url.replace(".jpg", "_s.jpg")} for url in PAGES]}
+    assert best_image_list([document]) == []
+
+
+def test_short_lists_are_ignored():
+    assert best_image_list([{"images": PAGES[:1]}]) == []
+    assert best_image_list([{"images": PAGES[:1]}], min_count=1) == PAGES[:1]
+
+
+def test_longest_list_wins_across_documents():
+    # The heuristic alone would take the recommendation feed; matches_dom() is what rejects it.
+    assert best_image_list([EPISODE_RESPONSE, RECOMMENDATIONS_RESPONSE]) == [
+        item["url"] for item in RECOMMENDATIONS_RESPONSE["items"]
+    ]
+
+
+class FakePage:
+    def __init__(self, sources=None, embedded=()):
+        self.sources = sources
+        self.embedded = embedded
+
+    async def wait_for_selector(self, selector, state=None, timeout=None):
+        if self.sources is None:
+            raise TimeoutError(selector)
+
+    async def evaluate(self, script, *args):
+        if args:
+            return self.sources
+        return list(self.embedded)
+
+
+PLACEHOLDER = "data:image/gif;base64,R0lGODlhAQABAAAAACw="
+
+
+@pytest.mark.parametrize(
+    "sources, expected",
+    [
+        (PAGES, True),
+        ([PAGES[0]] + [PLACEHOLDER] * 4, True),
+        ([PLACEHOLDER] * 5, True),
+        (PAGES[:4], False),
+        ([f"https://img.other-cdn.com/{index}.jpg" for index in range(5)], False),
+        (None, False),
+    ],
+    ids=["same", "lazy", "placeholders-only", "count-differs", "host-differs", "no-viewer"],
+)
+def test_matches_dom(sources, expected):
+    assert asyncio.run(matches_dom(FakePage(sources), PAGES, "#viewer img", timeout=1)) is expected
+
+
+def test_wait_for_image_list_prefers_embedded_state():
+    page = FakePage(embedded=[json.dumps(EMBEDDED_STATE)])
+    responses = JsonResponses()
+    responses.documents = [RECOMMENDATIONS_RESPONSE]
+    assert asyncio.run(wait_for_image_list(page, responses, timeout=0)) == PAGES
+
+
+def test_wait_for_image_list_reads_json_responses():
+    responses = JsonResponses()
+    responses.documents = [EPISODE_RESPONSE]
+    assert asyncio.run(wait_for_image_list(FakePage(), responses, timeout=0, poll=0)) == PAGES
+
+
+def test_wait_for_image_list_gives_up_after_timeout():
+    assert asyncio.run(wait_for_image_list(FakePage(), JsonResponses(), timeout=0.05, poll=0.01)) == []
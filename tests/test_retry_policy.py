@@ -0,0 +1,107 @@
+import random
+from datetime import datetime, timezone
+from email.utils import format_datetime
+
+import pytest
+
+import retry_policy
+from retry_policy import RetryPolicy, parse_retry_after, retry_after
+from streaming_download import HttpStatusError
+
+
+NOW = 1_700_000_000.0
+
+
+@pytest.fixture
+def frozen_time(monkeypatch):
+    monkeypatch.setattr(retry_policy.time, "time", lambda: NOW)
+
+
+def http_date(timestamp):
+    return format_datetime(datetime.fromtimestamp(timestamp, timezone.utc), usegmt=True)
+
+
+@pytest.mark.parametrize("attempt", [1, 2, 3, 4, 5, 6])
+def test_backoff_stays_within_full_jitter_bounds(attempt):
+    random.seed(attempt)
+    policy = RetryPolicy(base_delay=0.5, max_delay=4)
+    ceiling = min(4, 0.5 * 2 ** (attempt - 1))
+    delays = [policy.backoff(attempt) for _ in range(500)]
+    assert all(0 <= delay <= ceiling for delay in delays)
+    # Full jitter spreads over the whole range instead of clustering at the ceiling.
+    assert min(delays) < ceiling * 0.1
+    assert max(delays) > ceiling * 0.9
+
+
+def test_retry_after_seconds():
+    assert parse_retry_after("30") == 30.0
+    assert parse_retry_after(" 7 ") == 7.0
+
+
+def test_retry_after_http_date(frozen_time):
+    assert parse_retry_after(http_date(NOW + 90)) == pytest.approx(90)
+    # A date in the past means "now", not a negative wait.
+    assert parse_retry_after(http_date(NOW - 90)) == 0.0
+
+
+@pytest.mark.parametrize("value", [None, "", "soon", "-5"])
+def test_retry_after_unparseable(value):
+    assert parse_retry_after(value) is None
+
+
+@pytest.mark.parametrize("status", [429, 503])
+def test_retry_after_is_honoured_for_429_and_503(status, frozen_time):
+    policy = RetryPolicy(base_delay=0.01, max_retry_after=120)
+    assert policy.retry_delay(1, HttpStatusError(status, {"Retry-After": "45"})) == 45
+    assert policy.retry_delay(1, HttpStatusError(status, {"Retry-After": http_date(NOW + 20)})) == pytest.approx(20)
+    # A server asking for an hour is held to max_retry_after.
+    assert policy.retry_delay(1, HttpStatusError(status, {"Retry-After": "3600"})) == 120
+
+
+def test_retry_after_is_ignored_for_other_statuses():
+    assert retry_after(HttpStatusError(500, {"Retry-After": "45"})) is None
+
+
+@pytest.mark.parametrize("status", [400, 403, 404, 410])
+def test_permanent_errors_are_not_retried(status):
+    policy = RetryPolicy()
+    assert policy.retry_delay(1, HttpStatusError(status)) is None
+    assert policy.given_up == 1
+    assert policy.retried == 0
+
+
+def test_gives_up_after_the_last_attempt():
+    policy = RetryPolicy(attempts=3, base_delay=0)
+    error = HttpStatusError(502)
+    assert policy.retry_delay(1, error) is not None
+    assert policy.retry_delay(2, error) is not None
+    assert policy.retry_delay(3, error) is None
+
+
+def test_stops_retrying_once_the_budget_is_spent():
+    policy = RetryPolicy(base_delay=0, budget_ratio=0.5, budget_minimum=2)
+    for _ in range(4):
+        policy.started(1)
+    # Budget: 2 + 0.5 * 4 requests = 4 retries for the whole run.
+    delays = [policy.retry_delay(1, ConnectionError()) for _ in range(6)]
+    assert delays[:4] == [0, 0, 0, 0]
+    assert delays[4:] == [None, None]
+    assert policy.retried == 4
+    assert policy.over_budget == 2
+    # New requests earn more budget.
+    policy.started(1)
+    policy.started(1)
+    assert policy.retry_delay(1, ConnectionError()) is not None
+
+
+def test_counters():
+    policy = RetryPolicy(attempts=2, base_delay=0)
+    policy.started(1)
+    assert policy.retry_delay(1, ConnectionError()) is not None
+    policy.started(2)
+    policy.success()
+    policy.started(1)
+    assert policy.retry_delay(1, HttpStatusError(404)) is None
+
+    assert (policy.requests, policy.attempted, policy.succeeded) == (2, 3, 1)
+    assert (policy.retried, policy.given_up, policy.over_budget) == (1, 1, 0)
@@ -0,0 +1,93 @@
+import json
+
+from run_journal import RunJournal
+
+
+COMIC = "https://example.com/comic/1"
+OTHER_COMIC = "https://example.com/comic/2"
+
+
+def write_run(path):
+    journal = RunJournal(path)
+    journal.record_image(COMIC, "ep-1", 0, "001.jpg")
+    journal.record_image(COMIC, "ep-1", 1, "002.jpg")
+    journal.record_episode(COMIC, "ep-1", {"title": "episode 001", "images": ["001.jpg", "002.jpg"]})
+    journal.record_comic(COMIC, {"title": "Comic", "episodes": []})
+    journal.close()
+
+
+def test_resume_restores_recorded_work(tmp_path):
+    path = tmp_path / "journal.jsonl"
+    write_run(path)
+
+    journal = RunJournal(path)
+    assert journal.resumed
+    assert journal.comic(COMIC) == {"title": "Comic", "episodes": []}
+    assert journal.episode(COMIC, "ep-1")["images"] == ["001.jpg", "002.jpg"]
+    assert journal.comic(OTHER_COMIC) is None
+    journal.close()
+
+
+def test_recorded_image_counts_only_while_its_file_is_on_disk(tmp_path):
+    path = tmp_path / "journal.jsonl"
+    write_run(path)
+    (tmp_path / "001.jpg").write_bytes(b"image")
+    (tmp_path / "002.jpg").write_bytes(b"")
+
+    episode = RunJournal(path).for_episode(COMIC, "ep-1")
+    assert episode.image_done(0, tmp_path / "001.jpg") == "001.jpg"
+    assert episode.image_done(1, tmp_path / "002.jpg") is None
+    assert episode.image_done(2, tmp_path / "003.jpg") is None
+    episode.journal.close()
+
+
+def test_fresh_discards_the_previous_run(tmp_path):
+    path = tmp_path / "journal.jsonl"
+    write_run(path)
+
+    journal = RunJournal(path, fresh=True)
+    assert not journal.resumed
+    assert journal.comic(COMIC) is None
+    journal.close()
+    assert path.read_text() == ""
+
+
+def test_truncated_last_line_is_skipped_and_terminated(tmp_path):
+    path = tmp_path / "journal.jsonl"
+    write_run(path)
+    with open(path, "a", encoding="utf-8") as journal_file:
+        journal_file.write('{"type": "comic", "comic": "https://example.com/comic/2", "rec')
+
+    journal = RunJournal(path)
+    assert journal.comic(COMIC) is not None
+    assert journal.comic(OTHER_COMIC) is None
+    journal.record_comic(OTHER_COMIC, {"title": "Other"})
+    journal.close()
+
+    # The cut line was terminated, so the entry after it is readable on the next resume.
+    assert RunJournal(path).comic(OTHER_COMIC) == {"title": "Other"}
+    lines = path.read_text(encoding="utf-8").splitlines()
+    assert json.loads(lines[-1])["comic"] == OTHER_COMIC
+
+
+def test_all_recorded(tmp_path):
+    journal = RunJournal(tmp_path / "journal.jsonl")
+    journal.record_comic(COMIC, {"title": "Comic"})
+    assert journal.all_recorded([COMIC])
+    assert not journal.all_recorded([COMIC, OTHER_COMIC])
+    assert journal.all_recorded([])
+    journal.close()
+
+
+def test_finish_removes_the_journal_only_after_a_complete_run(tmp_path):
+    path = tmp_path / "journal.jsonl"
+    journal = RunJournal(path)
+    journal.record_comic(COMIC, {"title": "Comic"})
+
+    assert not journal.finish_if_complete([COMIC, OTHER_COMIC])
+    assert path.exists()
+    assert not journal.finish_if_complete([COMIC], failed=True)
+    assert path.exists()
+
+    assert journal.finish_if_complete([COMIC])
+    assert not path.exists()
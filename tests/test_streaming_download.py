@@ -0,0 +1,150 @@
+import asyncio
+
+import aiohttp
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+import mangapark_parser as mangapark
+from retry_policy import RetryPolicy
+from streaming_download import (
+    IncompleteDownloadError,
+    partial_path,
+    resume_headers,
+    stream_to_file,
+    validator_path,
+)
+
+
+BODY = bytes(range(256)) * 64
+ETAG = '"v1"'
+
+
+class ImageServer:
+    """Serves BODY with a strong ETag, honouring Range/If-Range; records the headers of every request."""
+
+    def __init__(self, body=BODY, etag=ETAG, cut_after=None, reject_ranges=False):
+        self.body = body
+        self.etag = etag
+        self.cut_after = cut_after
+        self.reject_ranges = reject_ranges
+        self.requests = []
+
+    async def handle(self, request):
+        self.requests.append(dict(request.headers))
+        range_header = request.headers.get("Range")
+        if range_header and self.reject_ranges:
+            return web.Response(status=416)
+        if range_header and request.headers.get("If-Range", self.etag) == self.etag:
+            start = int(range_header[len("bytes="):].rstrip("-"))
+            return web.Response(
+                status=206,
+                body=self.body[start:],
+                headers={"ETag": self.etag, "Content-Range": f"bytes {start}-{len(self.body) - 1}/{len(self.body)}"},
+            )
+        if self.cut_after is not None:
+            # Announce the whole body, send part of it and drop the connection.
+            response = web.StreamResponse(headers={"ETag": self.etag})
+            response.content_length = len(self.body)
+            await response.prepare(request)
+            await response.write(self.body[:self.cut_after])
+            await asyncio.sleep(0.05)
+            request.transport.close()
+            self.cut_after = None
+            return response
+        return web.Response(body=self.body, headers={"ETag": self.etag})
+
+
+def run_with_server(server, scenario):
+    async def main():
+        app = web.Application()
+        app.router.add_get("/image.webp", server.handle)
+        async with TestServer(app) as test_server, aiohttp.ClientSession() as session:
+            return await scenario(session, str(test_server.make_url("/image.webp")))
+
+    return asyncio.run(main())
+
+
+async def fetch(session, url, destination):
+    async with session.get(url, headers=resume_headers(destination)) as response:
+        return await stream_to_file(response, destination, resume=True)
+
+
+def test_download_is_renamed_into_place(tmp_path):
+    destination = tmp_path / "image.webp"
+    server = ImageServer()
+
+    written = run_with_server(server, lambda session, url: fetch(session, url, destination))
+
+    assert written == len(BODY)
+    assert destination.read_bytes() == BODY
+    assert not partial_path(destination).exists()
+    assert not validator_path(destination).exists()
+    assert server.requests[0]["Accept-Encoding"] == "identity"
+    assert "Range" not in server.requests[0]
+
+
+def test_interrupted_transfer_resumes_from_part_file(tmp_path):
+    destination = tmp_path / "image.webp"
+    server = ImageServer(cut_after=len(BODY) // 4)
+
+    async def scenario(session, url):
+        with pytest.raises(aiohttp.ClientPayloadError):
+            await fetch(session, url, destination)
+        # The final name is never written by a failed transfer.
+        assert not destination.exists()
+        assert partial_path(destination).exists()
+        assert validator_path(destination).read_text() == ETAG
+        return await fetch(session, url, destination)
+
+    written = run_with_server(server, scenario)
+
+    resumed_from = len(BODY) - written
+    assert resumed_from > 0
+    assert server.requests[1]["Range"] == f"bytes={resumed_from}-"
+    assert server.requests[1]["If-Range"] == ETAG
+    assert server.requests[1]["Accept-Encoding"] == "identity"
+    assert destination.read_bytes() == BODY
+    assert not partial_path(destination).exists()
+
+
+def test_changed_image_is_downloaded_whole(tmp_path):
+    destination = tmp_path / "image.webp"
+    partial_path(destination).write_bytes(b"stale bytes of the old image")
+    validator_path(destination).write_text('"v0"')
+    server = ImageServer()
+
+    run_with_server(server, lambda session, url: fetch(session, url, destination))
+
+    assert server.requests[0]["If-Range"] == '"v0"'
+    assert destination.read_bytes() == BODY
+
+
+def test_unrequested_range_discards_part_file(tmp_path):
+    destination = tmp_path / "image.webp"
+    partial_path(destination).write_bytes(b"x" * 10)
+
+    async def scenario(session, url):
+        headers = {"Range": "bytes=20-"}
+        async with session.get(url, headers=headers) as response:
+            await stream_to_file(response, destination, resume=True)
+
+    server = ImageServer()
+    with pytest.raises(IncompleteDownloadError):
+        run_with_server(server, scenario)
+    assert not partial_path(destination).exists()
+    assert not destination.exists()
+
+
+def test_rejected_range_restarts_from_zero(tmp_path, monkeypatch):
+    monkeypatch.setattr(mangapark, "RETRY_POLICY", RetryPolicy(base_delay=0, max_delay=0))
+    destination = tmp_path / "image.webp"
+    partial_path(destination).write_bytes(b"x" * 10)
+    server = ImageServer(reject_ranges=True)
+
+    result = run_with_server(server, lambda session, url: mangapark.download_file(session, url, destination))
+
+    assert result == destination
+    assert destination.read_bytes() == BODY
+    assert [request.get("Range") for request in server.requests] == ["bytes=10-", None]
+    assert not partial_path(destination).exists()
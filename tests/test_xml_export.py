@@ -0,0 +1,92 @@
+import pytest
+
+from xml_export import XmlItemWriter, legacy_xml, write_xml
+
+
+RECORDS = [
+    {
+        "title": "Solo Leveling",
+        "description": "Line one\r\nline \"two\" & <three>\ttab\rend",
+        "thumbnail": "thumbnail.jpg",
+        "genres": ["Action", "Fantasy"],
+        "tags": [],
+        "rating": 4.5,
+        "views": 1200,
+        "completed": False,
+        "author": None,
+        "meta": {},
+        "episodes": [
+            {"title": "episode 001", "images": ["episode_001_001.jpg", "episode_001_002.jpg"], "date": ""},
+            {"title": "episode 002", "images": []},
+        ],
+        "nested": [[1, True, None], ["a", {"k": "v"}]],
+    },
+    {
+        "title": "Пригоди в Києві — том 2",
+        "description": "Історія про «кохання» 🌸 та 日本語",
+        "genres": ["Романтика"],
+        "episodes": [],
+    },
+    {
+        # Keys dicttoxml cannot use as tag names end up in a name="" attribute.
+        "1st place": "gold",
+        "key with \"quotes\" & 'apostrophes'": "x",
+        "назва": "значення",
+    },
+]
+
+# Exactly what the dicttoxml + minidom export wrote; pinned so a change on either side shows up.
+GOLDEN = """<?xml version="1.0" ?>
+<item>
+  <item>
+    <title>Пригоди в Києві — том 2</title>
+    <description>Історія про «кохання» 🌸 та 日本語</description>
+    <genres>
+      <item>Романтика</item>
+    </genres>
+    <episodes/>
+  </item>
+</item>
+"""
+
+
+@pytest.mark.parametrize(
+    "records",
+    [RECORDS, RECORDS[:1], RECORDS[1:2], RECORDS[2:], []],
+    ids=["all", "ascii", "non-ascii", "invalid-names", "empty"],
+)
+def test_matches_dicttoxml_and_minidom(tmp_path, records):
+    count = write_xml(iter(records), tmp_path / "comics.xml")
+
+    assert count == len(records)
+    assert (tmp_path / "comics.xml").read_bytes() == legacy_xml(records).encode("utf-8")
+
+
+def test_matches_golden_output(tmp_path):
+    write_xml(RECORDS[1:2], tmp_path / "comics.xml")
+    assert (tmp_path / "comics.xml").read_text(encoding="utf-8") == GOLDEN
+    assert legacy_xml(RECORDS[1:2]) == GOLDEN
+
+
+def test_empty_export_is_a_self_closing_root(tmp_path):
+    write_xml([], tmp_path / "comics.xml")
+    assert (tmp_path / "comics.xml").read_text(encoding="utf-8") == '<?xml version="1.0" ?>\n<item/>\n'
+
+
+def test_file_appears_only_when_closed(tmp_path):
+    path = tmp_path / "comics.xml"
+    writer = XmlItemWriter(path)
+    writer.write(RECORDS[0])
+    assert not path.exists()
+    writer.close()
+    assert path.exists()
+    assert not writer.temp_path.exists()
+
+
+def test_failed_export_leaves_no_file(tmp_path):
+    path = tmp_path / "comics.xml"
+    with pytest.raises(TypeError):
+        with XmlItemWriter(path) as writer:
+            writer.write({"bad": object()})
+    assert not path.exists()
+    assert not writer.temp_path.exists()
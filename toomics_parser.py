@@ -3,53 +3,119 @@ import time
 import json
 import asyncio
 import aiohttp
-import aiofiles
 from dotenv import load_dotenv
 from pathlib import Path
-from typing import List, Dict, Any, Optional, Callable
+from typing import List, Dict, Any, Optional, Callable, Tuple, Awaitable
 import xml.etree.ElementTree as ET
-from xml.dom import minidom
 import re
+from contextlib import nullcontext
+from functools import partial
+from http.cookies import SimpleCookie
+from urllib.parse import urljoin
 
 import colorama
+from bs4 import BeautifulSoup
 from colorama import Fore, Style
-from dicttoxml import dicttoxml
-from playwright.async_api import async_playwright, Browser, Page
+from playwright.async_api import async_playwright, Browser, BrowserContext, Page
+from yarl import URL
+
+from adaptive_limiter import AdaptiveLimiter
+from browser_resources import ResourceBlocker, ResponseCapture
+from circuit_breaker import CircuitOpenError, DeferredDownloads, HostCircuitBreaker
+from download_scheduler import DownloadScheduler, EpisodeDownloads
+from episode_pipeline import PipelineStats, run_pipeline
+from image_store import ContentStore
+from jsonl_export import JsonLinesWriter, compact, convert_legacy
+from page_pool import PagePool
+from page_waits import PageWaits
+from rate_limiter import HostRateLimiter
+from retry_policy import RetryPolicy
+from run_journal import EpisodeJournal, RunJournal
+from session_cache import SessionCache
+from streaming_download import HttpStatusError, stream_to_file
+from xml_export import XmlItemWriter
 
 # Initialize colorama
 colorama.init(autoreset=True)
 
 load_dotenv()
 
+RATE_LIMITER = HostRateLimiter(rate=10.0, burst=20)
+RETRY_POLICY = RetryPolicy()
+CIRCUIT_BREAKER = HostCircuitBreaker()
+# Set from --image-store, --block-resources and --capture-images
+IMAGE_STORE: Optional[ContentStore] = None
+RESOURCE_BLOCKER: Optional[ResourceBlocker] = None
+IMAGE_CAPTURE: Optional[ResponseCapture] = None
+# Seconds each kind of wait may take before the scraper moves on
+PAGE_WAITS = PageWaits({'login': 20, 'login_popups': 5, 'age_verification': 5, 'comic_page': 10})
+# Episode HTML over aiohttp with the browser's cookies (--browser-episodes turns it off)
+HTTP_EPISODES = True
+PAGE_POOL_SIZE = 3  # --pages
+HTTP_EPISODE_CONCURRENCY = 8  # --episode-requests
+SESSION_CACHE = SessionCache('toomics')
+# The login modal is in the server HTML, so the raw page tells a logged-out session apart
+SESSION_PROBE_URL = 'https://toomics.com/en'
+LOGGED_OUT_MARKER = 'modal-login-header'
+JOURNAL_PATH = 'toomics_journal.jsonl'
+# toomics.json is compacted from this at the end of a run
+RESULTS_PATH = 'toomics.jsonl'
+
 
 async def delay(ms: int):
     """Delay execution for the given number of milliseconds."""
     await asyncio.sleep(ms / 1000)
 
 
-async def download_image(url: str, filepath: str, session: aiohttp.ClientSession, retries: int = 5) -> str:
-    """Download an image from the given URL and save it to the specified filepath."""
-    for attempt in range(1, retries + 1):
+async def download_image(url: str, filepath: str, session: aiohttp.ClientSession,
+                         limiter: Optional[AdaptiveLimiter] = None) -> str:
+    """Download an image from the given URL and save it to the specified filepath.
+
+    Failed attempts are retried as RETRY_POLICY decides; the last error is raised.
+    """
+    attempt = 0
+    while True:
+        attempt += 1
+        # Fails fast with CircuitOpenError while the host is down
+        CIRCUIT_BREAKER.before(url)
+        RETRY_POLICY.started(attempt)
         try:
-            async with session.get(
-                    url,
-                    headers={"referer": "https://toomics.com"},
-                    timeout=aiohttp.ClientTimeout(total=30)
-            ) as response:
-                if response.status != 200:
-                    raise Exception(f"HTTP error {response.status}")
+            await RATE_LIMITER.wait_async(url)
+            async with limiter.slot() if limiter else nullcontext():
+                async with session.get(
+                        url,
+                        headers={"referer": "https://toomics.com"},
+                        timeout=aiohttp.ClientTimeout(total=30)
+                ) as response:
+                    if response.status != 200:
+                        raise HttpStatusError(response.status, response.headers)
+
+                    written = await stream_to_file(response, filepath, store=IMAGE_STORE)
+
+            if RESOURCE_BLOCKER:
+                RESOURCE_BLOCKER.credit(url, written)
+
+            CIRCUIT_BREAKER.success(url)
+            RETRY_POLICY.success()
+            return filepath
+        except Exception as e:
+            CIRCUIT_BREAKER.failure(url, e)
+            wait = RETRY_POLICY.retry_delay(attempt, e)
+            if wait is None:
+                print(f"{Fore.RED}{Style.BRIGHT}Failed to download after {attempt} attempts: {url}")
+                raise
+            print(f"{Fore.YELLOW}{Style.BRIGHT}Retrying download ({attempt}/{RETRY_POLICY.attempts}) in {wait:.1f}s...")
+            await asyncio.sleep(wait)
 
-                async with aiofiles.open(filepath, 'wb') as f:
-                    await f.write(await response.read())
 
-                return filepath
-        except Exception as e:
-            if attempt == retries:
-                raise Exception(f"Failed to download after {retries} attempts: {str(e)}")
-            print(f"{Fore.YELLOW}{Style.BRIGHT}Retrying download ({attempt}/{retries})...")
-            await asyncio.sleep(attempt)  # Exponential backoff
-            return None
-    return None
+async def download_thumbnail(url: str, filepath: str, session: aiohttp.ClientSession) -> bool:
+    """download_image() for covers and thumbnails: a failure is logged and the comic goes on without the file."""
+    try:
+        await download_image(url, filepath, session)
+        return True
+    except Exception as e:
+        print(f"{Fore.YELLOW}{Style.BRIGHT}Failed to download thumbnail {url}: {str(e)}")
+        return False
 
 
 async def login_to_toomics(page: Page) -> None:
@@ -58,7 +124,7 @@ async def login_to_toomics(page: Page) -> None:
 
     # Execute popup login
     await page.evaluate("Base.popup('modal-login-header', 'modal-login', '/en', 'N')")
-    await asyncio.sleep(1)
+    await PAGE_WAITS.selector(page, 'login', '#login_fieldset', state='attached')
 
     await page.evaluate("Base.changeSignInForm()")
 
@@ -68,25 +134,18 @@ async def login_to_toomics(page: Page) -> None:
     await page.fill('#user_pw', os.getenv('TOOMICS_PASSWORD'))
 
     # Handle popups if they exist
-    try:
-        popup = await page.wait_for_selector('#coin-discount-promo .close_popup', timeout=5000)
-        if popup:
-            await popup.click()
-            await asyncio.sleep(2)
-    except:
-        pass
-
-    try:
-        popup = await page.wait_for_selector('#first-pay-sale .close_popup', timeout=5000)
-        if popup:
-            await popup.click()
-            await asyncio.sleep(2)
-    except:
-        pass
-
-    # Submit login form
+    for popup in ('#coin-discount-promo', '#first-pay-sale'):
+        if await PAGE_WAITS.selector(page, 'login_popups', f'{popup} .close_popup'):
+            try:
+                await page.click(f'{popup} .close_popup')
+                await PAGE_WAITS.hidden(page, 'login_popups', popup)
+            except:
+                pass
+
+    # Submit login form, then wait for the form to go away and the logged-in page to settle
     await page.click('#login_fieldset button[type="submit"]')
-    await asyncio.sleep(10)
+    await PAGE_WAITS.hidden(page, 'login', '#login_fieldset')
+    await PAGE_WAITS.network_idle(page, 'login')
 
 
 def progress_bar(current: int, total: int) -> str:
@@ -112,69 +171,212 @@ Episode Images: {progress_bar(current_img, total_img) if current_img > 0 else 'W
 """)
 
 
-async def download_images_with_queue(
+def episode_image_jobs(
         images: List[str],
         episode_folder: str,
         episode_number: int,
         update_progress: Callable[[int], None],
         session: aiohttp.ClientSession,
-        concurrency: int = 20
-) -> List[str]:
-    """Download images concurrently with a queue system."""
-    results = [None] * len(images)
-    failed_attempts = {}
-    sem = asyncio.Semaphore(concurrency)
+        limiter: Optional[AdaptiveLimiter] = None,
+        journal: Optional[EpisodeJournal] = None,
+        capture: Optional[ResponseCapture] = None,
+        deferred: Optional[DeferredDownloads] = None
+) -> List[Callable[[], Awaitable[Optional[str]]]]:
+    """One job per image; each returns the saved filename, or None when the image failed.
+
+    With ``deferred``, an image whose host circuit is open keeps its filename and is queued there,
+    tagged with the episode and comic folders, to be downloaded again at the end of the run.
+    """
+    completed = 0
+
+    async def download_deferred(index: int, image_filename: str) -> str:
+        await download_image(images[index], image_filename, session, limiter=limiter)
+        result = os.path.basename(image_filename)
+        if journal:
+            journal.record_image(index, result)
+        return result
 
-    async def process_image(index: int):
-        max_retries = 3
+    async def process_image(index: int) -> Optional[str]:
         nonlocal completed
 
-        async with sem:
-            image = images[index]
-            attempts = 0
+        image = images[index]
+        try:
+            image_extension = image.split('.')[-1]
+            if 'com' in image_extension:
+                image_extension = 'jpg'
+
+            image_filename = f"{episode_folder}/episode_{episode_number:03d}_{index + 1:03d}.{image_extension}"
+
+            # Already downloaded by an interrupted earlier run
+            done = journal.image_done(index, image_filename) if journal else None
+            if done:
+                return done
 
-            while attempts < max_retries:
+            result = f"episode_{episode_number:03d}_{index + 1:03d}.{image_extension}"
+            # Saved from the browser's response when captured, otherwise downloaded (retried by RETRY_POLICY)
+            if not (capture and await capture.save(image, image_filename)):
                 try:
-                    image_extension = image.split('.')[-1]
-                    if 'com' in image_extension:
-                        image_extension = 'jpg'
-
-                    image_filename = f"{episode_folder}/episode_{episode_number:03d}_{index + 1:03d}.{image_extension}"
-
-                    await download_image(image, image_filename, session)
-                    results[index] = f"episode_{episode_number:03d}_{index + 1:03d}.{image_extension}"
-
-                    completed += 1
-                    update_progress(completed)
-                    return
-                except Exception as e:
-                    attempts += 1
-                    failed_attempts[index] = attempts
-
-                    if attempts < max_retries:
-                        print(
-                            f"{Fore.YELLOW}{Style.BRIGHT}Retrying image {index + 1} (attempt {attempts}/{max_retries})...")
-                        await asyncio.sleep(attempts * 2)  # Exponential backoff
-                    else:
-                        print(
-                            f"{Fore.RED}{Style.BRIGHT}Failed to download image {index + 1} after {max_retries} queue attempts: {str(e)}")
-                        completed += 1
-                        update_progress(completed)
-                        return
+                    await download_image(image, image_filename, session, limiter=limiter)
+                except CircuitOpenError:
+                    if deferred is None:
+                        raise
+                    deferred.defer(image, partial(download_deferred, index, image_filename),
+                                   episode_folder, os.path.dirname(episode_folder))
+                    return result
+            if journal:
+                journal.record_image(index, result)
+            return result
+        except Exception as e:
+            print(f"{Fore.RED}{Style.BRIGHT}Failed to download image {index + 1}: {str(e)}")
+            return None
+        finally:
+            completed += 1
+            update_progress(completed)
 
-    completed = 0
-    tasks = [process_image(i) for i in range(len(images))]
-    await asyncio.gather(*tasks)
+    return [partial(process_image, index) for index in range(len(images))]
+
+
+async def download_images_with_queue(
+        images: List[str],
+        episode_folder: str,
+        episode_number: int,
+        update_progress: Callable[[int], None],
+        session: aiohttp.ClientSession,
+        concurrency: int = 20,
+        limiter: Optional[AdaptiveLimiter] = None,
+        journal: Optional[EpisodeJournal] = None,
+        capture: Optional[ResponseCapture] = None,
+        scheduler: Optional[DownloadScheduler] = None
+) -> List[str]:
+    """Download images concurrently, through the run's scheduler when there is one."""
+    if limiter is None:
+        limiter = AdaptiveLimiter(initial=concurrency)
+    jobs = episode_image_jobs(images, episode_folder, episode_number, update_progress, session,
+                              limiter=limiter, journal=journal, capture=capture)
+    if scheduler:
+        results = await scheduler.run(jobs)
+    else:
+        results = await asyncio.gather(*(job() for job in jobs))
 
     return [r for r in results if r]
 
 
-async def parse_toomics(urls: List[str], progress_callback=None):
+async def open_episode(page: Page, url: str, capture: Optional[ResponseCapture] = None) -> Optional[List[str]]:
+    """Navigate a page to an episode and return its image URLs, or None behind the register wall."""
+    if capture:
+        capture.start()
+    await RATE_LIMITER.wait_async(url)
+    await page.goto(url, wait_until='load')
+
+    # Check if URL contains popup_type/register
+    if 'popup_type/register' in page.url:
+        return None
+
+    # Check if age verification is needed
+    if 'age_verification' in page.url:
+        await page.wait_for_selector('.section_age_verif .button_yes')
+        await page.click('.section_age_verif .button_yes')
+        # The confirmation is stored by a request of its own; the episode is reloaded once it settles
+        await PAGE_WAITS.network_idle(page, 'age_verification')
+        await RATE_LIMITER.wait_async(url)
+        await page.goto(url, wait_until='load')
+
+    if capture:
+        # Let the lazy loader request every strip so the browser receives it
+        await capture.scroll_through(page)
+
+    return await page.eval_on_selector_all('#viewer-img div img',
+                                           'els => els.map(el => el.src.includes("base64") ? el.getAttribute("data-original") : el.src)')
+
+
+def extract_episode_images(html: str, page_url: str) -> List[str]:
+    """The image URLs of an episode page, read the same way as in the browser."""
+    soup = BeautifulSoup(html, 'html.parser')
+    images = []
+    for img in soup.select('#viewer-img div img'):
+        src = img.get('src') or ''
+        image = img.get('data-original') if not src or 'base64' in src else src
+        if image:
+            images.append(urljoin(page_url, image))
+    return images
+
+
+class HttpEpisodeFetcher:
+    """Reads episode pages with aiohttp and the logged-in browser context's cookies.
+
+    Episode pages are plain HTML once the session cookies are sent, so they
+    are fetched without rendering. fetch() returns None behind the register
+    wall like open_episode() and raises when the page needs the browser (age
+    verification, an unexpected page); the caller then opens it in the pool.
+    """
+
+    def __init__(self, session: aiohttp.ClientSession, user_agent: str):
+        self.session = session
+        self.user_agent = user_agent
+        self.fetched = 0
+        self.fallbacks = 0
+
+    async def sync_cookies(self, context: BrowserContext) -> None:
+        for cookie in await context.cookies():
+            jar_cookie = SimpleCookie()
+            jar_cookie[cookie['name']] = cookie['value']
+            jar_cookie[cookie['name']]['path'] = cookie.get('path', '/')
+            domain = cookie['domain']
+            # Playwright marks domain cookies with a leading dot; the rest are host-only
+            if domain.startswith('.'):
+                jar_cookie[cookie['name']]['domain'] = domain
+            self.session.cookie_jar.update_cookies(jar_cookie, URL(f"https://{domain.lstrip('.')}/"))
+
+    async def fetch(self, url: str) -> Optional[List[str]]:
+        try:
+            await RATE_LIMITER.wait_async(url)
+            async with self.session.get(
+                    url,
+                    headers={'user-agent': self.user_agent, 'referer': 'https://toomics.com/en'},
+                    timeout=aiohttp.ClientTimeout(total=30)
+            ) as response:
+                final_url = str(response.url)
+                if 'popup_type/register' in final_url:
+                    self.fetched += 1
+                    return None
+                if 'age_verification' in final_url:
+                    raise Exception('age verification required')
+                if response.status != 200:
+                    raise HttpStatusError(response.status, response.headers)
+                html = await response.text()
+
+            images = extract_episode_images(html, final_url)
+            if not images:
+                raise Exception('no images in the episode HTML')
+            self.fetched += 1
+            return images
+        except Exception:
+            self.fallbacks += 1
+            raise
+
+    def report(self) -> str:
+        return f"{self.fetched} fetched over HTTP, {self.fallbacks} opened in the browser instead"
+
+
+async def parse_toomics(urls: List[str], progress_callback=None, journal: Optional[RunJournal] = None,
+                        pages: int = PAGE_POOL_SIZE, episode_requests: int = HTTP_EPISODE_CONCURRENCY):
     """Main function to parse and download honeytoon from Toomics."""
-    comics = []
+    # This run's comics go straight to toomics.xml instead of piling up in a list
+    comics_xml = XmlItemWriter('toomics.xml')
     failed_comics = []
+    fatal_error = False
     total_comics = len(urls)
     current_comic = 0
+    # One limiter for the whole run so what it learns carries over between episodes
+    image_limiter = AdaptiveLimiter(initial=20)
+    page_pool: Optional[PagePool] = None
+    episode_fetcher: Optional[HttpEpisodeFetcher] = None
+    pipeline_stats = PipelineStats()
+    # Every episode's images go through these workers; the limiter decides how many transfer at once
+    scheduler = DownloadScheduler(transfers=image_limiter.maximum)
+    # Images from hosts whose circuit opened, downloaded again once the comics have been walked
+    deferred = DeferredDownloads(CIRCUIT_BREAKER)
+    page_captures: Dict[Page, ResponseCapture] = {}
 
     async with async_playwright() as p:
         browser = await p.chromium.launch(
@@ -190,7 +392,10 @@ async def parse_toomics(urls: List[str], progress_callback=None):
         print(f"{Fore.GREEN}{Style.BRIGHT}Browser launched successfully")
 
         try:
-            context = await browser.new_context(viewport={'width': 1920, 'height': 1080})
+            saved_state = SESSION_CACHE.state()
+            context = await browser.new_context(viewport={'width': 1920, 'height': 1080}, storage_state=saved_state)
+            if RESOURCE_BLOCKER:
+                await RESOURCE_BLOCKER.install(context)
             page = await context.new_page()
 
             # Set timeouts
@@ -199,29 +404,79 @@ async def parse_toomics(urls: List[str], progress_callback=None):
             page.set_default_navigation_timeout(120000)
 
             # Login once before processing honeytoon
-            print(f"{Fore.GREEN}{Style.BRIGHT}Attempting to login to Toomics")
-            await login_to_toomics(page)
+            if saved_state and await SESSION_CACHE.probe(context, SESSION_PROBE_URL, LOGGED_OUT_MARKER):
+                print(f"{Fore.GREEN}{Style.BRIGHT}Reusing saved Toomics session from {SESSION_CACHE.path}")
+            else:
+                print(f"{Fore.GREEN}{Style.BRIGHT}Attempting to login to Toomics")
+                await login_to_toomics(page)
+                await SESSION_CACHE.save(context)
             print(f"{Fore.GREEN}{Style.BRIGHT}Login completed")
 
-            # Load existing honeytoon from JSON file
-            existing_comics = []
-            if os.path.exists('toomics.json'):
+            # Episode pages share the logged-in context; each one gets its own response capture
+            async def setup_page(pool_page: Page) -> None:
+                pool_page.set_default_timeout(120000)
+                pool_page.set_default_navigation_timeout(120000)
+                if IMAGE_CAPTURE:
+                    page_captures[pool_page] = IMAGE_CAPTURE.for_page(pool_page)
+
+            page_pool = PagePool(context, pages, setup=setup_page)
+            await page_pool.open()
+            print(f"{Fore.GREEN}{Style.BRIGHT}Opened {page_pool.size} episode pages")
+
+            # Carry comics from an older toomics.json over into the append-only results file once
+            if os.path.exists('toomics.json') and not os.path.exists(RESULTS_PATH):
                 try:
-                    with open('toomics.json', 'r', encoding='utf-8') as f:
-                        existing_comics = json.load(f)
+                    convert_legacy('toomics.json', RESULTS_PATH)
                 except:
                     print(f"{Fore.RED}{Style.BRIGHT}Existing honeytoon file is not a JSON")
-                    existing_comics = []
 
-            async with aiohttp.ClientSession() as session:
+            async with aiohttp.ClientSession() as session, JsonLinesWriter(RESULTS_PATH, fresh=False) as results, \
+                    scheduler:
+                # Response capture needs the browser to load every episode itself
+                if HTTP_EPISODES and not IMAGE_CAPTURE:
+                    episode_fetcher = HttpEpisodeFetcher(session, await page.evaluate('navigator.userAgent'))
+                    await episode_fetcher.sync_cookies(context)
+
+                def save_comic(comic_url: str, comic_data: Dict[str, Any], complete: bool) -> None:
+                    comics_xml.write(comic_data)
+
+                    # Append just this comic; the cost no longer grows with the catalog
+                    results.write(comic_data)
+
+                    # Episodes that failed are retried on resume; the finished ones stay skipped
+                    if journal and complete:
+                        journal.record_comic(comic_url, comic_data)
+
+                def save_deferred_comic(comic_url: str, comic_data: Dict[str, Any], episode_keys: List[str],
+                                        outcomes: List[bool], deferred_episodes: Dict[int, int]) -> None:
+                    """Finish a comic held back for deferred images, once the drain is over."""
+                    for index, expected in deferred_episodes.items():
+                        episode = comic_data['episodes'][index]
+                        episode_folder = f"./toomics/{comic_data['title']}/{index + 1:03d}"
+                        # Images whose host never came back are dropped from the episode
+                        episode['images'] = [name for name in episode['images']
+                                             if os.path.exists(f"{episode_folder}/{name}")]
+                        outcomes[index] = len(episode['images']) == expected
+                        if outcomes[index] and journal:
+                            journal.record_episode(comic_url, episode_keys[index], episode)
+                    save_comic(comic_url, comic_data, all(outcomes))
+
                 for url in urls:
                     current_comic += 1
                     comic_progress = {'current': current_comic, 'total': total_comics}
                     update_console_output(comic_progress, "Loading...", 0, 0, 0)
 
+                    # Finished in an interrupted earlier run; toomics.jsonl already has it
+                    finished = journal.comic(url) if journal else None
+                    if finished:
+                        comics_xml.write(finished)
+                        print(f"{Fore.GREEN}{Style.BRIGHT}Skipping already parsed comic: {finished['title']}")
+                        continue
+
                     try:
+                        await RATE_LIMITER.wait_async(url)
                         await page.goto(url, wait_until='load')
-                        await asyncio.sleep(1)
+                        await PAGE_WAITS.selector(page, 'comic_page', '#glo_contents > section h2')
 
                         # Get comic details
                         title = await page.eval_on_selector('#glo_contents > section h2', 'el => el.innerText')
@@ -250,14 +505,12 @@ async def parse_toomics(urls: List[str], progress_callback=None):
 
                         thumbnail_extension = thumbnail.split('.')[-1]
                         thumbnail_filename = f"thumbnail.{thumbnail_extension}"
-                        await download_image(thumbnail, f"{comic_folder}/{thumbnail_filename}", session)
+                        await download_thumbnail(thumbnail, f"{comic_folder}/{thumbnail_filename}", session)
 
                         thumbnail_background_extension = thumbnail_background.split('.')[-1]
                         thumbnail_background_filename = f"thumbnail_background.{thumbnail_background_extension}"
-                        await download_image(thumbnail_background, f"{comic_folder}/{thumbnail_background_filename}",
-                                             session)
-
-                        await asyncio.sleep(1)
+                        await download_thumbnail(thumbnail_background, f"{comic_folder}/{thumbnail_background_filename}",
+                                                 session)
 
                         # Map episodes
                         episodes = await page.eval_on_selector_all('.list-ep li a', '''
@@ -301,86 +554,186 @@ async def parse_toomics(urls: List[str], progress_callback=None):
                         ''', clean_title)
 
                         total_episodes = len(episodes)
-                        current_episode = 0
-                        update_console_output(comic_progress, title, total_episodes, current_episode, total_episodes)
-
-                        # For each episode, navigate to its page and extract all images
-                        for episode in episodes:
-                            current_episode += 1
-                            update_console_output(comic_progress, title, total_episodes, current_episode,
+                        episodes_done = 0
+                        update_console_output(comic_progress, title, total_episodes, episodes_done, total_episodes)
+                        # Keyed before the episodes are renamed, the same as in earlier journals
+                        episode_keys = [episode.get('url') or episode['slag'] for episode in episodes]
+                        outcomes = [False] * total_episodes
+                        # Episodes with images on the deferred queue, and how many images each expects
+                        deferred_episodes: Dict[int, int] = {}
+
+                        # Episodes whose images are still queued on the scheduler, finalized by these tasks
+                        finalizers = []
+
+                        def image_jobs(index: int, images: List[str], capture: Optional[ResponseCapture]):
+                            def update_image_progress(completed):
+                                update_console_output(comic_progress, title, total_episodes, episodes_done,
+                                                      total_episodes, completed, len(images))
+
+                            return episode_image_jobs(
+                                images,
+                                f"./toomics/{clean_title}/{index + 1:03d}",
+                                index + 1,
+                                update_image_progress,
+                                session,
+                                limiter=image_limiter,
+                                journal=journal.for_episode(url, episode_keys[index]) if journal else None,
+                                capture=capture,
+                                deferred=deferred
+                            )
+
+                        async def download_episode_images(index: int, images: List[str],
+                                                          capture: Optional[ResponseCapture]) -> List[str]:
+                            results = await scheduler.run(image_jobs(index, images, capture))
+                            return [result for result in results if result]
+
+                        def record_episode(index: int, images: List[str], downloaded: List[Optional[str]]) -> None:
+                            episode = episodes[index]
+                            episode['images'] = [name for name in downloaded if name]
+                            if deferred.pending(f"./toomics/{clean_title}/{index + 1:03d}"):
+                                # Checked and journaled by save_deferred_comic() after the drain
+                                deferred_episodes[index] = len(images)
+                                return
+                            outcomes[index] = len(episode['images']) == len(images)
+                            if outcomes[index] and journal:
+                                journal.record_episode(url, episode_keys[index], episode)
+
+                        def count_episode() -> None:
+                            nonlocal episodes_done
+                            episodes_done += 1
+                            update_console_output(comic_progress, title, total_episodes, episodes_done,
                                                   total_episodes)
 
+                        async def finish_episode(index: int, images: List[str], downloads: EpisodeDownloads) -> None:
+                            try:
+                                record_episode(index, images, await downloads.wait())
+                            except Exception as ep_error:
+                                print(f"{Fore.RED}{Style.BRIGHT}Error processing episode "
+                                      f"{episodes[index]['title']}: {str(ep_error)}")
+                                episodes[index]['images'] = []
+                            finally:
+                                count_episode()
+
+                        async def resolve_episode(index: int) -> Optional[Tuple[List[str], Optional[List[str]]]]:
+                            """Stage one: image URLs of an episode, and its files when a page captured them.
+
+                            None means there is nothing left to download for the episode.
+                            """
+                            episode = episodes[index]
+                            episode_number = index + 1
+                            episode_key = episode_keys[index]
+                            finished_episode = journal.episode(url, episode_key) if journal else None
+                            if finished_episode:
+                                episodes[index] = finished_episode
+                                outcomes[index] = True
+                                return None
+
                             # Create episode folder with leading zeros (like daycomics_scraper.py)
-                            episode_folder = f"./toomics/{clean_title}/{current_episode:03d}"
+                            episode_folder = f"./toomics/{clean_title}/{episode_number:03d}"
                             os.makedirs(episode_folder, exist_ok=True)
-                            
-                            # Update episode title and slug to match daycomics_scraper.py format
-                            episode['title'] = f"episode {current_episode:03d}"
-                            episode['slag'] = f"episode-{current_episode:03d}"
-
-                            episode_thumbnail = episode['thumbnail']
-                            episode_thumbnail_extension = episode_thumbnail.split('.')[-1]
-                            episode_thumbnail_filename = f"thumbnail.{episode_thumbnail_extension}"
-                            await download_image(episode_thumbnail, f"{episode_folder}/{episode_thumbnail_filename}",
-                                                 session)
 
-                            # Change thumbnail to local file reference
-                            episode['thumbnail'] = episode_thumbnail_filename
-
-                            # Attempt to access episodes regardless of isLocked flag
-                            # After login, we should be able to access all of them
-                            if not episode.get('url'):
-                                # Skip only if no URL is available
-                                episode['images'] = []
-                                continue
+                            # Update episode title and slug to match daycomics_scraper.py format
+                            episode['title'] = f"episode {episode_number:03d}"
+                            episode['slag'] = f"episode-{episode_number:03d}"
 
                             try:
-                                await page.goto(episode['url'], wait_until='load')
-
-                                # Check if URL contains popup_type/register
-                                if 'popup_type/register' in page.url:
+                                episode_thumbnail = episode['thumbnail']
+                                episode_thumbnail_extension = episode_thumbnail.split('.')[-1]
+                                episode_thumbnail_filename = f"thumbnail.{episode_thumbnail_extension}"
+                                await download_thumbnail(episode_thumbnail,
+                                                         f"{episode_folder}/{episode_thumbnail_filename}", session)
+
+                                # Change thumbnail to local file reference
+                                episode['thumbnail'] = episode_thumbnail_filename
+
+                                # Attempt to access episodes regardless of isLocked flag
+                                # After login, we should be able to access all of them
+                                if not episode.get('url'):
+                                    # Skip only if no URL is available
+                                    episode['images'] = []
+                                    outcomes[index] = True
+                                    return None
+
+                                async def open_in_browser() -> Tuple[Optional[List[str]], Optional[List[str]]]:
+                                    """Image URLs from a pooled page, plus the saved files when the page captured them."""
+                                    # A crashed page is recycled by the pool and the episode tried once more
+                                    for attempt in (1, 2):
+                                        async with page_pool.page() as page:
+                                            capture = page_captures.get(page)
+                                            try:
+                                                images = await open_episode(page, episode['url'], capture)
+                                            except Exception:
+                                                if attempt == 1 and page_pool.broken(page):
+                                                    print(f"{Fore.YELLOW}{Style.BRIGHT}Page crashed on {episode['title']}, "
+                                                          f"retrying on a fresh page")
+                                                    continue
+                                                raise
+                                            if images is None or not capture:
+                                                return images, None
+                                            # Captured bodies belong to this page, so it stays borrowed until they are saved
+                                            return images, await download_episode_images(index, images, capture)
+
+                                downloaded = None
+                                if episode_fetcher:
+                                    try:
+                                        images = await episode_fetcher.fetch(episode['url'])
+                                    except Exception as http_error:
+                                        print(f"{Fore.YELLOW}{Style.BRIGHT}Opening {episode['title']} in the browser: "
+                                              f"{str(http_error)}")
+                                        images, downloaded = await open_in_browser()
+                                        # The browser may have stored cookies (age verification) later fetches need
+                                        await episode_fetcher.sync_cookies(context)
+                                else:
+                                    images, downloaded = await open_in_browser()
+
+                                if images is None:
                                     print(
                                         f"{Fore.RED}{Style.BRIGHT}Need to register to view episode {episode['title']}")
                                     episode['images'] = []
                                     # Set episode as locked since we couldn't access it
                                     episode['isLocked'] = True
-                                    continue
-
-                                # Check if age verification is needed
-                                if 'age_verification' in page.url:
-                                    await page.wait_for_selector('.section_age_verif .button_yes')
-                                    await page.click('.section_age_verif .button_yes')
-                                    await asyncio.sleep(5)
-                                    await page.goto(episode['url'], wait_until='load')
-
-                                images = await page.eval_on_selector_all('#viewer-img div img',
-                                                                         'els => els.map(el => el.src.includes("base64") ? el.getAttribute("data-original") : el.src)')
+                                    if journal:
+                                        journal.record_episode(url, episode_key, episode)
+                                    outcomes[index] = True
+                                    return None
 
                                 episode['images'] = images
                                 del episode['url']  # Remove URL after use
-
-                                total_images = len(images)
-                                current_image = 0
-
-                                def update_image_progress(completed):
-                                    nonlocal current_image
-                                    current_image = completed
-                                    update_console_output(comic_progress, title, total_episodes, current_episode,
-                                                          total_episodes,
-                                                          current_image, total_images)
-
-                                episode['images'] = await download_images_with_queue(
-                                    images,
-                                    episode_folder,
-                                    current_episode,
-                                    update_image_progress,
-                                    session
-                                )
+                                return images, downloaded
                             except Exception as ep_error:
                                 print(
                                     f"{Fore.RED}{Style.BRIGHT}Error processing episode {episode['title']}: {str(ep_error)}")
                                 episode['images'] = []
-                                continue
+                                return None
+
+                        async def download_episode(index: int,
+                                                   job: Optional[Tuple[List[str], Optional[List[str]]]]) -> None:
+                            """Stage two: queue the resolved images on the run's download scheduler.
+
+                            The episode is recorded by a task waiting on its completion handle, so the
+                            next episode's images start as workers free up instead of after this one's tail.
+                            """
+                            if job is None:
+                                count_episode()
+                                return
+                            images, downloaded = job
+                            if downloaded is not None:
+                                record_episode(index, images, downloaded)
+                                count_episode()
+                                return
+                            downloads = await scheduler.submit(image_jobs(index, images, None))
+                            finalizers.append(asyncio.ensure_future(finish_episode(index, images, downloads)))
+
+                        # The next episodes are resolved while the current ones download; each episode stays
+                        # in place in the list. Over HTTP many pages are fetched at once, and only the ones
+                        # that fall back to the browser wait for a pooled page
+                        resolvers = episode_requests if episode_fetcher else page_pool.size
+                        try:
+                            await run_pipeline(total_episodes, resolve_episode, download_episode,
+                                               resolvers=resolvers, depth=resolvers, stats=pipeline_stats)
+                        finally:
+                            await asyncio.gather(*finalizers, return_exceptions=True)
+                        complete = all(outcomes)
 
                         comic_data = {
                             'title': clean_title,
@@ -393,12 +746,12 @@ async def parse_toomics(urls: List[str], progress_callback=None):
                             'episodes': episodes
                         }
 
-                        comics.append(comic_data)
-                        existing_comics.append(comic_data)
-
-                        # Save to JSON file after each comic
-                        with open('toomics.json', 'w', encoding='utf-8') as f:
-                            json.dump(existing_comics, f, indent=2)
+                        if deferred_episodes:
+                            # Written after the drain, once its episodes have their final image lists
+                            deferred.after_drain(partial(save_deferred_comic, url, comic_data, episode_keys,
+                                                         outcomes, deferred_episodes))
+                        else:
+                            save_comic(url, comic_data, complete)
 
                         print(f"{Fore.GREEN}{Style.BRIGHT}Successfully parsed comic: {title}")
 
@@ -414,6 +767,11 @@ async def parse_toomics(urls: List[str], progress_callback=None):
                         failed_comics.append(url)
                         continue
 
+                if deferred.items:
+                    print(f"{Fore.YELLOW}{Style.BRIGHT}Retrying {len(deferred.items)} deferred images from hosts: "
+                          f"{', '.join(CIRCUIT_BREAKER.open_hosts())}")
+                    await deferred.drain()
+
             # Clear screen before finishing
             print('\033[2J\033[0f', end='')
 
@@ -421,9 +779,31 @@ async def parse_toomics(urls: List[str], progress_callback=None):
             # Clear screen before showing error
             print('\033[2J\033[0f', end='')
             print(f"{Fore.RED}{Style.BRIGHT}Fatal error: {str(e)}")
+            fatal_error = True
         finally:
+            if page_pool:
+                await page_pool.close()
             await browser.close()
 
+    print(f"{Fore.CYAN}{Style.BRIGHT}Image downloads: {image_limiter.summary()}")
+    print(f"{Fore.CYAN}{Style.BRIGHT}Retries: {RETRY_POLICY.report()}")
+    print(f"{Fore.CYAN}{Style.BRIGHT}Circuit breaker: {CIRCUIT_BREAKER.report()}")
+    if deferred.recovered or deferred.lost:
+        print(f"{Fore.CYAN}{Style.BRIGHT}Deferred downloads: {deferred.report()}")
+    if page_pool:
+        print(f"{Fore.CYAN}{Style.BRIGHT}Episode pages: {page_pool.report()}")
+    if episode_fetcher:
+        print(f"{Fore.CYAN}{Style.BRIGHT}Episode HTML: {episode_fetcher.report()}")
+    print(f"{Fore.CYAN}{Style.BRIGHT}Episode pipeline: {pipeline_stats.report()}")
+    print(f"{Fore.CYAN}{Style.BRIGHT}Download scheduler: {scheduler.report()}")
+    print(f"{Fore.CYAN}{Style.BRIGHT}Page waits: {PAGE_WAITS.report()}")
+    if IMAGE_STORE:
+        print(f"{Fore.CYAN}{Style.BRIGHT}Deduplication: {IMAGE_STORE.report()}")
+    if RESOURCE_BLOCKER:
+        print(f"{Fore.CYAN}{Style.BRIGHT}Resource blocking: {RESOURCE_BLOCKER.report()}")
+    if IMAGE_CAPTURE:
+        print(f"{Fore.CYAN}{Style.BRIGHT}Response capture: {IMAGE_CAPTURE.report()}")
+
     # Save failed honeytoon to a separate file
     if failed_comics:
         with open('failed_comics.json', 'w', encoding='utf-8') as f:
@@ -431,20 +811,18 @@ async def parse_toomics(urls: List[str], progress_callback=None):
         print(
             f"{Fore.YELLOW}{Style.BRIGHT}{len(failed_comics)} honeytoon failed to parse. URLs saved to failed_comics.json")
 
-    # Save the result to an XML file
-    xml = dicttoxml(
-        {'item': comics},
-        root=False,
-        attr_type=False,
-        item_func=lambda x: 'item'
-    )
+    # Rebuild the legacy pretty-printed array from the JSON Lines file; the file accumulates across
+    # runs, so a comic scraped again keeps only its latest record
+    if os.path.exists(RESULTS_PATH):
+        compact(RESULTS_PATH, 'toomics.json', key='title')
 
-    # Make XML pretty
-    dom = minidom.parseString(xml)
-    pretty_xml = dom.toprettyxml(indent="  ")
+    # Finish the XML file that was written comic by comic
+    comics_xml.close()
 
-    with open('toomics.xml', 'w', encoding='utf-8') as f:
-        f.write(pretty_xml)
+    # The journal is the resume state: keep it unless every comic finished without a fatal error
+    if journal:
+        if not journal.finish_if_complete(urls, failed=fatal_error or bool(failed_comics)):
+            print(f"{Fore.YELLOW}{Style.BRIGHT}Run incomplete, journal kept for resume: {journal.path}")
 
     return failed_comics
 
@@ -477,6 +855,29 @@ if __name__ == "__main__":
     parser.add_argument('--urls', nargs='+', help='URLs to parse')
     parser.add_argument('--file', help='File containing URLs (one per line)')
     parser.add_argument('--example', action='store_true', help='Run with an example URL')
+    parser.add_argument('--rate', type=float, default=RATE_LIMITER.rate,
+                        help=f'Requests per second per host, 0 disables pacing (default: {RATE_LIMITER.rate})')
+    parser.add_argument('--burst', type=int, default=RATE_LIMITER.burst,
+                        help=f'Requests per host allowed back to back (default: {RATE_LIMITER.burst})')
+    parser.add_argument('--image-store',
+                        help='Directory of a content-addressed image store; episode files become hardlinks')
+    parser.add_argument('--block-resources', action='store_true',
+                        help='Abort image, font, media and analytics requests in the browser; '
+                             'images are still downloaded once through aiohttp')
+    parser.add_argument('--capture-images', action='store_true',
+                        help='Save episode images from the browser\'s network responses; '
+                             'only images the browser missed are downloaded with aiohttp')
+    parser.add_argument('--browser-episodes', action='store_true',
+                        help='Open every episode in the browser instead of fetching its HTML with aiohttp')
+    parser.add_argument('--pages', type=int, default=PAGE_POOL_SIZE,
+                        help=f'Browser pages opening episodes at the same time (default: {PAGE_POOL_SIZE})')
+    parser.add_argument('--episode-requests', type=int, default=HTTP_EPISODE_CONCURRENCY,
+                        help=f'Episode pages fetched over HTTP at the same time '
+                             f'(default: {HTTP_EPISODE_CONCURRENCY})')
+    parser.add_argument('--relogin', action='store_true',
+                        help=f'Log in again instead of reusing the saved session ({SESSION_CACHE.path})')
+    parser.add_argument('--fresh', action='store_true',
+                        help=f'Ignore the journal of an interrupted run ({JOURNAL_PATH}) and start over')
 
     args = parser.parse_args()
 
@@ -511,8 +912,26 @@ if __name__ == "__main__":
         parser.print_help()
         exit(1)
 
+    RATE_LIMITER.configure(rate=args.rate, burst=args.burst)
+    if args.image_store:
+        IMAGE_STORE = ContentStore(args.image_store)
+    if args.block_resources and args.capture_images:
+        parser.error('--block-resources stops the browser from receiving the images --capture-images saves')
+    if args.browser_episodes:
+        HTTP_EPISODES = False
+    if args.block_resources:
+        RESOURCE_BLOCKER = ResourceBlocker()
+    if args.capture_images:
+        IMAGE_CAPTURE = ResponseCapture(store=IMAGE_STORE)
+    if args.relogin:
+        SESSION_CACHE.discard()
+    journal = RunJournal(JOURNAL_PATH, fresh=args.fresh)
+    if journal.resumed:
+        print(f"{Fore.YELLOW}{Style.BRIGHT}Resuming interrupted run from {JOURNAL_PATH}")
+
     try:
-        asyncio.run(parse_toomics(urls))
+        asyncio.run(parse_toomics(urls, journal=journal, pages=max(1, args.pages),
+                                  episode_requests=max(1, args.episode_requests)))
     except KeyboardInterrupt:
         print(f"{Fore.YELLOW}{Style.BRIGHT}\nScript interrupted by user. Exiting...")
     except Exception as e:
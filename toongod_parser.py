@@ -1,7 +1,11 @@
+import asyncio
 import os
 import re
 import time
 import json
+import queue
+import threading
+from functools import partial
 from pathlib import Path
 from typing import List, Dict, Optional
 
@@ -11,13 +15,28 @@ from dotenv import load_dotenv
 
 import colorama
 from colorama import Fore, Style
-from dicttoxml import dicttoxml
-from xml.dom import minidom
 
 from seleniumbase import Driver
 from selenium.webdriver.common.by import By
 from selenium.common.exceptions import NoSuchElementException, WebDriverException
 
+from circuit_breaker import CircuitOpenError, DeferredDownloads, HostCircuitBreaker
+from image_store import ContentStore, write_chunks
+from jsonl_export import JsonLinesWriter, OrderedEmitter, compact, iter_json_lines
+from rate_limiter import HostRateLimiter
+from retry_policy import RetryPolicy
+from run_journal import EpisodeJournal, RunJournal
+from streaming_download import (
+    RESUME_STATS,
+    IncompleteDownloadError,
+    discard_partial,
+    partial_path,
+    resume_headers,
+    resume_offset,
+    save_validator,
+)
+from xml_export import write_xml
+
 
 colorama.init(autoreset=True)
 
@@ -30,6 +49,16 @@ BASE_OUTPUT_DIR = Path("toongod")
 PROFILE_DIR = Path("selenium_profile")
 PROFILE_DIR.mkdir(parents=True, exist_ok=True)
 
+REQUESTS_PER_SECOND = 5.0
+REQUEST_BURST = 10
+RATE_LIMITER = HostRateLimiter(rate=REQUESTS_PER_SECOND, burst=REQUEST_BURST)
+RETRY_POLICY = RetryPolicy()
+CIRCUIT_BREAKER = HostCircuitBreaker()
+IMAGE_STORE: Optional[ContentStore] = None  # --image-store
+# Журнал завершених коміксів/епізодів/зображень для продовження після збою.
+JOURNAL_PATH = Path("toongod_journal.jsonl")
+RESULTS_PATH = Path("toongod.jsonl")
+
 USER_AGENT = (
     "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
     "AppleWebKit/537.36 (KHTML, like Gecko) "
@@ -103,7 +132,7 @@ IMAGE_SELECTORS = [
 ]
 
 
-def create_driver() -> Driver:
+def create_driver(profile_dir: Path = PROFILE_DIR) -> Driver:
     proxy = os.getenv("TOONGOD_PROXY")
     locale = os.getenv("TOONGOD_LOCALE", "en-US")
 
@@ -113,7 +142,7 @@ def create_driver() -> Driver:
         locale_code=locale,
         proxy=proxy,
         headless=False,
-        user_data_dir=str(PROFILE_DIR.resolve()),
+        user_data_dir=str(profile_dir.resolve()),
         incognito=False,
         block_images=False,
     )
@@ -346,29 +375,52 @@ def download_file(
     url: str,
     destination: Path,
     referer: Optional[str] = None,
-    retries: int = 3,
     timeout: int = 60,
 ) -> Optional[Path]:
     ensure_directory(destination.parent)
     headers = {"Referer": referer} if referer else {}
 
-    for attempt in range(1, retries + 1):
+    attempt = 0
+    while True:
+        attempt += 1
+        # Відкритий вимикач хоста піднімає CircuitOpenError назовні, щоб викликач міг відкласти файл.
+        CIRCUIT_BREAKER.before(url)
+        RETRY_POLICY.started(attempt)
         try:
-            with session.get(url, headers=headers, stream=True, timeout=timeout) as response:
+            RATE_LIMITER.wait(url)
+            had_partial = partial_path(destination).exists()
+            # Продовжуємо з байтів, що вже лежать у .part після попередньої спроби.
+            request_headers = {**headers, **resume_headers(destination)}
+            with session.get(url, headers=request_headers, stream=True, timeout=timeout) as response:
+                if response.status_code == 416:
+                    # Сервер не приймає наш діапазон — наступна спроба почне з нуля.
+                    discard_partial(destination)
                 response.raise_for_status()
-                with open(destination, "wb") as output:
-                    for chunk in response.iter_content(chunk_size=8192):
-                        if chunk:
-                            output.write(chunk)
+                offset = resume_offset(response.status_code, response.headers, destination)
+                if not offset:
+                    save_validator(destination, response.headers)
+                write_chunks(
+                    response.iter_content(chunk_size=8192),
+                    destination,
+                    store=IMAGE_STORE,
+                    offset=offset,
+                    keep_partial=True,
+                )
+            discard_partial(destination)
+            RESUME_STATS.record(offset, had_partial)
+            CIRCUIT_BREAKER.success(url)
+            RETRY_POLICY.success()
             return destination
-        except RequestException as error:
+        except (RequestException, IncompleteDownloadError) as error:
+            CIRCUIT_BREAKER.failure(url, error)
             print(
-                f"{Fore.YELLOW}{Style.BRIGHT}Не вдалося завантажити {url} (спроба {attempt}/{retries}): {error}"
+                f"{Fore.YELLOW}{Style.BRIGHT}Не вдалося завантажити {url} (спроба {attempt}/{RETRY_POLICY.attempts}): {error}"
             )
-            time.sleep(attempt)
-
-    print(f"{Fore.RED}{Style.BRIGHT}Повністю провалено завантаження: {url}")
-    return None
+            delay = RETRY_POLICY.retry_delay(attempt, error)
+            if delay is None:
+                print(f"{Fore.RED}{Style.BRIGHT}Повністю провалено завантаження: {url}")
+                return None
+            time.sleep(delay)
 
 
 def scrape_episode(
@@ -378,6 +430,8 @@ def scrape_episode(
     comic_dir: Path,
     episode_index: int,
     max_attempts: int = 3,
+    journal: Optional[EpisodeJournal] = None,
+    deferred: Optional[DeferredDownloads] = None,
 ) -> Dict[str, object]:
     episode_url = episode_meta["url"]
     episode_folder = comic_dir / f"{episode_index:03d}"
@@ -387,13 +441,12 @@ def scrape_episode(
     download_session = session
 
     for attempt in range(1, max_attempts + 1):
-        if attempt == 1:
-            driver.get(episode_url)
-        else:
+        if attempt > 1:
             print(
                 f"{Fore.YELLOW}{Style.BRIGHT}Повторна спроба {attempt}/{max_attempts} для епізоду: {episode_url}"
             )
-            driver.get(episode_url)
+        RATE_LIMITER.wait(episode_url)
+        driver.get(episode_url)
 
         if not page_has_any(driver, IMAGE_SELECTORS):
             print(
@@ -419,6 +472,12 @@ def scrape_episode(
             f"{Fore.RED}{Style.BRIGHT}Не знайдено зображень для епізоду: {episode_url}"
         )
 
+    def download_again(image_url: str, destination: Path, index: int) -> Optional[Path]:
+        result = download_file(download_session, image_url, destination, referer=episode_url)
+        if result and journal:
+            journal.record_image(index, destination.name)
+        return result
+
     downloaded_images: List[str] = []
     for image_position, image_url in enumerate(image_urls, start=1):
         extension = os.path.splitext(image_url.split("?")[0])[1].lower() or ".jpg"
@@ -426,13 +485,32 @@ def scrape_episode(
             extension = ".jpg"
         filename = f"episode_{episode_index:03d}_{image_position:03d}{extension}"
         destination = episode_folder / filename
-        result = download_file(download_session, image_url, destination, referer=episode_url)
+        if journal and journal.image_done(image_position - 1, destination):
+            downloaded_images.append(filename)
+            continue
+        try:
+            result = download_file(download_session, image_url, destination, referer=episode_url)
+        except CircuitOpenError as error:
+            if deferred is None:
+                print(f"{Fore.RED}{Style.BRIGHT}Пропускаю {image_url}: {error}")
+                continue
+            # Хост недоступний: файл докачається наприкінці запуску, а його ім'я вже стоїть в епізоді.
+            deferred.defer(
+                image_url,
+                partial(asyncio.to_thread, download_again, image_url, destination, image_position - 1),
+                episode_folder.parent,
+                episode_folder,
+            )
+            downloaded_images.append(filename)
+            continue
         if result:
             downloaded_images.append(filename)
+            if journal:
+                journal.record_image(image_position - 1, filename)
 
     thumbnail_name = downloaded_images[0] if downloaded_images else ""
 
-    return {
+    episode_data = {
         "parentTitle": comic_dir.name,
         "title": f"episode {episode_index:03d}",
         "slag": f"episode-{episode_index:03d}",
@@ -443,9 +521,29 @@ def scrape_episode(
         "label": episode_meta.get("label", ""),
     }
 
+    def finish_episode() -> None:
+        # Зображення, які так і не вдалося докачати, прибираємо з епізоду.
+        episode_data["images"] = [name for name in downloaded_images if (episode_folder / name).exists()]
+        episode_data["thumbnail"] = episode_data["images"][0] if episode_data["images"] else ""
+        if journal and len(episode_data["images"]) == len(image_urls):
+            journal.journal.record_episode(journal.comic_key, journal.episode_key, episode_data)
+
+    if deferred and deferred.pending(episode_folder):
+        deferred.after_drain(finish_episode)
+    elif journal and image_urls and len(downloaded_images) == len(image_urls):
+        journal.journal.record_episode(journal.comic_key, journal.episode_key, episode_data)
+    return episode_data
+
 
-def scrape_comic(driver: Driver, session: requests.Session, url: str) -> Optional[Dict[str, object]]:
+def scrape_comic(
+    driver: Driver,
+    session: requests.Session,
+    url: str,
+    journal: Optional[RunJournal] = None,
+    deferred: Optional[DeferredDownloads] = None,
+) -> Optional[Dict[str, object]]:
     print(f"{Fore.CYAN}{Style.BRIGHT}Обробка коміксу: {url}")
+    RATE_LIMITER.wait(url)
     driver.get(url)
 
     manual_cloudflare_wait(driver, wait_seconds=40, save_path=Path("toongod_live.html"))
@@ -482,8 +580,11 @@ def scrape_comic(driver: Driver, session: requests.Session, url: str) -> Optiona
         session = build_session_from_driver(driver)
         extension = os.path.splitext(thumbnail_url.split("?")[0])[1] or ".jpg"
         destination = comic_dir / f"thumbnail{extension}"
-        if download_file(session, thumbnail_url, destination, referer=url):
-            thumbnail_local = destination.name
+        try:
+            if download_file(session, thumbnail_url, destination, referer=url):
+                thumbnail_local = destination.name
+        except CircuitOpenError as error:
+            print(f"{Fore.YELLOW}{Style.BRIGHT}Обкладинку пропущено: {error}")
 
     episodes_meta = collect_episode_links(driver)
     if not episodes_meta:
@@ -491,11 +592,21 @@ def scrape_comic(driver: Driver, session: requests.Session, url: str) -> Optiona
         return None
 
     episodes: List[Dict[str, object]] = []
+    complete = True
     for index, episode_meta in enumerate(episodes_meta, start=1):
+        finished = journal.episode(url, episode_meta["url"]) if journal else None
+        if finished:
+            episodes.append(finished)
+            continue
         print(
             f"  {Fore.GREEN}{Style.BRIGHT}Епізод {index:03d}: {episode_meta.get('label', '').strip() or episode_meta['url']}"
         )
-        episode_data = scrape_episode(driver, session, episode_meta, comic_dir, index)
+        episode_journal = journal.for_episode(url, episode_meta["url"]) if journal else None
+        episode_data = scrape_episode(
+            driver, session, episode_meta, comic_dir, index, journal=episode_journal, deferred=deferred
+        )
+        if journal and not journal.episode(url, episode_meta["url"]):
+            complete = False
         episodes.append(episode_data)
 
     comic_data = {
@@ -510,18 +621,25 @@ def scrape_comic(driver: Driver, session: requests.Session, url: str) -> Optiona
         "source": url,
     }
 
+    def record_comic() -> None:
+        # Комікс завершено, лише коли кожна глава записана в журнал повністю, з усіма зображеннями.
+        if all(journal.episode(url, episode_meta["url"]) for episode_meta in episodes_meta):
+            journal.record_comic(url, comic_data)
+
+    if journal and deferred and deferred.pending(comic_dir):
+        # Записуємо комікс після докачування, коли епізоди вже мають остаточні списки зображень.
+        deferred.after_drain(record_comic)
+    elif journal and complete:
+        journal.record_comic(url, comic_data)
+
     return comic_data
 
 
 def save_results(comics: List[Dict[str, object]], failed: List[str]) -> None:
     if comics:
-        with open("toongod.json", "w", encoding="utf-8") as json_file:
-            json.dump(comics, json_file, indent=2, ensure_ascii=False)
-
-        xml = dicttoxml({"item": comics}, root=False, attr_type=False, item_func=lambda _: "item")
-        dom = minidom.parseString(xml)
-        with open("toongod.xml", "w", encoding="utf-8") as xml_file:
-            xml_file.write(dom.toprettyxml(indent="  "))
+        # Комікси вже записані в toongod.jsonl під час роботи; збираємо з нього звичний масив.
+        compact(RESULTS_PATH, "toongod.json", ensure_ascii=False)
+        write_xml(iter_json_lines(RESULTS_PATH), "toongod.xml")
 
     if failed:
         with open("failed_toongod.json", "w", encoding="utf-8") as failed_file:
@@ -531,28 +649,114 @@ def save_results(comics: List[Dict[str, object]], failed: List[str]) -> None:
         )
 
 
-def parse_toongod(urls: List[str]) -> None:
+def worker_profile_dir(worker_index: int) -> Path:
+    if worker_index == 0:
+        return PROFILE_DIR
+    # Chrome не дозволяє двом процесам ділити один профіль.
+    profile_dir = PROFILE_DIR.with_name(f"{PROFILE_DIR.name}_{worker_index}")
+    ensure_directory(profile_dir)
+    return profile_dir
+
+
+def parse_toongod(urls: List[str], parallel_comics: int = 1, journal: Optional[RunJournal] = None) -> None:
     ensure_directory(BASE_OUTPUT_DIR)
-    driver = create_driver()
 
-    comics: List[Dict[str, object]] = []
-    failed: List[str] = []
+    total = len(urls)
+    results: List[Optional[Dict[str, object]]] = [None] * total
+    errors: List[bool] = [False] * total
+    pending: "queue.Queue[int]" = queue.Queue()
+    for position in range(total):
+        pending.put(position)
+    records = JsonLinesWriter(RESULTS_PATH)
+    # Готові комікси одразу дописуються у файл у порядку вхідного списку.
+    emitter = OrderedEmitter(records)
+    # Зображення з хостів, чий вимикач спрацював; докачуються, коли всі воркери закінчать.
+    deferred = DeferredDownloads(CIRCUIT_BREAKER)
+    held: List[int] = []
+
+    def worker(worker_index: int) -> None:
+        driver = create_driver(worker_profile_dir(worker_index))
+        try:
+            while True:
+                try:
+                    position = pending.get_nowait()
+                except queue.Empty:
+                    return
+                url = urls[position]
+                finished = journal.comic(url) if journal else None
+                if finished:
+                    print(f"{Fore.GREEN}Комікс {position + 1}/{total} вже оброблено, пропускаємо: {url}")
+                    results[position] = finished
+                    emitter.put(position, finished)
+                    continue
+                print(f"{Fore.CYAN}{Style.BRIGHT}Комікс {position + 1}/{total}")
+                try:
+                    session = build_session_from_driver(driver)
+                    results[position] = scrape_comic(driver, session, url, journal=journal, deferred=deferred)
+                except Exception as error:
+                    print(f"{Fore.RED}{Style.BRIGHT}Помилка при обробці {url}: {error}")
+                    errors[position] = True
+                comic = results[position]
+                if comic and deferred.pending(BASE_OUTPUT_DIR / comic["title"]):
+                    held.append(position)
+                else:
+                    emitter.put(position, comic)
+        finally:
+            driver.quit()
+
+    workers = max(1, min(parallel_comics, total))
+    if workers == 1:
+        worker(0)
+    else:
+        threads = [
+            threading.Thread(target=worker, args=(worker_index,), daemon=True)
+            for worker_index in range(workers)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
 
-    try:
-        for index, url in enumerate(urls, start=1):
-            print(f"{Fore.CYAN}{Style.BRIGHT}Комікс {index}/{len(urls)}")
-            try:
-                session = build_session_from_driver(driver)
-                comic_data = scrape_comic(driver, session, url)
-                if comic_data:
-                    comics.append(comic_data)
-            except Exception as error:
-                print(f"{Fore.RED}{Style.BRIGHT}Помилка при обробці {url}: {error}")
-                failed.append(url)
-    finally:
-        driver.quit()
+    if deferred.items:
+        print(
+            f"{Fore.YELLOW}{Style.BRIGHT}Докачую {len(deferred.items)} відкладених зображень "
+            f"з хостів: {', '.join(CIRCUIT_BREAKER.open_hosts())}"
+        )
+        asyncio.run(deferred.drain())
+    for position in sorted(held):
+        emitter.put(position, results[position])
 
+    records.close()
+    comics = [comic for comic in results if comic]
+    failed = [url for url, errored in zip(urls, errors) if errored]
     save_results(comics, failed)
+    # Журнал - це стан для продовження: видаляємо його лише тоді, коли всі комікси завершено повністю.
+    if journal:
+        if not journal.finish_if_complete(urls, failed=bool(failed)):
+            print(f"{Fore.YELLOW}{Style.BRIGHT}Запуск неповний, журнал збережено для продовження: {journal.path}")
+
+    if IMAGE_STORE:
+        print(
+            f"{Fore.CYAN}{Style.BRIGHT}Сховище зображень: {IMAGE_STORE.stored} нових, "
+            f"{IMAGE_STORE.duplicates} дублікатів, заощаджено {IMAGE_STORE.bytes_saved / (1024 * 1024):.1f} МБ"
+        )
+    if RESUME_STATS.resumed or RESUME_STATS.restarted:
+        print(
+            f"{Fore.CYAN}{Style.BRIGHT}Докачування: {RESUME_STATS.resumed} файлів продовжено, "
+            f"{RESUME_STATS.restarted} почато заново, заощаджено {RESUME_STATS.bytes_saved / (1024 * 1024):.1f} МБ"
+        )
+    if RETRY_POLICY.retried or RETRY_POLICY.given_up:
+        print(
+            f"{Fore.CYAN}{Style.BRIGHT}Повтори: {RETRY_POLICY.attempted} спроб на {RETRY_POLICY.requests} запитів, "
+            f"{RETRY_POLICY.succeeded} успішних, {RETRY_POLICY.retried} повторів, {RETRY_POLICY.given_up} відмов "
+            f"(з них {RETRY_POLICY.over_budget} через вичерпаний бюджет)"
+        )
+    if CIRCUIT_BREAKER.opened:
+        print(
+            f"{Fore.CYAN}{Style.BRIGHT}Вимикачі хостів: спрацювали {CIRCUIT_BREAKER.opened} разів, "
+            f"{CIRCUIT_BREAKER.rejected} запитів відхилено одразу; відкладені зображення: "
+            f"{deferred.recovered} докачано, {deferred.lost} втрачено"
+        )
 
 
 def read_urls_from_file(file_path: Path) -> List[str]:
@@ -571,6 +775,33 @@ if __name__ == "__main__":
     parser.add_argument("--urls", nargs="+", help="Посилання на сторінки коміксів")
     parser.add_argument("--file", help="Файл із посиланнями (по одному в рядку)")
     parser.add_argument("--example", action="store_true", help="Запустити з демонстраційним посиланням")
+    parser.add_argument(
+        "--parallel-comics",
+        type=int,
+        default=1,
+        help="Кількість коміксів, що обробляються одночасно (окремий браузер на кожен)",
+    )
+    parser.add_argument(
+        "--rate",
+        type=float,
+        default=REQUESTS_PER_SECOND,
+        help=f"Запитів на секунду до кожного хоста, 0 — без обмеження (за замовчуванням {REQUESTS_PER_SECOND})",
+    )
+    parser.add_argument(
+        "--image-store",
+        help="Каталог сховища зображень за хешем вмісту; файли епізодів стають жорсткими посиланнями",
+    )
+    parser.add_argument(
+        "--burst",
+        type=int,
+        default=REQUEST_BURST,
+        help=f"Скільки запитів до хоста можна виконати одразу (за замовчуванням {REQUEST_BURST})",
+    )
+    parser.add_argument(
+        "--fresh",
+        action="store_true",
+        help=f"Ігнорувати журнал перерваного запуску ({JOURNAL_PATH}) і почати з нуля",
+    )
 
     args = parser.parse_args()
 
@@ -592,4 +823,10 @@ if __name__ == "__main__":
         parser.print_help()
         raise SystemExit(0)
 
-    parse_toongod(url_list)
+    RATE_LIMITER.configure(rate=args.rate, burst=args.burst)
+    if args.image_store:
+        IMAGE_STORE = ContentStore(Path(args.image_store))
+    journal = RunJournal(JOURNAL_PATH, fresh=args.fresh)
+    if journal.resumed:
+        print(f"{Fore.YELLOW}{Style.BRIGHT}Знайдено журнал {JOURNAL_PATH}, продовжуємо перерваний запуск")
+    parse_toongod(url_list, parallel_comics=max(1, args.parallel_comics), journal=journal)
@@ -0,0 +1,198 @@
+import inspect
+import numbers
+import os
+from collections.abc import Iterable
+from pathlib import Path
+from typing import Any, Dict, Iterable as IterableType, TextIO, Tuple, Union
+from xml.dom import minidom
+from xml.sax.saxutils import unescape
+
+from dicttoxml import make_valid_xml_name
+
+
+ROOT_TAG = "item"
+ITEM_TAG = "item"
+INDENT = "  "
+XML_DECLARATION = '<?xml version="1.0" ?>\n'
+
+# minidom's own escaping keeps the output byte-identical to toprettyxml().
+# Newer Pythons added an "attr" flag to it; older ones escape text and attributes alike.
+_WRITE_DATA_TAKES_ATTR = len(inspect.signature(minidom._write_data).parameters) > 2
+_ATTRIBUTE_WHITESPACE = str.maketrans({"\t": " ", "\n": " ", "\r": " "})
+# dicttoxml escapes the original key before storing it in a name="" attribute.
+_DICTTOXML_ENTITIES = {"&quot;": '"', "&apos;": "'"}
+
+
+def _write_text(output: TextIO, data: str) -> None:
+    if _WRITE_DATA_TAKES_ATTR:
+        minidom._write_data(output, data, False)
+    else:
+        minidom._write_data(output, data)
+
+
+def _write_attribute(output: TextIO, data: str) -> None:
+    if _WRITE_DATA_TAKES_ATTR:
+        minidom._write_data(output, data, True)
+    else:
+        minidom._write_data(output, data)
+
+
+def _normalize_text(text: str) -> str:
+    # What the parser in minidom.parseString() does to line endings.
+    if "\r" in text:
+        text = text.replace("\r\n", "\n").replace("\r", "\n")
+    return text
+
+
+class XmlItemWriter:
+    """Writes records as ``<item>`` elements one at a time.
+
+    The output is byte-identical to
+    ``minidom.parseString(dicttoxml({"item": records}, root=False,
+    attr_type=False, item_func=lambda _: "item")).toprettyxml(indent="  ")``
+    without holding the catalog, the flat XML string and the DOM in memory.
+    The file is written next to path and moved into place by close().
+    """
+
+    def __init__(self, path: Union[str, Path]):
+        self.path = Path(path)
+        self.temp_path = self.path.with_name(f"{self.path.name}.tmp")
+        self.output = open(self.temp_path, "w", encoding="utf-8")
+        self.output.write(XML_DECLARATION)
+        self.count = 0
+        self.names: Dict[Tuple[Any, bool], Tuple[str, Dict[str, str]]] = {}
+
+    def write(self, record: Any) -> None:
+        if self.count == 0:
+            self.output.write(f"<{ROOT_TAG}>\n")
+        self.count += 1
+        self.write_list_item(record, INDENT)
+
+    def close(self) -> None:
+        if self.output.closed:
+            return
+        self.output.write(f"</{ROOT_TAG}>\n" if self.count else f"<{ROOT_TAG}/>\n")
+        self.output.close()
+        os.replace(self.temp_path, self.path)
+
+    def abort(self) -> None:
+        self.output.close()
+        try:
+            self.temp_path.unlink()
+        except FileNotFoundError:
+            pass
+
+    def __enter__(self) -> "XmlItemWriter":
+        return self
+
+    def __exit__(self, exc_type, *exc_info) -> None:
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+    def element_name(self, key: Any, scalar: bool) -> Tuple[str, Dict[str, str]]:
+        """Tag and attributes dicttoxml derives from a dict key (cached, it re-parses to validate)."""
+        cache_key = (key, scalar)
+        name = self.names.get(cache_key)
+        if name is None:
+            tag, attrs = make_valid_xml_name(key, {})
+            if scalar:
+                # dicttoxml validates the name of scalar elements a second time.
+                tag, attrs = make_valid_xml_name(tag, attrs)
+            attrs = {attr_name: unescape(attr_value, _DICTTOXML_ENTITIES) for attr_name, attr_value in attrs.items()}
+            name = self.names[cache_key] = (tag, attrs)
+        return name
+
+    def open_tag(self, tag: str, attrs: Dict[str, str], indent: str) -> None:
+        self.output.write(f"{indent}<{tag}")
+        for attr_name, attr_value in attrs.items():
+            self.output.write(f' {attr_name}="')
+            _write_attribute(self.output, _normalize_text(attr_value).translate(_ATTRIBUTE_WHITESPACE))
+            self.output.write('"')
+
+    def write_scalar(self, tag: str, attrs: Dict[str, str], text: str, indent: str) -> None:
+        self.open_tag(tag, attrs, indent)
+        if text:
+            self.output.write(">")
+            _write_text(self.output, _normalize_text(text))
+            self.output.write(f"</{tag}>\n")
+        else:
+            self.output.write("/>\n")
+
+    def write_dict(self, tag: str, attrs: Dict[str, str], value: Dict[Any, Any], indent: str) -> None:
+        self.open_tag(tag, attrs, indent)
+        if not value:
+            self.output.write("/>\n")
+            return
+        self.output.write(">\n")
+        child_indent = indent + INDENT
+        for key, child in value.items():
+            self.write_dict_value(key, child, child_indent)
+        self.output.write(f"{indent}</{tag}>\n")
+
+    def write_list(self, tag: str, attrs: Dict[str, str], value: IterableType[Any], indent: str) -> None:
+        items = list(value) if not isinstance(value, (list, tuple)) else value
+        self.open_tag(tag, attrs, indent)
+        if not items:
+            self.output.write("/>\n")
+            return
+        self.output.write(">\n")
+        child_indent = indent + INDENT
+        for item in items:
+            self.write_list_item(item, child_indent)
+        self.output.write(f"{indent}</{tag}>\n")
+
+    def write_dict_value(self, key: Any, value: Any, indent: str) -> None:
+        # Same type dispatch order as dicttoxml.convert_dict.
+        if type(value) == bool:
+            tag, attrs = self.element_name(key, True)
+            self.write_scalar(tag, attrs, str(value).lower(), indent)
+        elif isinstance(value, numbers.Number) or type(value) == str:
+            tag, attrs = self.element_name(key, True)
+            self.write_scalar(tag, attrs, str(value), indent)
+        elif hasattr(value, "isoformat"):
+            tag, attrs = self.element_name(key, True)
+            self.write_scalar(tag, attrs, value.isoformat(), indent)
+        elif isinstance(value, dict):
+            tag, attrs = self.element_name(key, False)
+            self.write_dict(tag, attrs, value, indent)
+        elif isinstance(value, Iterable):
+            tag, attrs = self.element_name(key, False)
+            self.write_list(tag, attrs, value, indent)
+        elif value is None:
+            tag, attrs = self.element_name(key, True)
+            self.write_scalar(tag, attrs, "", indent)
+        else:
+            raise TypeError(f"Unsupported data type: {value} ({type(value).__name__})")
+
+    def write_list_item(self, item: Any, indent: str) -> None:
+        # Same type dispatch order as dicttoxml.convert_list: bools count as numbers here.
+        if isinstance(item, numbers.Number) or type(item) == str:
+            self.write_scalar(ITEM_TAG, {}, str(item), indent)
+        elif hasattr(item, "isoformat"):
+            self.write_scalar(ITEM_TAG, {}, item.isoformat(), indent)
+        elif isinstance(item, dict):
+            self.write_dict(ITEM_TAG, {}, item, indent)
+        elif isinstance(item, Iterable):
+            self.write_list(ITEM_TAG, {}, item, indent)
+        elif item is None:
+            self.write_scalar(ITEM_TAG, {}, "", indent)
+        else:
+            raise TypeError(f"Unsupported data type: {item} ({type(item).__name__})")
+
+
+def write_xml(records: IterableType[Any], path: Union[str, Path]) -> int:
+    """Stream records into path as the scrapers' pretty-printed ``<item>`` XML. Returns the count."""
+    with XmlItemWriter(path) as writer:
+        for record in records:
+            writer.write(record)
+    return writer.count
+
+
+def legacy_xml(records: Any) -> str:
+    """The previous dicttoxml + minidom export, kept for comparisons and benchmarks."""
+    from dicttoxml import dicttoxml
+
+    xml = dicttoxml({ROOT_TAG: records}, root=False, attr_type=False, item_func=lambda _: ITEM_TAG)
+    return minidom.parseString(xml).toprettyxml(indent=INDENT)